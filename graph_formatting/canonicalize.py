@@ -0,0 +1,138 @@
+"""
+Functions and a class to canonicalize entity names before they become graph
+nodes, so that surface forms like "Abscisic Acid", "abscisic-acid" and, with
+a synonym table, "ABA" are all the same node.
+
+Names are normalized with NFKC, casefolded, have punctuation replaced with
+spaces and have runs of whitespace collapsed. A synonym table is a JSON list
+of groups of names, where the first name in each group is the canonical one,
+e.g. the file written by get_keywords.py with --synonyms.
+
+Author: Serena G. Lotreck
+"""
+import json
+import unicodedata
+
+
+def normalize_ent(ent):
+    """
+    Normalize the case, whitespace and punctuation of an entity name.
+
+    parameters:
+        ent, str: entity name
+
+    returns: norm, str: normalized name. If the name is only punctuation,
+        the punctuation is kept so that it isn't an empty string
+    """
+    ent = unicodedata.normalize('NFKC', ent).casefold()
+    norm = ' '.join(''.join(' ' if unicodedata.category(c).startswith('P')
+        else c for c in ent).split())
+    if norm == '':
+        norm = ' '.join(ent.split())
+
+    return norm
+
+
+def load_synonyms(synonym_file):
+    """
+    Read a synonym table. Groups that share a name are merged, so that
+    chains of synonyms (e.g. ["ABA1", "ZEP"] and ["ZEP", "zeaxanthin
+    epoxidase"]) all have the same canonical name.
+
+    parameters:
+        synonym_file, str: path to a JSON list of lists of names, where the
+            first name in each list is the canonical name for the others
+
+    returns: synonyms, dict: keys are normalized names, values are the
+        normalized canonical names. The canonical name of merged groups is
+        the one from the first of them in the file
+    """
+    with open(synonym_file) as f:
+        groups = json.load(f)
+
+    # Union-find over names, where a root is always the name that was seen
+    # first in its set
+    parent = {}
+    order = {}
+
+    def find(name):
+        while parent[name] != name:
+            # Path halving
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for group in groups:
+        names = [normalize_ent(name) for name in group]
+        for name in names:
+            if name not in parent:
+                parent[name] = name
+                order[name] = len(order)
+        for name in names[1:]:
+            root, other = find(names[0]), find(name)
+            if root != other:
+                if order[other] < order[root]:
+                    root, other = other, root
+                parent[other] = root
+
+    return {name: find(name) for name in parent}
+
+
+class EntityCanonicalizer:
+    """
+    Interns entity surface forms to integer node IDs, where all surface forms
+    with the same canonical name get the same ID. Each surface form is only
+    normalized the first time it's seen.
+
+    The canonical name of a node only depends on its surface form and the
+    synonym table, so separate instances (e.g. in pool workers, or in
+    different incremental runs) give the same names.
+    """
+    def __init__(self, synonyms=None):
+        """
+        parameters:
+            synonyms, dict: output of load_synonyms, default is none
+        """
+        self.synonyms = synonyms or {}
+        # Surface form to node ID
+        self.ids = {}
+        # Node ID to canonical name
+        self.names = []
+        self._name_ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __call__(self, ent):
+        """
+        Get the canonical name of an entity.
+
+        parameters:
+            ent, str: surface form of the entity
+
+        returns: name, str: canonical name
+        """
+        return self.names[self.intern(ent)]
+
+    def intern(self, ent):
+        """
+        Get the node ID of an entity, adding a new one if its canonical name
+        hasn't been seen.
+
+        parameters:
+            ent, str: surface form of the entity
+
+        returns: node_id, int: ID of the entity's canonical name
+        """
+        node_id = self.ids.get(ent)
+        if node_id is None:
+            name = normalize_ent(ent)
+            name = self.synonyms.get(name, name)
+            node_id = self._name_ids.get(name)
+            if node_id is None:
+                node_id = len(self.names)
+                self._name_ids[name] = node_id
+                self.names.append(name)
+            self.ids[ent] = node_id
+
+        return node_id
@@ -7,34 +7,273 @@ Edge weights are incremented if the triple is already present in the graph,
 so an edge weight represents how many times the triple occurs in a dataset.
 
 Keeps the same file name as the dygiepp input, changes the ext to .dot
+
+With --snapshot, the graph is also saved as a directory of binary arrays
+that graph_filtering.py can memory-map instead of parsing the DOT file.
+
+With --incremental, the triple counts, loose entities and doc_keys that went
+into the graph are saved in <graph_name>_counts. The next run with
+--incremental adds new prediction files to those counts instead of starting
+over, and skips any docs that are already in the graph.
+
+With --canonicalize, entity names are normalized (see canonicalize.py) so that
+different spellings of the same entity are one node. A synonym table can be
+given with -synonyms to also merge aliases.
 """
-from os.path import abspath
+from os import makedirs, replace
+from os.path import abspath, exists, getsize
 import argparse 
-from collections import defaultdict
+from collections import ChainMap, Counter
+from itertools import chain
+import multiprocessing as mp
+import re
 import jsonlines
-import pygraphviz as pgv 
 
+from canonicalize import EntityCanonicalizer, load_synonyms
+from graph_store import GraphStore, save_snapshot
+
+try:
+    import pygraphviz as pgv
+except ImportError:
+    pgv = None
+
+# DOT keywords, which have to be quoted to be used as IDs
+DOT_KEYWORDS = {'node', 'edge', 'strict', 'graph', 'digraph', 'subgraph'}
 
-def write_dot_file(triples, loose_ents, graph_name, out_loc):
+# Quoted strings longer than this are split over lines, as graphviz does
+MAX_OUTPUTLINE = 128
+
+# IDs and numbers that never need quotes
+PLAIN_ID = re.compile('[A-Za-z_\u0080-\U0010ffff]'
+        '[A-Za-z0-9_\u0080-\U0010ffff]*|-?[0-9]*\\.?[0-9]*')
+
+
+def write_dot_file(triples, loose_ents, graph_name, out_loc,
+        backend='native'):
     """
-    Takes triples and loose entities and uses the graphviz library
-    to format them into a DOT file. 
+    Takes triples and loose entities and formats them into a DOT file. 
 
     parameters:
         triples, list of 3-tuples: (head, relation, tail) triples
         loose_ents, list of str: loose entities 
         graph_name, str: filename for output file 
         out_loc, str: path to save file 
+        backend, str: 'native' or 'pygraphviz', see write_dot_weights
+    """
+    # Get triple weights
+    triple_weights = Counter(triples)
+
+    write_dot_weights(triple_weights, loose_ents, graph_name, out_loc,
+            backend)
+
+
+def is_id_char(c):
+    """
+    Helper for canon_id. Checks if a byte can be part of an unquoted DOT ID.
+
+    parameters:
+        c, int: byte value
+
+    returns: True if it can, False otherwise
+    """
+    return c >= 128 or chr(c).isalnum() or c == ord('_')
+
+
+def is_word_char(c):
+    """
+    Helper for canon_id. Checks if a byte is alphanumeric, a hyphen, a period
+    or part of a non-ASCII character. Graphviz only splits long strings
+    between a byte that isn't one of these and one that is.
+
+    parameters:
+        c, int: byte value
+
+    returns: True if it is, False otherwise
+    """
+    return c >= 128 or chr(c).isalnum() or c in b'-.'
+
+
+def canon_id(name):
+    """
+    Formats a string as a DOT ID the same way graphviz does when writing a
+    file: quoted if it isn't a valid identifier or number or is a keyword,
+    with quotes escaped, and split over lines with backslash-newlines if
+    longer than MAX_OUTPUTLINE.
+
+    Works on the UTF-8 bytes of the string, because that's what graphviz
+    counts when deciding where to split lines.
+
+    parameters:
+        name, str: node name or attribute value
+
+    returns: canon, str: the DOT ID
+    """
+    if name == '':
+        return '""'
+    # Short strings can be checked without going through each byte
+    if len(name) < MAX_OUTPUTLINE//4 and '"' not in name:
+        if name.lower() in DOT_KEYWORDS or name in ('-', '.') or \
+                PLAIN_ID.fullmatch(name) is None:
+            return f'"{name}"'
+        return name
+    arg = name.encode('utf-8')
+    out = bytearray()
+    needs_quotes = False
+    backslash_pending = False
+    escaped = False
+    maybe_num = arg[0] in b'0123456789.-'
+    cnt = 0
+    dotcnt = 0
+    for i, c in enumerate(arg):
+        # Quotes that are already escaped are left alone
+        if c == ord('"'):
+            if not escaped:
+                out.append(ord('\\'))
+            needs_quotes = True
+        elif maybe_num:
+            if c == ord('-'):
+                if cnt:
+                    maybe_num = False
+                    needs_quotes = True
+            elif c == ord('.'):
+                if dotcnt:
+                    maybe_num = False
+                    needs_quotes = True
+                dotcnt += 1
+            elif c not in b'0123456789':
+                maybe_num = False
+                needs_quotes = True
+        elif not is_id_char(c):
+            needs_quotes = True
+        out.append(c)
+        escaped = c == ord('\\') and not escaped
+        cnt += 1
+
+        # Only split after a character that isn't part of a word or a
+        # backslash, and before one that is part of a word
+        if i + 1 < len(arg):
+            can_split = not (is_word_char(out[-1]) or out[-1] == ord('\\')) \
+                    and is_word_char(arg[i + 1])
+            if backslash_pending and can_split:
+                out += b'\\\n'
+                needs_quotes = True
+                backslash_pending = False
+                cnt = 0
+            elif cnt >= MAX_OUTPUTLINE:
+                if can_split:
+                    out += b'\\\n'
+                    needs_quotes = True
+                    cnt = 0
+                else:
+                    backslash_pending = True
+
+    quoted = '"' + out.decode('utf-8') + '"'
+    if needs_quotes or (cnt == 1 and arg[:1] in (b'.', b'-')):
+        return quoted
+    if name.lower() in DOT_KEYWORDS:
+        return quoted
+
+    return name
+
+
+def write_dot_weights(triple_weights, loose_ents, graph_name, out_loc,
+        backend='native'):
+    """
+    Writes a DOT file from triples that have already been counted.
+
+    The native backend streams the file directly and gives the same DOT as
+    the pygraphviz backend, byte for byte: the graph is strict, so the last
+    relation and weight given for a pair of entities is the one that's kept,
+    and edges are grouped by head entity in the order the entities were first
+    seen. The pygraphviz backend builds the whole graph in memory first, which
+    is much slower for large graphs.
+
+    parameters:
+        triple_weights, dict: keys are (head, relation, tail) triples, values
+            are the number of times they occur
+        loose_ents, list of str: loose entities
+        graph_name, str: filename for output file
+        out_loc, str: path to save file
+        backend, str: 'native' or 'pygraphviz', default is 'native'
+    """
+    if backend == 'pygraphviz':
+        write_dot_weights_pgv(triple_weights, loose_ents, graph_name,
+                out_loc)
+        return
+    elif backend != 'native':
+        raise ValueError(f'Unknown backend {backend}, options are native and '
+                'pygraphviz')
+
+    # Entities in the order they're first seen, with the edges where they're
+    # the head. Only one edge is kept per pair of entities
+    out_edges = {}
+    for (head, rel, tail), weight in triple_weights.items():
+        out_edges.setdefault(head, {})
+        out_edges.setdefault(tail, {})
+        out_edges[head][tail] = (rel, weight)
+    has_in_edges = {tail for edges in out_edges.values() for tail in edges}
+    seen_order = {entity: i for i, entity in enumerate(out_edges)}
+    for entity in loose_ents:
+        out_edges.setdefault(entity, {})
+
+    # Save the file
+    with open(f'{out_loc}/{graph_name}.gv', 'w', encoding='utf-8',
+            buffering=2**20) as f:
+        f.write(f'strict digraph {canon_id(graph_name)} {{\n')
+        for entity, edges in out_edges.items():
+            head = canon_id(entity)
+            if len(edges) == 0 and entity not in has_in_edges:
+                f.write(f'\t{head};\n')
+            # Graphviz orders a node's edges by when the tail was first seen
+            for tail in sorted(edges, key=seen_order.get):
+                rel, weight = edges[tail]
+                # Empty labels aren't written
+                label = f'label={canon_id(rel)},\n\t\t' if rel != '' else ''
+                f.write(f'\t{head} -> {canon_id(tail)}\t[{label}'
+                        f'weight={canon_id(str(weight))}];\n')
+        f.write('}\n')
+
+
+def collapse_triples(triple_weights):
+    """
+    Keeps only the last relation and weight given for each pair of entities,
+    the same way they're kept in the strict DOT graph.
+
+    parameters:
+        triple_weights, dict: keys are (head, relation, tail) triples, values
+            are the number of times they occur
+
+    returns:
+        collapsed, dict: the same, with one triple per (head, tail) pair, in
+            the order the pairs were first seen
     """
+    pairs = {}
+    for (head, rel, tail), weight in triple_weights.items():
+        pairs[(head, tail)] = (rel, weight)
+
+    return {(head, rel, tail): weight for (head, tail), (rel, weight)
+            in pairs.items()}
+
+
+def write_dot_weights_pgv(triple_weights, loose_ents, graph_name, out_loc):
+    """
+    Writes a DOT file from triples that have already been counted, using the
+    pygraphviz library.
+
+    parameters:
+        triple_weights, dict: keys are (head, relation, tail) triples, values
+            are the number of times they occur
+        loose_ents, list of str: loose entities
+        graph_name, str: filename for output file
+        out_loc, str: path to save file
+    """
+    if pgv is None:
+        raise ImportError('pygraphviz is required for the pygraphviz backend, '
+                'use the native backend instead')
+
     # Instatiate the graph 
     dot = pgv.AGraph(directed=True, name=graph_name)
 
-    # Get triple weights
-    triple_weights = defaultdict(int)
-    
-    for triple in triples:
-        triple_weights[triple] += 1
-    
     # Add triples 
     for triple, weight in triple_weights.items():
 
@@ -135,32 +374,409 @@ def get_triples(preds):
     return triples
 
 
-def main(dygiepp_preds, graph_name, out_loc):
+def read_preds(dygiepp_preds, doc_stats, start=0, end=None):
+    """
+    Reads dygiepp predictions one doc at a time, skipping failed predictions.
 
-    # Read in the data 
-    print('\nReading in the data...\n')
-    total = 0
-    failed = 0 
-    preds = []
-    with jsonlines.open(dygiepp_preds) as reader:
-        for obj in reader:
-            total += 1
+    parameters:
+        dygiepp_preds, str: path to file with dygiepp output
+        doc_stats, dict: keys are "total" and "failed", updated with the
+            number of docs read and failed predictions skipped
+        start, int: byte offset of the first line to read, default is 0
+        end, int: byte offset to stop reading at, default is the end of the
+            file. Both should be at the start of a line, see get_shards
+
+    yields: doc, dict: dygiepp formatted doc
+    """
+    with open(dygiepp_preds, 'rb') as f:
+        f.seek(start)
+        if end is None:
+            lines = iter(f.readline, b'')
+        else:
+            lines = iter(lambda: f.readline() if f.tell() < end else b'', b'')
+        for obj in jsonlines.Reader(lines):
+            doc_stats['total'] += 1
             if "_FAILED_PREDICTION" in obj.keys():
                 if obj["_FAILED_PREDICTION"]:
-                    failed += 1
-            else: preds.append(obj)
+                    doc_stats['failed'] += 1
+            else: yield obj
 
-    print(f'\nTotal docs: {total}\nFailed predictions: {failed}\n'
-            f'Docs to process: {len(preds)}')
 
-    # Format the predictions as triples & loose entities 
-    print('\nFormatting predictions into triples and entities...\n')
-    triples = get_triples(preds)
-    loose_ents = get_loose_ents(preds, triples)
-    
+def skip_seen_docs(preds, doc_keys, doc_stats):
+    """
+    Skips docs that are already in a graph, and adds the rest to its doc_keys.
+
+    parameters:
+        preds, iterable of dict: dygiepp formatted docs
+        doc_keys, dict: keys are the doc_keys already in the graph, values
+            are None. Updated with the doc_keys of the docs that are yielded
+        doc_stats, dict: "skipped" is updated with the number of docs skipped
+
+    yields: doc, dict: dygiepp formatted doc that isn't in the graph
+    """
+    for doc in preds:
+        if doc['doc_key'] in doc_keys:
+            doc_stats['skipped'] += 1
+        else:
+            doc_keys[doc['doc_key']] = None
+            yield doc
+
+
+def build_triple_counts(preds, triple_weights=None, loose_ents=None,
+        canon=None):
+    """
+    Counts triples and finds loose entities in a single pass over a set of
+    dygiepp predictions. Each doc is tokenized once and not kept, so if preds
+    is a generator, memory is proportional to the number of distinct triples
+    and entities rather than to the number of docs.
+
+    Gives the same triples as get_triples and the same entities as
+    get_loose_ents, without duplicate entities.
+
+    Counts from an earlier call can be passed in to add new docs to them.
+    The result is the same as counting all of the docs at once.
+
+    parameters:
+        preds, iterable of dict: one dict per doc, minimally must contain the
+            keys 'sentences', 'predicted_ner' and 'predicted_relations'
+        triple_weights, dict: triple counts to add to, default is none
+        loose_ents, list of str: loose entities to add to, default is none
+        canon, EntityCanonicalizer instance: if given, entities are replaced
+            by their canonical names before counting, default is none
+
+    returns:
+        triple_weights, Counter: keys are (head, relation, tail) triples,
+            values are the number of times they occur, in order of first
+            occurrence
+        loose_ents, list of str: entities that aren't in any triple, in
+            order of first occurrence
+    """
+    triple_weights = Counter(triple_weights)
+    triple_ents = {ent for head, _, tail in triple_weights
+            for ent in (head, tail)}
+    # Dict instead of set to keep the order of first occurrence
+    ents = dict.fromkeys(loose_ents or [])
+    for doc in preds:
+        # Get full tokenized doc once for both relations and entities
+        tokenized_doc = get_tokenized_doc(doc)
+
+        for per_sentence_rels_list in doc['predicted_relations']:
+            for triple_list in per_sentence_rels_list:
+                head = " ".join(tokenized_doc[triple_list[0]:triple_list[1]+1])
+                tail = " ".join(tokenized_doc[triple_list[2]:triple_list[3]+1])
+                if canon is not None:
+                    head, tail = canon(head), canon(tail)
+                triple_weights[(head, triple_list[4], tail)] += 1
+                triple_ents.add(head)
+                triple_ents.add(tail)
+
+        for per_sentence_ent_list in doc['predicted_ner']:
+            for ent_list in per_sentence_ent_list:
+                ent = " ".join(tokenized_doc[ent_list[0]:ent_list[1]+1])
+                if canon is not None:
+                    ent = canon(ent)
+                ents[ent] = None
+
+    # An entity can be loose in one doc and part of a triple in a later one
+    loose_ents = [ent for ent in ents if ent not in triple_ents]
+
+    return triple_weights, loose_ents
+
+
+# Each worker gets this many shards of each file on average, so that they
+# finish at about the same time even if some shards are slower
+SHARDS_PER_WORKER = 4
+
+
+def get_shards(dygiepp_preds, num_shards):
+    """
+    Splits prediction files into byte ranges of about the same size, moving
+    each boundary forward to the start of the next line.
+
+    parameters:
+        dygiepp_preds, list of str: paths to files with dygiepp output
+        num_shards, int: number of ranges to split each file into. Fewer are
+            made if some would be empty
+
+    returns: shards, list of tuple: (path, start, end) for each range, in
+        file order
+    """
+    shards = []
+    for pred_file in dygiepp_preds:
+        size = getsize(pred_file)
+        bounds = [0]
+        with open(pred_file, 'rb') as f:
+            for i in range(1, num_shards):
+                pos = max(size*i//num_shards, bounds[-1])
+                # Go back one byte so a boundary already at the start of a
+                # line stays there
+                if pos > 0:
+                    f.seek(pos - 1)
+                    f.readline()
+                    pos = f.tell()
+                bounds.append(pos)
+        bounds.append(size)
+        shards.extend((pred_file, start, end) for start, end in
+                zip(bounds[:-1], bounds[1:]) if end > start)
+
+    return shards
+
+
+def merge_shard_counts(shard_counts, triple_weights=None, loose_ents=None):
+    """
+    Combines the output of build_triple_counts for consecutive shards of the
+    predictions. The result is the same as counting all of the shards in one
+    pass, including the order of the triples and entities.
+
+    parameters:
+        shard_counts, list of tuple: (triple_weights, loose_ents) for each
+            shard, in order
+        triple_weights, dict: triple counts to add to, default is none
+        loose_ents, list of str: loose entities to add to, default is none
+
+    returns:
+        triple_weights, Counter: merged triple counts
+        loose_ents, list of str: entities that aren't in any triple, in order
+            of first occurrence
+    """
+    triple_weights = Counter(triple_weights)
+    shard_ents = [loose_ents or []]
+    for weights, ents in shard_counts:
+        triple_weights.update(weights)
+        shard_ents.append(ents)
+    triple_ents = {ent for head, _, tail in triple_weights
+            for ent in (head, tail)}
+    # An entity that's loose in every shard it's in is loose overall, and its
+    # first occurrence is in the first shard that has it
+    loose_ents = [ent for ent in dict.fromkeys(chain.from_iterable(shard_ents))
+            if ent not in triple_ents]
+
+    return triple_weights, loose_ents
+
+
+# doc_keys already in the graph and the entity canonicalizer, shared with
+# pool workers by _init_worker
+_doc_keys = None
+_canon = None
+
+
+def _init_worker(doc_keys, canon):
+    """
+    Pool initializer. With the fork start method the doc_keys and
+    canonicalizer are inherited from the parent rather than copied through a
+    pipe.
+    """
+    global _doc_keys, _canon
+    _doc_keys = doc_keys
+    _canon = canon
+
+
+def _count_shard_worker(shard):
+    """
+    Counts the triples and loose entities in one shard. Runs in a pool
+    worker.
+
+    parameters:
+        shard, tuple: (path, start, end), see get_shards
+
+    returns:
+        triple_weights, Counter: triple counts for the shard
+        loose_ents, list of str: entities that are loose within the shard
+        doc_stats, dict: counts of docs read, failed and skipped
+        new_keys, list of str: doc_keys of the docs that were counted, or
+            None if there's no ledger of doc_keys
+    """
+    doc_stats = {'total': 0, 'failed': 0, 'skipped': 0}
+    pred_file, start, end = shard
+    preds = read_preds(pred_file, doc_stats, start, end)
+    new_keys = None
+    if _doc_keys is not None:
+        # New keys go in the first map, so the shared ledger isn't changed
+        new_keys = ChainMap({}, _doc_keys)
+        preds = skip_seen_docs(preds, new_keys, doc_stats)
+    triple_weights, loose_ents = build_triple_counts(preds, canon=_canon)
+    if new_keys is not None:
+        new_keys = list(new_keys.maps[0])
+
+    return triple_weights, loose_ents, doc_stats, new_keys
+
+
+def get_mp_context():
+    """
+    Get the multiprocessing context for worker pools. Fork is used where
+    available, so workers inherit large objects instead of copying them.
+    """
+    if 'fork' in mp.get_all_start_methods():
+        return mp.get_context('fork')
+    else:
+        return mp.get_context()
+
+
+def build_triple_counts_parallel(dygiepp_preds, workers, doc_stats,
+        triple_weights=None, loose_ents=None, doc_keys=None, canon=None):
+    """
+    Counts triples and finds loose entities with a pool of processes, each
+    reading byte ranges of the prediction files. Gives the same result as
+    build_triple_counts over read_preds of each file.
+
+    parameters:
+        dygiepp_preds, list of str: paths to files with dygiepp output
+        workers, int: number of processes
+        doc_stats, dict: keys are "total", "failed" and "skipped", updated
+            with the number of docs read, failed and skipped
+        triple_weights, dict: triple counts to add to, default is none
+        loose_ents, list of str: loose entities to add to, default is none
+        doc_keys, dict: if given, docs with these doc_keys are skipped as in
+            skip_seen_docs, and the doc_keys of the counted docs are added
+        canon, EntityCanonicalizer instance: passed to build_triple_counts in
+            each worker, default is none
+
+    returns:
+        triple_weights, Counter: keys are (head, relation, tail) triples,
+            values are the number of times they occur
+        loose_ents, list of str: entities that aren't in any triple
+    """
+    shards = get_shards(dygiepp_preds, workers*SHARDS_PER_WORKER)
+    with get_mp_context().Pool(workers, initializer=_init_worker,
+            initargs=(doc_keys, canon)) as pool:
+        # map keeps the results in the order of the shards
+        results = pool.map(_count_shard_worker, shards)
+
+    # A doc that's in more than one shard would only be counted once by
+    # skip_seen_docs, which can't be done after the fact
+    if doc_keys is not None:
+        new_keys = [key for result in results for key in result[3]]
+        if len(set(new_keys)) != len(new_keys):
+            print('Some new docs have the same doc_key, counting them '
+                    'in one process instead')
+            preds = chain.from_iterable(read_preds(pred_file, doc_stats)
+                    for pred_file in dygiepp_preds)
+            return build_triple_counts(skip_seen_docs(preds, doc_keys,
+                doc_stats), triple_weights, loose_ents, canon)
+        doc_keys.update(dict.fromkeys(new_keys))
+
+    for result in results:
+        for stat, value in result[2].items():
+            doc_stats[stat] += value
+
+    return merge_shard_counts([result[:2] for result in results],
+            triple_weights, loose_ents)
+
+
+def save_counts(counts_dir, triple_weights, loose_ents, doc_keys):
+    """
+    Saves the counts that a graph was made from, so that more docs can be
+    added to it later. Each file is written in full before it replaces the
+    old one.
+
+    parameters:
+        counts_dir, str: directory to save to, made if it doesn't exist
+        triple_weights, dict: keys are (head, relation, tail) triples, values
+            are the number of times they occur
+        loose_ents, list of str: loose entities
+        doc_keys, iterable of str: doc_keys of the docs in the graph
+
+    returns: None
+    """
+    makedirs(counts_dir, exist_ok=True)
+    files = {'triples.jsonl': ([head, rel, tail, weight] for
+        (head, rel, tail), weight in triple_weights.items()),
+        'loose_ents.jsonl': loose_ents, 'doc_keys.jsonl': doc_keys}
+    for fname, objs in files.items():
+        path = f'{counts_dir}/{fname}'
+        with jsonlines.open(f'{path}.tmp', 'w') as writer:
+            writer.write_all(objs)
+        replace(f'{path}.tmp', path)
+
+
+def load_counts(counts_dir):
+    """
+    Reads counts saved with save_counts. If counts_dir doesn't exist, the
+    counts are empty.
+
+    parameters:
+        counts_dir, str: directory the counts were saved to
+
+    returns:
+        triple_weights, Counter: keys are (head, relation, tail) triples,
+            values are the number of times they occur
+        loose_ents, list of str: loose entities
+        doc_keys, dict: keys are the doc_keys of the docs in the graph,
+            values are None
+    """
+    if not exists(counts_dir):
+        return Counter(), [], {}
+    with jsonlines.open(f'{counts_dir}/triples.jsonl') as reader:
+        triple_weights = Counter({(head, rel, tail): weight
+            for head, rel, tail, weight in reader})
+    with jsonlines.open(f'{counts_dir}/loose_ents.jsonl') as reader:
+        loose_ents = list(reader)
+    with jsonlines.open(f'{counts_dir}/doc_keys.jsonl') as reader:
+        doc_keys = dict.fromkeys(reader)
+
+    return triple_weights, loose_ents, doc_keys
+
+
+def main(dygiepp_preds, graph_name, out_loc, backend='native',
+        snapshot=False, incremental=False, workers=1, canonicalize=False,
+        synonyms=None):
+
+    # Set up entity canonicalization
+    canon = None
+    if canonicalize or synonyms is not None:
+        canon = EntityCanonicalizer(load_synonyms(synonyms) if synonyms
+                is not None else None)
+        print('Canonicalizing entity names' + (f' with {len(canon.synonyms)} '
+            f'synonyms from {synonyms}' if synonyms is not None else ''))
+
+    # Read in the data and format the predictions as triples & loose
+    # entities in one pass
+    print('\nReading in the data and formatting predictions into triples and '
+            'entities...\n')
+    doc_stats = {'total': 0, 'failed': 0, 'skipped': 0}
+    triple_weights, loose_ents, doc_keys = None, None, None
+    if incremental:
+        counts_dir = f'{out_loc}/{graph_name}_counts'
+        triple_weights, loose_ents, doc_keys = load_counts(counts_dir)
+        print(f'Adding to {len(doc_keys)} docs already in the graph')
+    if workers > 1:
+        print(f'Counting with {workers} workers')
+        triple_weights, loose_ents = build_triple_counts_parallel(
+                dygiepp_preds, workers, doc_stats, triple_weights, loose_ents,
+                doc_keys, canon)
+    else:
+        preds = chain.from_iterable(read_preds(pred_file, doc_stats)
+                for pred_file in dygiepp_preds)
+        if incremental:
+            preds = skip_seen_docs(preds, doc_keys, doc_stats)
+        triple_weights, loose_ents = build_triple_counts(preds,
+                triple_weights, loose_ents, canon)
+        if canon is not None:
+            print(f'{len(canon.ids)} entity names were merged into '
+                    f'{len(canon)} nodes')
+
+    num_processed = doc_stats["total"] - doc_stats["failed"] - \
+            doc_stats["skipped"]
+    print(f'\nTotal docs: {doc_stats["total"]}\nFailed predictions: '
+            f'{doc_stats["failed"]}\nAlready in graph: '
+            f'{doc_stats["skipped"]}\nDocs processed: {num_processed}')
+
     # Write to doc 
     print('\nWriting predictions to DOT file...\n')
-    write_dot_file(triples, loose_ents, graph_name, out_loc)    
+    write_dot_weights(triple_weights, loose_ents, graph_name, out_loc, backend)
+
+    # Save snapshot
+    if snapshot:
+        snapshot_dir = f'{out_loc}/{graph_name}_snapshot'
+        print(f'\nSaving snapshot to {snapshot_dir}...\n')
+        save_snapshot(GraphStore.from_triples(
+            collapse_triples(triple_weights), loose_ents, graph_name),
+            snapshot_dir)
+
+    # Save counts for the next batch
+    if incremental:
+        print(f'\nSaving counts to {counts_dir}...\n')
+        save_counts(counts_dir, triple_weights, loose_ents, doc_keys)
     print('\nDone!\n')
 
     
@@ -168,16 +784,47 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='Put dygiepp output into DOT')
 
-    parser.add_argument('-dygiepp_preds', type=str, 
-            help='Path to file with dygiepp output')
+    parser.add_argument('-dygiepp_preds', type=str, nargs='+',
+            help='Paths to files with dygiepp output')
     parser.add_argument('-graph_name', type=str, 
             help='Filename for dot file')
     parser.add_argument('-out_loc', type=str,
             help='Path tp save the output')
+    parser.add_argument('-backend', type=str, default='native',
+            choices=['native', 'pygraphviz'],
+            help='How to write the DOT file. native streams it directly and '
+            'is much faster for large graphs, pygraphviz builds the graph in '
+            'memory first. Default is native')
+    parser.add_argument('--snapshot', action='store_true',
+            help='Also save the graph as a directory of memory-mappable '
+            'arrays, <graph_name>_snapshot, that graph_filtering.py and '
+            'graph_components.py can read in place of the DOT file')
+    parser.add_argument('--incremental', action='store_true',
+            help='Add the predictions to the counts saved by the last run '
+            'with --incremental for the same -graph_name and -out_loc, '
+            'skipping docs that are already in the graph. The counts are '
+            'saved in <graph_name>_counts')
+    parser.add_argument('-workers', type=int, default=1,
+            help='Number of processes to read the predictions with. Each '
+            'file is split into byte ranges that are counted in parallel, and '
+            'the graph is the same for any number of workers. Default is 1')
+    parser.add_argument('--canonicalize', action='store_true',
+            help='Normalize the case, whitespace and punctuation of entity '
+            'names, so that different spellings of an entity are one node')
+    parser.add_argument('-synonyms', type=str, default=None,
+            help='Path to a JSON list of lists of synonyms, where the first '
+            'name in each list is the canonical one, e.g. from '
+            'get_keywords.py --synonyms. Aliases are merged into the '
+            'canonical node. Implies --canonicalize')
 
     args = parser.parse_args()
 
-    args.dygiepp_preds = abspath(args.dygiepp_preds)
+    args.dygiepp_preds = [abspath(pred_file) for pred_file in
+            args.dygiepp_preds]
     args.out_loc = abspath(args.out_loc)
+    if args.synonyms is not None:
+        args.synonyms = abspath(args.synonyms)
 
-    main(args.dygiepp_preds, args.graph_name, args.out_loc)
+    main(args.dygiepp_preds, args.graph_name, args.out_loc, args.backend,
+            args.snapshot, args.incremental, args.workers, args.canonicalize,
+            args.synonyms)
@@ -0,0 +1,57 @@
+"""
+Finds the weakly connected components of a DOT file or snapshot made by
+dygiepp_to_DOT.py and saves them as an index next to it, with the same base
+filename and '_components.npz' appended.
+
+graph_filtering.py uses the index for keyword cluster filtering when it's
+there, so only the components that contain the keywords are looked at. The
+index is only used if the DOT file hasn't changed since it was made, and if
+--remove_ents is the same for both scripts.
+
+Author: Serena G. Lotreck
+"""
+import argparse
+from os.path import abspath
+
+from graph_filtering import read_dot
+from graph_store import build_component_index, get_index_file, \
+        hash_source, save_component_index
+
+
+def main(dot_file, remove_ents):
+
+    # Read in dot file
+    print('\nReading in dot file...')
+    graph = read_dot(dot_file, remove_ents)
+
+    # Find components
+    print('\nFinding connected components...')
+    index = build_component_index(graph)
+    num_comps = len(index['comp_node_ptr']) - 1
+    print(f'Found {num_comps} components in a graph with {graph.num_nodes} '
+            f'nodes and {graph.num_edges} edges')
+
+    # Save
+    index_file = get_index_file(dot_file)
+    save_component_index(index_file, index, hash_source(dot_file),
+            remove_ents)
+    print(f'\nIndex saved as {index_file}')
+
+    print('\n\nDone!')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Index graph components')
+
+    parser.add_argument('-dot_file', type=str,
+            help='Path to dot file or snapshot directory to index')
+    parser.add_argument('--remove_ents', action='store_true',
+            help='Removes loose entities from the graph before indexing. '
+            'Use this if graph_filtering.py will be run with --remove_ents.')
+
+    args = parser.parse_args()
+
+    args.dot_file = abspath(args.dot_file)
+
+    main(**vars(args))
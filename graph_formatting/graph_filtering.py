@@ -10,12 +10,25 @@ Author: Serena G. Lotreck
 """
 import argparse 
 from os.path import abspath
+from os.path import exists
+from os.path import isdir
 from os.path import basename
 from os.path import splitext
+from os.path import normpath
 
-import pygraphviz as pgv
+import numpy as np
 from random import sample
 
+from canonicalize import EntityCanonicalizer, load_synonyms
+from graph_store import GraphStore, component_subgraph, get_index_file, \
+        hash_source, load_component_index, load_snapshot
+from dygiepp_to_DOT import write_dot_weights
+
+try:
+    import pygraphviz as pgv
+except ImportError:
+    pgv = None
+
 
 def keyword_direct_filter(graph, keywords):
     """
@@ -23,90 +36,56 @@ def keyword_direct_filter(graph, keywords):
     entities that include the keywords. 
 
     parameters:
-        graph, pgv AGraph instance: the complete graph to filter 
+        graph, GraphStore instance: the complete graph to filter 
         keywords, list of str: list of keywords to filter by 
 
     returns:
-        graph_copy, pgv AGraph instance: the filtered graph
+        filtered, GraphStore instance: the filtered graph
     """
-    graph_copy = graph.copy()
-
-    for node in graph_copy.nodes():
-        
-        # Check if the node is one of the keywords
-        if node not in keywords:
-
-            # Check if it connects to a keyword directly
-            connected = False
-            done = False
-            while not done: # Until we find a connection to a keyword, 
-                            # or go through all keywords
-                for keyword in keywords:
-                    
-                    # Check if it's connected to this keyword
-                    if graph_copy.has_neighbor(node, keyword):
+    # Keep the keywords and any node that's a neighbor of a keyword
+    keep = np.zeros(graph.num_nodes, dtype=bool)
+    for keyword_id in graph.get_ids(keywords):
+        keep[keyword_id] = True
+        keep[graph.successors(keyword_id)] = True
+        keep[graph.predecessors(keyword_id)] = True
 
-                        connected = True
-                        done = True
-                done = True
+    return graph.subgraph(keep)
 
-            if not connected:
-                graph_copy.delete_node(node)
 
-    return graph_copy
-
-
-def keyword_cluster_filter(graph, keywords):
+def keyword_cluster_filter(graph, keywords, max_hops=None, min_weight=None,
+        relations=None, component_index=None):
     """
     Filter graph by a set of keywords, keeping only triples and
     entities that eventually connect back to one of the keywords.
 
+    Does a breadth-first search from all keywords at once, following edges
+    in either direction.
+
     parameters:
-        graph, pgv AGraph instance: the complete graph to filter 
+        graph, GraphStore instance: the complete graph to filter 
         keywords, list of str: list of keywords to filter by 
+        max_hops, int: only keep entities at most this many edges from a
+            keyword, default is no limit
+        min_weight, float: only follow and keep edges with at least this
+            weight, default is no minimum
+        relations, list of str: only follow and keep edges with these
+            relation labels, default is all
+        component_index, dict: output of graph_store.build_component_index
+            for graph. If given and there are no other options, the
+            components of the keywords are looked up instead of searched for
 
     returns:
-        graph_copy, pgv AGraph instance: the filtered graph
+        filtered, GraphStore instance: the filtered graph
     """
-    graph_copy = graph.copy()
-    for node in graph_copy.nodes():
+    if component_index is not None and max_hops is None and \
+            min_weight is None and relations is None:
+        return component_subgraph(graph, graph.get_ids(keywords),
+                component_index)
 
-        # Account for the fact that we might have deleted this with another cluster
-        if node in graph_copy.nodes():
-            
-            # Check if node is one of the keywords
-            if node not in keywords:
-
-                # Check if any keywords are connected to the node
-                if graph_copy.neighbors(node) != []:
-                    
-                    connected = False
-                    done = False
-                    
-                    while not done: # Until we find a connection to a keyword, 
-                                    # or go through all keywords 
-                        for keyword in keywords:
-                            
-                            # Check if it's connected to this keyword
-                            if (keyword in graph_copy.predecessors(node)) or  \
-                                    (keyword in graph_copy.successors(node)):
-                                
-                                connected = True
-                                done = True
-                        
-                        done = True
-                    
-                    if not connected:
-                        
-                        all_connections = graph_copy.predecessors(node) + \
-                                            graph_copy.successors(node)
-                        graph_copy.delete_nodes_from(all_connections)
-                
-                else: 
-                    
-                    graph_copy.delete_node(node)
-
-        return graph_copy 
+    edge_mask = graph.edge_filter(min_weight, relations)
+    dist = graph.bfs(graph.get_ids(keywords), max_hops, edge_mask)
+
+    return graph.subgraph(dist != -1, edge_mask)
 
 
 def random_num_filter(graph, num):
@@ -118,52 +97,53 @@ def random_num_filter(graph, num):
     a new one chosen.
 
     parameters:
-        graph, pgv AGraph instance: the complete graph to filter 
+        graph, GraphStore instance: the complete graph to filter 
         num, int: the number of selections to make
 
     returns:
-        new_graph, pgv AGraph instance: the filtered graph
+        new_graph, GraphStore instance: the filtered graph
     """
     # Get random nodes and leftovers 
-    all_nodes = graph.nodes()
-    random_nodes = sample(all_nodes, num)
-    not_selected_nodes = [node for node in all_nodes if node not in random_nodes]
-    
-    # Make new graph to add the chosen nodes and triples 
-    new_graph = pgv.AGraph()
+    random_nodes = sample(range(graph.num_nodes), num)
+    selected = set(random_nodes)
+    not_selected_nodes = [node for node in range(graph.num_nodes)
+            if node not in selected]
+
+    # Nodes and edges to keep
+    keep_nodes = np.zeros(graph.num_nodes, dtype=bool)
+    keep_edges = np.zeros(graph.num_edges, dtype=bool)
 
-    # Add nodes to new graph 
     for node in random_nodes:
 
+        out_edges = graph.out_edges[graph.out_ptr[node]:
+                graph.out_ptr[node + 1]]
+        in_edges = graph.in_edges[graph.in_ptr[node]:graph.in_ptr[node + 1]]
         neighbors = graph.neighbors(node)
+        keep_nodes[node] = True
         # If the node has neighbors, choose random triple
-        if neighbors != []:
+        if len(neighbors) != 0:
             
-            # Choose random neighbor & get its edge label 
-            random_neighbor = sample(neighbors, 1)[0]
+            # Choose random neighbor
+            random_neighbor = sample(neighbors.tolist(), 1)[0]
 
             # Check if random choice is in the original list of len(num)
-            if random_neighbor in random_nodes:
+            if random_neighbor in selected:
                 # Remove it and replace it with another 
                 new_node = sample(not_selected_nodes, 1)[0] # Get new node 
                 not_selected_nodes.remove(new_node)      # Remove from those not selected
                 random_nodes.remove(node)                # Remove the old node from chosen list
                 random_nodes.append(new_node)            # Add new node to chosen list
+                selected.discard(node)
+                selected.add(new_node)
             
-            # Get edge label & add triple to new graph
-            if random_neighbor in graph.predecessors(node):
-                edge = graph.get_edge(random_neighbor, node)
-            else:
-                edge = graph.get_edge(node, random_neighbor)
-            edge_label = edge.attr["label"]
-            new_graph.add_edge(node, random_neighbor, label=edge_label) # Nodes are added if not 
-                                                                        # already present
-        # If it's just a loose entity, add it 
-        else:
-
-            new_graph.add_node(node)
+            # Keep the triple, with the edge in whichever direction it goes
+            edges = np.concatenate([out_edges[graph.dst[out_edges] ==
+                random_neighbor], in_edges[graph.src[in_edges] ==
+                random_neighbor]])
+            keep_edges[edges[0]] = True
+            keep_nodes[random_neighbor] = True
 
-    return new_graph
+    return graph.subgraph(keep_nodes, keep_edges)
 
 
 def read_dot(dot_file, remove_ents):
@@ -171,24 +151,33 @@ def read_dot(dot_file, remove_ents):
     Read in triples from a DOT file. If remove_ents is True, leaves 
     loose entities out when reading file. 
 
+    If dot_file is a snapshot directory saved by dygiepp_to_DOT.py, it's
+    memory-mapped instead of parsed.
+
     parameters;
-        dot_file, str: path to valid DOT file
+        dot_file, str: path to valid DOT file or snapshot directory
         remove_ents, bool: if True, remove entities while reading
 
     returns: 
-        graph, pgv AGraph instance: the graph from the DOT file, with 
+        graph, GraphStore instance: the graph from the DOT file, with 
             loose entities removed if remove_ents == True  
     """
     # Read in the full graph 
-    base_graph_name = basename(dot_file)
-    base_graph_name = splitext(base_graph_name)[0]
-    graph = pgv.AGraph(dot_file, name=base_graph_name, directed=True)
+    if isdir(dot_file):
+        graph = load_snapshot(dot_file)
+    else:
+        if pgv is None:
+            raise ImportError('pygraphviz is required to read DOT files, '
+                    'use a snapshot directory from dygiepp_to_DOT.py '
+                    '--snapshot instead')
+        base_graph_name = basename(dot_file)
+        base_graph_name = splitext(base_graph_name)[0]
+        graph = GraphStore.from_agraph(pgv.AGraph(dot_file,
+            name=base_graph_name, directed=True))
 
     # Remove loose entities if specified
     if remove_ents:
-        for node in graph.nodes():
-            if graph.neighbors(node) == []:
-                graph.delete_node(node)
+        graph = graph.subgraph(graph.degree() != 0)
     
     return graph
 
@@ -201,16 +190,15 @@ def check_number(graph, num):
     the total number of nodes divided by 2.
 
     parameters:
-        graph, pgv AGraph instance: compelte graph 
+        graph, GraphStore instance: compelte graph 
         num, int: the number of nodes to choose
     
     returns: None
     """
-    nodes = graph.nodes()
-
-    assert num <= len(nodes)/2, ('The number you have chosen is greater '
-                                f'than the allowed maximum: {num} selected, '
-                                f'{len(nodes)/2} is the maximum.')
+    assert num <= graph.num_nodes/2, ('The number you have chosen is '
+                                'greater than the allowed maximum: '
+                                f'{num} selected, {graph.num_nodes/2} is the '
+                                'maximum.')
 
 
 def check_keywords(graph, keywords):
@@ -219,23 +207,60 @@ def check_keywords(graph, keywords):
     Raises an AssertionError if they aren't.
 
     parameters:
-        graph, pgv AGraph instance: the complete graph 
+        graph, GraphStore instance: the complete graph 
         keywords, list of str: keywords to check 
     
     returns: None
     """
-    nodes = graph.nodes()
     keywords_present = True
     problem_words = []
     for keyword in keywords:
-        if keyword not in nodes:
+        if not graph.has_node(keyword):
             keywords_present = False
             problem_words.append(keyword)
     assert keywords_present, ('The following keywords are not nodes in '
                                 f'the graph: {problem_words}')
 
             
-def main(dot_file, filter_type, keywords, num, remove_ents, out_loc):
+def read_component_index(dot_file, remove_ents, graph):
+    """
+    Read the component index saved next to a DOT file or snapshot by
+    graph_components.py, if there is one and it was made from the same file
+    and options.
+
+    parameters:
+        dot_file, str: path to the DOT file or snapshot directory
+        remove_ents, bool: whether loose entities were removed from graph
+        graph, GraphStore instance: the graph read from dot_file
+
+    returns: index, dict: the component index, or None if there isn't a
+        usable one
+    """
+    index_file = get_index_file(dot_file)
+    if not exists(index_file):
+        return None
+    index = load_component_index(index_file)
+    if index['dot_hash'] != hash_source(dot_file) or \
+            index['remove_ents'] != remove_ents or \
+            index['num_nodes'] != graph.num_nodes or \
+            index['num_edges'] != graph.num_edges:
+        print(f'Component index {index_file} is out of date and won\'t be '
+                'used, rerun graph_components.py to update it')
+        return None
+    print(f'Using component index {index_file}')
+
+    return index
+
+
+def main(dot_file, filter_type, keywords, num, remove_ents, out_loc,
+        max_hops=None, min_weight=None, relations=None, canonicalize=False,
+        synonyms=None):
+
+    # Match keywords to canonical node names if the graph was made with them
+    if canonicalize or synonyms is not None:
+        canon = EntityCanonicalizer(load_synonyms(synonyms) if synonyms
+                is not None else None)
+        keywords = list(dict.fromkeys(canon(keyword) for keyword in keywords))
 
     # Read in dot file 
     print('\nReading in dot file...\n')
@@ -248,8 +273,10 @@ def main(dot_file, filter_type, keywords, num, remove_ents, out_loc):
 
     # Get basename for later 
     print('\nGetting basename...')
-    base_graph_name = basename(dot_file)
-    base_graph_name = splitext(base_graph_name)[0]
+    if isdir(dot_file):
+        base_graph_name = graph.name or basename(normpath(dot_file))
+    else:
+        base_graph_name = splitext(basename(dot_file))[0]
     print(f'Basename is {base_graph_name}\n')
 
     # Filter 
@@ -264,7 +291,9 @@ def main(dot_file, filter_type, keywords, num, remove_ents, out_loc):
         print('Performing keyword direct filter...')
         key_direct_graph = keyword_direct_filter(graph, keywords)
         print('Performing keyword cluster filter...')
-        key_cluster_graph = keyword_cluster_filter(graph, keywords)
+        component_index = read_component_index(dot_file, remove_ents, graph)
+        key_cluster_graph = keyword_cluster_filter(graph, keywords, max_hops,
+                min_weight, relations, component_index)
         print('Performing random number filter...')
         random_num_graph = random_num_filter(graph, num)
 
@@ -294,7 +323,10 @@ def main(dot_file, filter_type, keywords, num, remove_ents, out_loc):
 
             print('Performing keyword cluster filter...')
             
-            key_cluster_graph = keyword_cluster_filter(graph, keywords)
+            component_index = read_component_index(dot_file, remove_ents,
+                    graph)
+            key_cluster_graph = keyword_cluster_filter(graph, keywords,
+                    max_hops, min_weight, relations, component_index)
 
             graphs = {f'{ent_name}_{base_graph_name}':graph,
                         f'keyword_cluster_{base_graph_name}':key_cluster_graph}
@@ -316,7 +348,8 @@ def main(dot_file, filter_type, keywords, num, remove_ents, out_loc):
     print(base_graph_name)
     for graph_name, graph_instance in graphs.items():
 
-        graph_instance.write(f'{out_loc}/{graph_name}.gv')
+        triple_weights, loose_ents = graph_instance.to_triple_weights()
+        write_dot_weights(triple_weights, loose_ents, graph_name, out_loc)
         
         print(f'File saved as {out_loc}/{graph_name}.gv')
 
@@ -328,7 +361,8 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Filter down DOT file')
 
     parser.add_argument('-dot_file', type=str,
-            help='Path to dot file to filter')
+            help='Path to dot file to filter, or to a snapshot directory '
+            'made with the --snapshot option of dygiepp_to_DOT.py')
     parser.add_argument('-filter_type', type=str,
             help='Options are "keyword_direct", "keyword_cluster", ' 
                 '"random_num" and "all". "keyword_direct" gives only triples '
@@ -351,11 +385,30 @@ if __name__ == '__main__':
             'specified.')
     parser.add_argument('-out_loc', type=str,
             help='Path to save the filtered dot file')
+    parser.add_argument('-max_hops', type=int,
+            help='For "keyword_cluster", only keep entities at most this many '
+                'edges away from a keyword. Default is no limit.',
+            default=None)
+    parser.add_argument('-min_weight', type=float,
+            help='For "keyword_cluster", only follow edges with at least '
+                'this weight. Default is no minimum.', default=None)
+    parser.add_argument('-relations', nargs='+',
+            help='For "keyword_cluster", only follow edges with these '
+                'relation labels. Default is all relations.', default=None)
+    parser.add_argument('--canonicalize', action='store_true',
+            help='Canonicalize the keywords, for graphs made with '
+                '--canonicalize in dygiepp_to_DOT.py')
+    parser.add_argument('-synonyms', type=str,
+            help='Synonym table used to make the graph with dygiepp_to_DOT.py, '
+                'so keywords can be given as any of their synonyms. Implies '
+                '--canonicalize', default=None)
 
 
     args = parser.parse_args()
 
     args.dot_file = abspath(args.dot_file)
     args.out_loc  = abspath(args.out_loc)
+    if args.synonyms is not None:
+        args.synonyms = abspath(args.synonyms)
 
     main(**vars(args))
@@ -0,0 +1,709 @@
+"""
+Classes to store a knowledge graph compactly in memory for filtering.
+
+Node names are interned to integer IDs, and edges are stored as arrays of
+source IDs, destination IDs, relation label IDs and weights, with the in and
+out edges of each node indexed in compressed sparse row (CSR) form. This
+means that finding the neighbors of a node is a slice of an array instead of
+a call into graphviz. Node names are kept in a StringTable, one array of
+UTF-8 bytes with an array of offsets.
+
+All of these arrays can be saved as a snapshot directory of .npy files, and
+loaded memory-mapped, so that a large graph can be filtered without parsing
+the DOT file or reading the whole graph into memory.
+
+Also has functions to find the weakly connected components of a graph and
+save them as an index, so that the components containing a set of keywords
+can be found without searching the graph.
+
+pygraphviz is only needed to convert to and from AGraph instances.
+
+Author: Serena G. Lotreck
+"""
+import hashlib
+import json
+from os import makedirs
+from os.path import isdir, join, splitext
+
+import numpy as np
+
+try:
+    import pygraphviz as pgv
+except ImportError:
+    pgv = None
+
+
+def gather_csr(ptr, order, node_ids):
+    """
+    Get the entries of a CSR index for a set of nodes without looping over
+    them.
+
+    parameters:
+        ptr, array of int: offsets of each node's entries in order
+        order, array of int: the entries, grouped by node
+        node_ids, array of int: nodes to get the entries of
+
+    returns: entries, array of int: the entries of all the nodes, in the
+        order of node_ids
+    """
+    starts = ptr[node_ids]
+    counts = ptr[np.asarray(node_ids) + 1] - starts
+    # Position of each entry in the output, minus the position of the first
+    # entry for its node, plus where that node's entries start in order
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+
+    return order[offsets + np.arange(len(offsets))]
+
+
+# Changes whenever the files in a snapshot change, so that old snapshots
+# aren't misread
+SNAPSHOT_VERSION = 1
+
+# Arrays saved in a snapshot, other than the node names
+SNAPSHOT_ARRAYS = ['src', 'dst', 'label_ids', 'weights', 'out_edges',
+        'out_ptr', 'in_edges', 'in_ptr']
+
+
+class StringTable():
+    """
+    Stores a list of strings as one array of UTF-8 bytes and an array of
+    offsets, so that it can be saved and memory-mapped. String i is
+    blob[offsets[i]:offsets[i + 1]].
+    """
+    def __init__(self, blob, offsets, order=None):
+        """
+        Initialize a StringTable from its arrays.
+
+        parameters:
+            blob, array of uint8: the strings' bytes, one after the other
+            offsets, array of int: where each string starts in blob, plus the
+                length of blob
+            order, array of int: the string indices in sorted order. Used to
+                look up strings by binary search. If None, a dict is made the
+                first time a string is looked up
+        """
+        self.blob = blob
+        self.offsets = offsets
+        self.order = order
+        self.ids = None
+
+    @classmethod
+    def from_strings(cls, strings):
+        """
+        Make a StringTable from a list of str.
+        """
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        return cls(blob, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes(
+                ).decode('utf-8')
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        """
+        Returns all of the strings as a list of str.
+        """
+        blob = self.blob.tobytes()
+        offsets = self.offsets.tolist()
+        return [blob[start:end].decode('utf-8') for start, end in
+                zip(offsets[:-1], offsets[1:])]
+
+    def take(self, ids):
+        """
+        Returns a new StringTable with the strings at a sorted array of
+        indices.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(self.offsets[ids + 1] - self.offsets[ids],
+                out=offsets[1:])
+
+        return StringTable(gather_csr(self.offsets, self.blob, ids), offsets)
+
+    def sort_order(self):
+        """
+        Returns the string indices sorted by their UTF-8 bytes.
+        """
+        blob = self.blob.tobytes()
+        offsets = self.offsets
+        return np.array(sorted(range(len(self)),
+            key=lambda i: blob[offsets[i]:offsets[i + 1]]), dtype=np.int64)
+
+    def find(self, string):
+        """
+        Returns the index of a string, or -1 if it isn't in the table.
+        """
+        if self.order is None:
+            if self.ids is None:
+                self.ids = {s: i for i, s in enumerate(self.tolist())}
+            return self.ids.get(string, -1)
+
+        # Binary search through the sorted order
+        target = string.encode('utf-8')
+        low, high = 0, len(self.order)
+        while low < high:
+            mid = (low + high)//2
+            i = self.order[mid]
+            if self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes() < \
+                    target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self.order):
+            i = self.order[low]
+            if self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes() == \
+                    target:
+                return int(i)
+
+        return -1
+
+
+class GraphStore():
+    """
+    Stores the nodes and edges of a directed graph as NumPy arrays.
+    """
+    def __init__(self, nodes, src, dst, label_ids, labels, weights,
+            name='graph', csr=None):
+        """
+        Initialize a GraphStore from node names and edge arrays.
+
+        parameters:
+            nodes, StringTable or list of str: node names, where the index is
+                the node ID
+            src, array of int: node ID of the head of each edge
+            dst, array of int: node ID of the tail of each edge
+            label_ids, array of int: index in labels of each edge's relation
+            labels, list of str: relation labels
+            weights, array of float: weight of each edge
+            name, str: name of the graph
+            csr, tuple of array: out_edges, out_ptr, in_edges and in_ptr, if
+                they've already been made. Otherwise they're made from src and
+                dst
+        """
+        self.name = name
+        if not isinstance(nodes, StringTable):
+            nodes = StringTable.from_strings(nodes)
+        self.nodes = nodes
+        self.labels = list(labels)
+        self.src = np.asarray(src, dtype=np.int64)
+        self.dst = np.asarray(dst, dtype=np.int64)
+        self.label_ids = np.asarray(label_ids, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+
+        # CSR indices: the edges of node i are
+        # out_edges[out_ptr[i]:out_ptr[i + 1]], and likewise for in edges.
+        # The sort is stable so that edges stay in the order they were added
+        if csr is not None:
+            self.out_edges, self.out_ptr, self.in_edges, self.in_ptr = csr
+            return
+        num_nodes = len(self.nodes)
+        self.out_edges = np.argsort(self.src, kind='stable')
+        self.out_ptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.src, minlength=num_nodes),
+                out=self.out_ptr[1:])
+        self.in_edges = np.argsort(self.dst, kind='stable')
+        self.in_ptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.dst, minlength=num_nodes),
+                out=self.in_ptr[1:])
+
+    @classmethod
+    def from_triples(cls, triple_weights, loose_ents=(), name='graph'):
+        """
+        Make a GraphStore from weighted triples, as made by
+        dygiepp_to_DOT.build_triple_counts. Nodes are numbered in the order
+        they're first seen.
+
+        parameters:
+            triple_weights, dict: keys are (head, relation, tail) triples,
+                values are edge weights
+            loose_ents, list of str: entities that aren't in any triple
+            name, str: name of the graph
+
+        returns: GraphStore instance
+        """
+        node_ids = {}
+        label_ids = {}
+        src, dst, labels, weights = [], [], [], []
+        for (head, rel, tail), weight in triple_weights.items():
+            src.append(node_ids.setdefault(head, len(node_ids)))
+            dst.append(node_ids.setdefault(tail, len(node_ids)))
+            labels.append(label_ids.setdefault(rel, len(label_ids)))
+            weights.append(weight)
+        for entity in loose_ents:
+            node_ids.setdefault(entity, len(node_ids))
+
+        return cls(list(node_ids), src, dst, labels, list(label_ids),
+                weights, name)
+
+    @classmethod
+    def from_agraph(cls, graph):
+        """
+        Make a GraphStore from a pygraphviz AGraph. Edges without a weight
+        get a weight of 1, and edges without a label get an empty label.
+
+        parameters:
+            graph, pgv AGraph instance: graph to convert
+
+        returns: GraphStore instance
+        """
+        node_ids = {str(node): i for i, node in enumerate(graph.nodes())}
+        label_ids = {}
+        src, dst, labels, weights = [], [], [], []
+        for edge in graph.edges():
+            src.append(node_ids[str(edge[0])])
+            dst.append(node_ids[str(edge[1])])
+            label = edge.attr['label'] or ''
+            labels.append(label_ids.setdefault(label, len(label_ids)))
+            weights.append(float(edge.attr['weight'] or 1))
+
+        return cls(list(node_ids), src, dst, labels, list(label_ids),
+                weights, graph.get_name())
+
+    @property
+    def num_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def num_edges(self):
+        return len(self.src)
+
+    def successors(self, node_id):
+        """
+        Returns the IDs of the tails of the edges out of a node.
+        """
+        edges = self.out_edges[self.out_ptr[node_id]:self.out_ptr[node_id + 1]]
+        return self.dst[edges]
+
+    def predecessors(self, node_id):
+        """
+        Returns the IDs of the heads of the edges into a node.
+        """
+        edges = self.in_edges[self.in_ptr[node_id]:self.in_ptr[node_id + 1]]
+        return self.src[edges]
+
+    def neighbors(self, node_id):
+        """
+        Returns the sorted, unique IDs of the nodes connected to a node in
+        either direction.
+        """
+        return np.union1d(self.successors(node_id),
+                self.predecessors(node_id))
+
+    def degree(self):
+        """
+        Returns the number of edges in or out of each node.
+        """
+        return np.diff(self.out_ptr) + np.diff(self.in_ptr)
+
+    def edges_of(self, node_ids):
+        """
+        Returns the indices of all edges out of and into a set of nodes.
+
+        parameters:
+            node_ids, array of int: nodes to get the edges of
+
+        returns:
+            out_edges, array of int: edges where the nodes are the head
+            in_edges, array of int: edges where the nodes are the tail
+        """
+        return (gather_csr(self.out_ptr, self.out_edges, node_ids),
+                gather_csr(self.in_ptr, self.in_edges, node_ids))
+
+    def edge_filter(self, min_weight=None, relations=None):
+        """
+        Returns a mask of the edges that pass a set of filters.
+
+        parameters:
+            min_weight, float: minimum edge weight, default is no minimum
+            relations, list of str: relation labels to keep, default is all
+
+        returns: mask, array of bool: True for the edges that pass
+        """
+        mask = np.ones(self.num_edges, dtype=bool)
+        if min_weight is not None:
+            mask &= self.weights >= min_weight
+        if relations is not None:
+            keep_labels = np.isin(self.labels, list(relations))
+            mask &= keep_labels[self.label_ids]
+
+        return mask
+
+    def bfs(self, sources, max_hops=None, edge_mask=None):
+        """
+        Breadth-first search from all sources at once, following edges in
+        either direction. Each level is done with array operations over the
+        CSR indices, so the whole search is O(V + E).
+
+        parameters:
+            sources, array of int: node IDs to start from
+            max_hops, int: maximum number of edges from a source, default is
+                no limit
+            edge_mask, array of bool: only edges that are True are followed,
+                default is all edges
+
+        returns: dist, array of int: number of edges from the closest source,
+            or -1 if the node can't be reached
+        """
+        dist = np.full(self.num_nodes, -1, dtype=np.int64)
+        frontier = np.unique(np.asarray(sources, dtype=np.int64))
+        dist[frontier] = 0
+        hops = 0
+        while len(frontier) != 0 and (max_hops is None or hops < max_hops):
+            out_edges, in_edges = self.edges_of(frontier)
+            if edge_mask is not None:
+                out_edges = out_edges[edge_mask[out_edges]]
+                in_edges = in_edges[edge_mask[in_edges]]
+            reached = np.concatenate([self.dst[out_edges],
+                self.src[in_edges]])
+            frontier = np.unique(reached[dist[reached] == -1])
+            hops += 1
+            dist[frontier] = hops
+
+        return dist
+
+    def has_node(self, name):
+        """
+        Returns True if there's a node with this name.
+        """
+        return self.nodes.find(name) != -1
+
+    def get_ids(self, names):
+        """
+        Returns the node IDs of a list of node names. Raises a KeyError if a
+        name isn't a node.
+        """
+        node_ids = []
+        for name in names:
+            node_id = self.nodes.find(name)
+            if node_id == -1:
+                raise KeyError(name)
+            node_ids.append(node_id)
+
+        return np.array(node_ids, dtype=np.int64)
+
+    def subgraph(self, node_mask, edge_mask=None, name=None):
+        """
+        Make a new GraphStore with a subset of the nodes and edges. Edges are
+        only kept if both of their nodes are kept. Node and edge order is
+        preserved.
+
+        parameters:
+            node_mask, array of bool: True for the nodes to keep
+            edge_mask, array of bool: True for the edges to keep. If None,
+                all edges between kept nodes are kept
+            name, str: name of the new graph, default is this graph's name
+
+        returns: GraphStore instance
+        """
+        node_mask = np.asarray(node_mask, dtype=bool)
+        keep_edges = node_mask[self.src] & node_mask[self.dst]
+        if edge_mask is not None:
+            keep_edges &= edge_mask
+        new_ids = np.cumsum(node_mask) - 1
+        nodes = self.nodes.take(np.flatnonzero(node_mask))
+
+        return GraphStore(nodes, new_ids[self.src[keep_edges]],
+                new_ids[self.dst[keep_edges]], self.label_ids[keep_edges],
+                self.labels, self.weights[keep_edges],
+                self.name if name is None else name)
+
+    def subgraph_from_ids(self, node_ids, edge_ids, name=None):
+        """
+        Make a new GraphStore from lists of node and edge IDs. Unlike
+        subgraph, this only takes time in the number of nodes and edges
+        kept. The edges must all be between the given nodes. Node and edge
+        order is preserved.
+
+        parameters:
+            node_ids, array of int: IDs of the nodes to keep
+            edge_ids, array of int: IDs of the edges to keep
+            name, str: name of the new graph, default is this graph's name
+
+        returns: GraphStore instance
+        """
+        node_ids = np.sort(node_ids)
+        edge_ids = np.sort(edge_ids)
+        nodes = self.nodes.take(node_ids)
+        # Only the entries for the kept nodes are ever written or read
+        new_ids = np.empty(self.num_nodes, dtype=np.int64)
+        new_ids[node_ids] = np.arange(len(node_ids))
+
+        return GraphStore(nodes, new_ids[self.src[edge_ids]],
+                new_ids[self.dst[edge_ids]], self.label_ids[edge_ids],
+                self.labels, self.weights[edge_ids],
+                self.name if name is None else name)
+
+    def to_triple_weights(self):
+        """
+        Convert back to weighted triples and loose entities. Weights that are
+        whole numbers are returned as ints.
+
+        returns:
+            triple_weights, dict: keys are (head, relation, tail) triples,
+                values are edge weights
+            loose_ents, list of str: nodes without any edges
+        """
+        nodes = self.nodes.tolist()
+        triple_weights = {}
+        for head, tail, label, weight in zip(self.src.tolist(),
+                self.dst.tolist(), self.label_ids.tolist(),
+                self.weights.tolist()):
+            triple = (nodes[head], self.labels[label], nodes[tail])
+            triple_weights[triple] = int(weight) if weight.is_integer() \
+                    else weight
+        loose_ents = [nodes[i] for i in
+                np.flatnonzero(self.degree() == 0).tolist()]
+
+        return triple_weights, loose_ents
+
+    def to_agraph(self):
+        """
+        Convert to a strict, directed pygraphviz AGraph.
+
+        returns: graph, pgv AGraph instance
+        """
+        if pgv is None:
+            raise ImportError('pygraphviz is required to make an AGraph')
+        graph = pgv.AGraph(strict=True, directed=True, name=self.name)
+        triple_weights, loose_ents = self.to_triple_weights()
+        for (head, rel, tail), weight in triple_weights.items():
+            if rel == '':
+                graph.add_edge(head, tail, weight=weight)
+            else:
+                graph.add_edge(head, tail, label=rel, weight=weight)
+        graph.add_nodes_from(loose_ents)
+
+        return graph
+
+
+def find_components(num_nodes, src, dst):
+    """
+    Find the weakly connected components of a graph with union-find.
+
+    parameters:
+        num_nodes, int: number of nodes
+        src, array of int: node ID of the head of each edge
+        dst, array of int: node ID of the tail of each edge
+
+    returns: node_component, array of int: component of each node. Components
+        are numbered in the order of their lowest node ID
+    """
+    # Each root is the lowest node ID in its set
+    parent = list(range(num_nodes))
+    for head, tail in zip(np.asarray(src).tolist(), np.asarray(dst).tolist()):
+        # Find the roots, halving the paths on the way
+        while parent[head] != head:
+            parent[head] = parent[parent[head]]
+            head = parent[head]
+        while parent[tail] != tail:
+            parent[tail] = parent[parent[tail]]
+            tail = parent[tail]
+        if head < tail:
+            parent[tail] = head
+        elif tail < head:
+            parent[head] = tail
+
+    # Point every node straight at its root
+    roots = np.array(parent, dtype=np.int64)
+    while True:
+        next_roots = roots[roots]
+        if np.array_equal(next_roots, roots):
+            break
+        roots = next_roots
+    _, node_component = np.unique(roots, return_inverse=True)
+
+    return node_component.astype(np.int64)
+
+
+def build_component_index(graph):
+    """
+    Find the weakly connected components of a graph, and index the nodes
+    and edges of each one in CSR form.
+
+    parameters:
+        graph, GraphStore instance: graph to index
+
+    returns: index, dict: with keys:
+        node_component, array of int: component of each node
+        comp_node_ptr, comp_nodes, arrays of int: the nodes of component i
+            are comp_nodes[comp_node_ptr[i]:comp_node_ptr[i + 1]]
+        comp_edge_ptr, comp_edges, arrays of int: the same for edges
+        num_nodes, num_edges, int: size of the indexed graph
+    """
+    node_component = find_components(graph.num_nodes, graph.src, graph.dst)
+    num_comps = node_component.max() + 1 if graph.num_nodes else 0
+    edge_component = node_component[graph.src]
+    index = {'node_component': node_component,
+            'num_nodes': graph.num_nodes,
+            'num_edges': graph.num_edges}
+    for kind, comps in [('node', node_component), ('edge', edge_component)]:
+        ptr = np.zeros(num_comps + 1, dtype=np.int64)
+        np.cumsum(np.bincount(comps, minlength=num_comps), out=ptr[1:])
+        index[f'comp_{kind}_ptr'] = ptr
+        index[f'comp_{kind}s'] = np.argsort(comps, kind='stable')
+
+    return index
+
+
+def get_index_file(dot_file):
+    """
+    Returns the path of the component index of a DOT file.
+    """
+    return f'{splitext(dot_file)[0]}_components.npz'
+
+
+def hash_file(path):
+    """
+    Get the SHA-256 hash of a file's contents, reading it in chunks.
+
+    parameters:
+        path, str: file to hash
+
+    returns:
+        hex digest, str
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+def hash_source(path):
+    """
+    Get a hash that changes whenever a graph file changes. For a DOT file,
+    this is hash_file of the file. For a snapshot directory, it's hash_file
+    of its graph.json, which has the hash of the snapshot's arrays.
+
+    parameters:
+        path, str: DOT file or snapshot directory
+
+    returns:
+        hex digest, str
+    """
+    if isdir(path):
+        return hash_file(join(path, 'graph.json'))
+
+    return hash_file(path)
+
+
+def save_component_index(index_file, index, dot_hash, remove_ents):
+    """
+    Save a component index.
+
+    parameters:
+        index_file, str: path to save to, should end in .npz
+        index, dict: output of build_component_index
+        dot_hash, str: hash_source of the DOT file or snapshot the graph was
+            read from
+        remove_ents, bool: whether loose entities were removed when reading
+            the graph
+
+    returns: None
+    """
+    np.savez(index_file, dot_hash=dot_hash, remove_ents=remove_ents,
+            **index)
+
+
+def load_component_index(index_file):
+    """
+    Read a component index saved with save_component_index.
+
+    parameters:
+        index_file, str: path to the .npz file
+
+    returns: index, dict: output of build_component_index, plus dot_hash and
+        remove_ents
+    """
+    with np.load(index_file) as f:
+        index = {key: f[key] for key in f.files}
+    for key in ['num_nodes', 'num_edges']:
+        index[key] = int(index[key])
+    index['dot_hash'] = str(index['dot_hash'])
+    index['remove_ents'] = bool(index['remove_ents'])
+
+    return index
+
+
+def component_subgraph(graph, node_ids, index):
+    """
+    Get the components that contain a set of nodes, using a component index.
+    Only takes time in the size of those components.
+
+    parameters:
+        graph, GraphStore instance: the indexed graph
+        node_ids, array of int: nodes whose components to keep
+        index, dict: output of build_component_index for graph
+
+    returns: GraphStore instance
+    """
+    comps = np.unique(index['node_component'][node_ids])
+
+    return graph.subgraph_from_ids(
+            gather_csr(index['comp_node_ptr'], index['comp_nodes'], comps),
+            gather_csr(index['comp_edge_ptr'], index['comp_edges'], comps))
+
+
+def save_snapshot(graph, snapshot_dir):
+    """
+    Save a graph as a directory of .npy files that can be memory-mapped by
+    load_snapshot. The sorted order of the node names is saved too, so that
+    nodes can be looked up by name without reading all of them.
+
+    parameters:
+        graph, GraphStore instance: graph to save
+        snapshot_dir, str: directory to save to, made if it doesn't exist
+
+    returns: None
+    """
+    makedirs(snapshot_dir, exist_ok=True)
+    arrays = {'node_blob': graph.nodes.blob,
+            'node_offsets': graph.nodes.offsets,
+            'node_order': graph.nodes.sort_order()}
+    arrays.update({array: getattr(graph, array) for array in SNAPSHOT_ARRAYS})
+    sha = hashlib.sha256()
+    for array, values in arrays.items():
+        np.save(join(snapshot_dir, f'{array}.npy'), values)
+        sha.update(np.ascontiguousarray(values).data)
+    with open(join(snapshot_dir, 'graph.json'), 'w') as f:
+        json.dump({'name': graph.name, 'labels': graph.labels,
+            'version': SNAPSHOT_VERSION, 'hash': sha.hexdigest()}, f)
+
+
+def load_snapshot(snapshot_dir):
+    """
+    Load a graph saved with save_snapshot. The arrays are memory-mapped
+    read-only, so only the parts that are used are read from disk.
+
+    parameters:
+        snapshot_dir, str: directory the snapshot was saved to
+
+    returns: GraphStore instance
+    """
+    with open(join(snapshot_dir, 'graph.json')) as f:
+        info = json.load(f)
+    if info['version'] != SNAPSHOT_VERSION:
+        raise ValueError(f'Snapshot {snapshot_dir} has version '
+                f'{info["version"]}, but version {SNAPSHOT_VERSION} is '
+                'needed. Make it again with dygiepp_to_DOT.py')
+    arrays = {array: np.load(join(snapshot_dir, f'{array}.npy'),
+        mmap_mode='r') for array in ['node_blob', 'node_offsets',
+            'node_order'] + SNAPSHOT_ARRAYS}
+    nodes = StringTable(arrays['node_blob'], arrays['node_offsets'],
+            arrays['node_order'])
+
+    return GraphStore(nodes, arrays['src'], arrays['dst'],
+            arrays['label_ids'], info['labels'], arrays['weights'],
+            info['name'], csr=(arrays['out_edges'], arrays['out_ptr'],
+                arrays['in_edges'], arrays['in_ptr']))
@@ -14,7 +14,7 @@ from goatools.anno.gaf_reader import GafReader
 from tqdm import tqdm
 
 
-def main(planteome_dir, output_dir, file_prefix):
+def main(planteome_dir, output_dir, file_prefix, synonyms=False):
 
     # Get names of GAF files
     print('\nGetting names of .assoc files...')
@@ -39,12 +39,18 @@ def main(planteome_dir, output_dir, file_prefix):
     # Get keywords
     print('\nGetting keywords...')
     names = defaultdict(set)
+    # Dict instead of set to keep the order, genes have many associations
+    syn_groups = {}
     for f, gaf in tqdm(gaf_dicts.items()):
         for namedTup in gaf.associations:
             name = namedTup.DB_Name
             syns = namedTup.DB_Synonym
             names[f].update(name)
             names[f].update(syns)
+            # The first name is used as the canonical one
+            group = sorted(name) + sorted(set(syns) - set(name))
+            if len(group) > 1:
+                syn_groups[tuple(group)] = None
     for key, value in names.items():
         names[key] = list(value)
 
@@ -54,6 +60,9 @@ def main(planteome_dir, output_dir, file_prefix):
         json.dump(names, f)
     with open(f'{output_dir}/{file_prefix}_problem_files.txt', 'w') as f:
         f.write('\n'.join(problem_files))
+    if synonyms:
+        with open(f'{output_dir}/{file_prefix}_synonyms.json', 'w') as f:
+            json.dump(list(syn_groups), f)
 
 
     print('\nDone!')
@@ -69,10 +78,14 @@ if __name__ == "__main__":
             help='Path to save output')
     parser.add_argument('-file_prefix', type=str, default='Planteome',
             help='String to prepend to output filename, default is Planteome')
+    parser.add_argument('--synonyms', action='store_true',
+            help='Also save the names and synonyms of each association as a '
+            'list of groups, for use as a synonym table with '
+            'dygiepp_to_DOT.py')
 
     args = parser.parse_args()
 
     args.planteome_dir = abspath(args.planteome_dir)
     args.output_dir = abspath(args.output_dir)
 
-    main(args.planteome_dir, args.output_dir, args.file_prefix)
+    main(args.planteome_dir, args.output_dir, args.file_prefix, args.synonyms)
@@ -7,15 +7,71 @@ Prints to stdout, use > to pipe output to a file
 Author: Serena G. Lotreck
 """
 import argparse
-from os.path import abspath, basename, join
-from os import listdir
+from array import array
+from os.path import abspath, basename, exists, join, splitext
+from os import listdir, makedirs, replace
+from bisect import bisect_left, bisect_right
+from contextlib import closing
+import hashlib
+from itertools import chain, repeat
+import json
+import multiprocessing as mp
+from operator import itemgetter
+import sqlite3
 import warnings
 
-from dygie.training.f1 import compute_f1  # Must have dygiepp developed in env
 import jsonlines
 import pandas as pd
 import numpy as np
 
+# Replaced with print in __main__ if --verbose is given
+verboseprint = lambda *a, **k: None
+
+
+def safe_div(num, denom):
+    """
+    Divide, returning 0 if the denominator is 0.
+    """
+    if denom > 0:
+        return num / denom
+    else:
+        return 0
+
+
+def compute_f1(predicted, gold, matched):
+    """
+    Calculate precision, recall and F1. Gives the same values as
+    dygie.training.f1.compute_f1, without having to import dygie (and with it
+    allennlp and torch). Call use_dygie_f1 to use dygie's version instead.
+
+    parameters:
+        predicted, int: number of predictions (tp + fp)
+        gold, int: number of gold standard annotations (tp + fn)
+        matched, int: number of correct predictions (tp)
+
+    returns:
+        precision, float
+        recall, float
+        f1, float
+    """
+    precision = safe_div(matched, predicted)
+    recall = safe_div(matched, gold)
+    f1 = safe_div(2 * precision * recall, precision + recall)
+
+    return precision, recall, f1
+
+
+def use_dygie_f1():
+    """
+    Replace compute_f1 in this module with dygie.training.f1.compute_f1.
+    Requires dygiepp to be developed in the environment.
+
+    returns: None
+    """
+    global compute_f1
+    from dygie.training.f1 import compute_f1 as dygie_compute_f1
+    compute_f1 = dygie_compute_f1
+
 
 def calculate_CI(prec_samples, rec_samples, f1_samples):
     """
@@ -40,7 +96,9 @@ def calculate_CI(prec_samples, rec_samples, f1_samples):
         lower_bound = np.percentile(samp_set, 100*(alpha/2))
         upper_bound = np.percentile(samp_set, 100*(1-alpha/2))
         name = name.split('_')[0] + '_CI'
-        CIs[name] = (lower_bound, upper_bound)
+        # Plain floats so the tuples look the same in the CSV whether they
+        # were just calculated or read back from the cache
+        CIs[name] = (float(lower_bound), float(upper_bound))
 
     return [CIs['prec_CI'], CIs['rec_CI'], CIs['f1_CI']]
 
@@ -78,6 +136,66 @@ def eliminate_rel_dups(sent, doc_key, sent_type):
     return sent
 
 
+def get_rel_key(rel, ordered=False):
+    """
+    Get the hashable key used to look up a relation by its argument spans.
+    Relation type is not part of the key.
+
+    parameters:
+        rel, list: 4 integers (entity bounds) and a string (relation type)
+        ordered, bool: if True, the key distinguishes head and tail
+
+    returns:
+        key, tuple or frozenset: ((start1, end1), (start2, end2)) if ordered,
+            otherwise the frozenset of the two spans
+    """
+    ent1 = (rel[0], rel[1])
+    ent2 = (rel[2], rel[3])
+    if ordered:
+        return (ent1, ent2)
+    else:
+        return frozenset((ent1, ent2))
+
+
+def build_rel_index(sent):
+    """
+    Index the relations of one sentence by their argument spans, so that
+    matches can be looked up in constant time. Should be built once per
+    sentence and reused for every lookup against it.
+
+    parameters:
+        sent, list of list: internal lists are relation representations
+
+    returns:
+        rel_index, dict: keys are "ordered" and "unordered", values are sets
+            of keys from get_rel_key
+    """
+    rel_index = {'ordered': set(), 'unordered': set()}
+    for rel in sent:
+        rel_index['ordered'].add(get_rel_key(rel, ordered=True))
+        rel_index['unordered'].add(get_rel_key(rel))
+
+    return rel_index
+
+
+def rel_in_index(rel, rel_index, ordered=False):
+    """
+    Check whether the argument spans of rel are present in rel_index.
+
+    parameters:
+        rel, list: 4 integers (entity bounds) and a string (relation type)
+        rel_index, dict: output of build_rel_index
+        ordered, bool: if True, head and tail must also match in order
+
+    returns:
+        True if a match exists, False otherwise
+    """
+    if ordered:
+        return get_rel_key(rel, ordered=True) in rel_index['ordered']
+    else:
+        return get_rel_key(rel) in rel_index['unordered']
+
+
 def check_rel_matches(pred, gold_sent):
     """
     Checks for order-agnostic matches of pred in gold_sent.
@@ -86,6 +204,10 @@ def check_rel_matches(pred, gold_sent):
     comparing a "pred" from the gold standard against the "gold_sent" of
     predictions from the model, as is done in get_f1_input.
 
+    Builds a relation index for gold_sent on every call; when checking many
+    relations against the same sentence, use build_rel_index and rel_in_index
+    instead.
+
     parameters:
         pred, list: 4 integers (entity bounds) and a string (relation type)
         gold_sent, list of list: internal lists are relation representations
@@ -94,30 +216,77 @@ def check_rel_matches(pred, gold_sent):
     returns:
         True if an order-agnostic match exists in gold_sent, False otherwise
     """
-    # Make all gold rels into strings of chars to make it easier to
-    # search for character pairs
-    gold_rel_strs = []
-    for rel in gold_sent:
-        rel_str = ' '.join([str(i) for i in rel[:4]])
-        gold_rel_strs.append(rel_str)
-    # Make each ent in the predicted rel into a separate string so
-    # we can search order-agnostically
-    pred_ent_1_str = ' '.join([str(i) for i in pred[:2]])
-    pred_ent_2_str = ' '.join([str(i) for i in pred[2:4]])
-    # Check if ent 1 is in one of the relations
-    ent1_list = [True if pred_ent_1_str
-            in i else False for i in gold_rel_strs]
-    # Check if ent 2 is in one of the relations
-    ent2_list = [True if pred_ent_2_str in i
-            else False for i in gold_rel_strs]
-    # Indices that both have True in them are matches
-    matches_list = [True if (ent1_list[i] & ent2_list[i]) else False
-            for i in range(len(gold_rel_strs))]
-    # Determine return type
-    if matches_list.count(True) >= 1:
-        return True
-    else:
-        return False
+    return rel_in_index(pred, build_rel_index(gold_sent))
+
+
+def build_span_index(spans, items=None):
+    """
+    Index spans by start position, so that the spans overlapping a query span
+    can be found with a binary search instead of comparing against every
+    span. Should be built once per sentence and reused for every query.
+
+    parameters:
+        spans, list of tuple: (start, end) of each span, inclusive
+        items, list: object to return for each span when it overlaps a query,
+            default is the span itself
+
+    returns:
+        span_index, dict: keys are "starts", "ends" and "items", lists in
+            order of start, and "max_len", the longest span length
+    """
+    if items is None:
+        items = spans
+    order = sorted(range(len(spans)), key=lambda i: spans[i][0])
+    span_index = {'starts': [spans[i][0] for i in order],
+            'ends': [spans[i][1] for i in order],
+            'items': [items[i] for i in order],
+            'max_len': max([end - start for start, end in spans], default=0)}
+
+    return span_index
+
+
+def get_overlaps(span, span_index):
+    """
+    Get the items of all spans in span_index that share at least one token
+    with span. Only spans starting within the longest span length before span
+    can reach it, so the candidates are found with two binary searches.
+
+    parameters:
+        span, tuple: (start, end), inclusive
+        span_index, dict: output of build_span_index
+
+    returns:
+        overlaps, list: items of the overlapping spans
+    """
+    start, end = span
+    lower = bisect_left(span_index['starts'], start - span_index['max_len'])
+    upper = bisect_right(span_index['starts'], end)
+
+    return [span_index['items'][i] for i in range(lower, upper)
+            if span_index['ends'][i] >= start]
+
+
+def rel_overlaps_index(rel, head_index):
+    """
+    Check whether a relation overlaps any relation in an index of relation
+    heads, in either order. Relations overlap when each argument shares at
+    least one token with an argument of the other, as in relationIAA.
+
+    parameters:
+        rel, list: 4 integers (entity bounds) and a string (relation type)
+        head_index, dict: output of build_span_index with the head spans of a
+            sentence's relations as spans and the relations as items
+
+    returns:
+        True if an overlapping relation exists, False otherwise
+    """
+    head, tail = (rel[0], rel[1]), (rel[2], rel[3])
+    for query_head, query_tail in ((head, tail), (tail, head)):
+        for other in get_overlaps(query_head, head_index):
+            if other[2] <= query_tail[1] and other[3] >= query_tail[0]:
+                return True
+
+    return False
 
 
 def get_doc_ent_counts(doc, gold_std, ent_pos_neg):
@@ -125,6 +294,10 @@ def get_doc_ent_counts(doc, gold_std, ent_pos_neg):
     Get the true/false positives and false negatives for entity prediction for
     a single document.
 
+    This is the reference implementation for get_columnar_ent_counts, which
+    makes the 'ent' counts of stream_doc_counts and get_doc_counts by
+    default.
+
     parameters:
         doc, dict: dygiepp-formatted dictionary, with keys "predicted_ner" and
             "ner"
@@ -144,8 +317,11 @@ def get_doc_ent_counts(doc, gold_std, ent_pos_neg):
             found = False
             for gold_ent in gold_sent:
                 if pred[:2] == gold_ent[:2]:
+                    # Only count once, even if the gold standard has
+                    # duplicates of this span
                     ent_pos_neg['tp'] += 1
                     found = True
+                    break
             if not found:
                 ent_pos_neg['fp'] += 1
         # Iterate through gold standard and check for them in predictions
@@ -160,7 +336,7 @@ def get_doc_ent_counts(doc, gold_std, ent_pos_neg):
     return ent_pos_neg
 
 
-def get_doc_rel_counts(doc, gold_std, rel_pos_neg, doc_key):
+def get_doc_rel_counts(doc, gold_std, rel_pos_neg, doc_key, ordered=False):
     """
     Get the true/false positives and false negatives for relation prediction for
     a single document.
@@ -175,6 +351,9 @@ def get_doc_rel_counts(doc, gold_std, rel_pos_neg, doc_key):
             documents.
         doc_key, str: doc ID, to use for warning if there are exact duplicate
             relations in any of the sentences
+        ordered, bool: if True, head and tail entities must be in the same
+            order as in the gold standard to count as a match. Default is
+            False.
 
     returns:
         rel_pos_neg, dict: updated match counts for relations
@@ -185,266 +364,1856 @@ def get_doc_rel_counts(doc, gold_std, rel_pos_neg, doc_key):
         # Check for and eliminate duplicates, with warning
         pred_sent = eliminate_rel_dups(pred_sent, doc_key, "predictions")
         gold_sent = eliminate_rel_dups(gold_sent, doc_key, "gold standard")
+        # Index both sides once for this sentence
+        pred_index = build_rel_index(pred_sent)
+        gold_index = build_rel_index(gold_sent)
         # Iterate through the predictions and check for them in the gold
-        # standard. Need to allow for the relations to be in a different
-        # order than in the gold standard
+        # standard
         for pred in pred_sent:
-            matched = check_rel_matches(pred, gold_sent)
-            if matched:
+            if rel_in_index(pred, gold_index, ordered):
                 rel_pos_neg['tp'] += 1
             else:
                 rel_pos_neg['fp'] += 1
-        # Iterate through gold standard and check for them in predictions.
-        # Still need to allow for the relations to be in a different order.
+        # Iterate through gold standard and check for them in predictions
         for gold in gold_sent:
-            matched = check_rel_matches(gold, pred_sent)
-            if matched:
-                continue
-            else:
+            if not rel_in_index(gold, pred_index, ordered):
                 rel_pos_neg['fn'] += 1
 
     return rel_pos_neg
 
 
-def get_f1_input(gold_standard_dicts, prediction_dicts, input_type):
+def new_span_buffers():
     """
-    Get the number of true and false postives and false negatives for the
-    model to calculate the following inputs for compute_f1 for both entities
-    and relations:
-        predicted = true positives + false positives
-        gold = true positives + false negatives
-        matched = true positives
+    Make empty buffers for add_doc_spans. They're array.arrays, so each span
+    takes a few ints of memory until stack_span_arrays is called.
+
+    returns:
+        span_buffers, dict: keys are 'num_sents', and 'lens', 'bounds' and
+            'labels' for each of 'pred' and 'gold'
+    """
+    return {'num_sents': array('q'),
+            'pred': {'lens': array('q'), 'bounds': array('q'),
+                'labels': array('q')},
+            'gold': {'lens': array('q'), 'bounds': array('q'),
+                'labels': array('q')}}
+
+
+def add_doc_spans(span_buffers, doc, gold_std, label_ids=None):
+    """
+    Add the predicted and gold standard NER spans of one document to the
+    buffers. As in get_doc_ent_counts, only sentences present in both the
+    prediction and the gold standard are included. The spans are copied with
+    map and chain, so there's no Python loop over them.
+
+    parameters:
+        span_buffers, dict: output of new_span_buffers, updated in place
+        doc, dict: dygiepp-formatted dictionary, with key "predicted_ner"
+        gold_std, dict: dygiepp-formatted dicitonary with gold standard for
+            this doc, with key "ner"
+        label_ids, dict: if provided, the entity types are added too, as
+            their values in label_ids, or -1 for types that aren't in it
+    """
+    num_sents = min(len(doc['predicted_ner']), len(gold_std['ner']))
+    span_buffers['num_sents'].append(num_sents)
+    for side, sents in (('pred', doc['predicted_ner'][:num_sents]),
+            ('gold', gold_std['ner'][:num_sents])):
+        ents = list(chain.from_iterable(sents))
+        span_buffers[side]['lens'].extend(map(len, sents))
+        span_buffers[side]['bounds'].extend(chain.from_iterable(map(
+            itemgetter(0, 1), ents)))
+        if label_ids is not None:
+            span_buffers[side]['labels'].extend(map(label_ids.get,
+                map(itemgetter(2), ents), repeat(-1)))
+
+
+def stack_span_arrays(span_buffers):
+    """
+    Make arrays of the spans in the buffers, with the index of the document
+    in the order it was added and the index of the sentence in the document.
+
+    parameters:
+        span_buffers, dict: output of new_span_buffers, filled by
+            add_doc_spans
+
+    returns:
+        pred_spans, array of int: shape (num_spans, 5), columns are document
+            index, sentence index, start, end and entity type, which is -1 if
+            add_doc_spans wasn't given label_ids
+        gold_spans, array of int: same for the gold standard
+    """
+    num_sents = np.frombuffer(span_buffers['num_sents'], dtype=np.int64)
+    sent_docs = np.repeat(np.arange(len(num_sents)), num_sents)
+    doc_starts = np.cumsum(num_sents) - num_sents
+    sent_idxs = np.arange(len(sent_docs)) - np.repeat(doc_starts, num_sents)
+
+    stacked = []
+    for side in ('pred', 'gold'):
+        lens = np.frombuffer(span_buffers[side]['lens'], dtype=np.int64)
+        bounds = np.frombuffer(span_buffers[side]['bounds'], dtype=np.int64)
+        labels = np.frombuffer(span_buffers[side]['labels'], dtype=np.int64)
+        spans = np.empty((len(bounds)//2, 5), dtype=np.int64)
+        spans[:, 0] = np.repeat(sent_docs, lens)
+        spans[:, 1] = np.repeat(sent_idxs, lens)
+        spans[:, 2:4] = bounds.reshape(-1, 2)
+        spans[:, 4] = labels if len(labels) == len(spans) else -1
+        stacked.append(spans)
+
+    return tuple(stacked)
+
+
+def get_span_arrays(gold_standard_dicts, prediction_dicts, label_ids=None):
+    """
+    Get the predicted and gold standard NER spans of a set of documents as
+    arrays for get_columnar_ent_counts. The document index is the index of
+    the document in prediction_dicts.
+
+    parameters:
+        gold_standard_dicts, list of dict: dygiepp formatted annotations
+        prediction_dicts, list of dict: dygiepp formatted predictions
+        label_ids, dict: if provided, maps entity types to ints for the
+            entity type column, see add_doc_spans
+
+    returns:
+        pred_spans, array of int: see stack_span_arrays
+        gold_spans, array of int: see stack_span_arrays
+    """
+    gold_standard_dict = {d['doc_key']: d for d in gold_standard_dicts}
+    span_buffers = new_span_buffers()
+    for doc in prediction_dicts:
+        add_doc_spans(span_buffers, doc, gold_standard_dict[doc['doc_key']],
+                label_ids)
+
+    return stack_span_arrays(span_buffers)
+
+
+def get_span_ids(spans):
+    """
+    Give every distinct row of a span array an int ID. If the columns fit in
+    63 bits together, the ID is the columns packed into one int; otherwise
+    the rows are numbered with np.unique.
+
+    parameters:
+        spans, array of int: shape (num_spans, num_columns)
+
+    returns:
+        span_ids, array of int: one ID per row
+    """
+    if len(spans) == 0:
+        return np.zeros(0, dtype=np.int64)
+    spans = spans - spans.min(axis=0)
+    widths = [int(col_max).bit_length() for col_max in spans.max(axis=0)]
+    if sum(widths) > 63:
+        return np.unique(spans, axis=0, return_inverse=True)[1].ravel()
+    span_ids = np.zeros(len(spans), dtype=np.int64)
+    for col, width in enumerate(widths):
+        span_ids = (span_ids << width) | spans[:, col]
+
+    return span_ids
+
+
+def ids_in(ids, other_ids):
+    """
+    Check which IDs are in other_ids with a binary search of the sorted
+    other_ids. Same as np.isin, but much faster for large arrays of IDs.
+
+    parameters:
+        ids, array of int: IDs to look for
+        other_ids, array of int: IDs to look in
+
+    returns:
+        found, array of bool: whether each ID is in other_ids
+    """
+    if len(other_ids) == 0:
+        return np.zeros(len(ids), dtype=bool)
+    other_ids = np.sort(other_ids)
+    pos = np.searchsorted(other_ids, ids)
+    pos[pos == len(other_ids)] = 0
+
+    return other_ids[pos] == ids
+
+
+def match_span_arrays(pred_spans, gold_spans):
+    """
+    Join predicted and gold standard spans on all of their columns.
+
+    parameters:
+        pred_spans, array of int: predicted spans
+        gold_spans, array of int: gold standard spans, same columns
+
+    returns:
+        gold_found, array of bool: whether each prediction is in the gold
+            standard
+        pred_found, array of bool: whether each gold span was predicted
+    """
+    span_ids = get_span_ids(np.concatenate([pred_spans, gold_spans]))
+    pred_ids = span_ids[:len(pred_spans)]
+    gold_ids = span_ids[len(pred_spans):]
+
+    return ids_in(pred_ids, gold_ids), ids_in(gold_ids, pred_ids)
+
+
+def get_columnar_ent_counts(pred_spans, gold_spans, num_docs):
+    """
+    Get per-document entity tp/fp/fn counts for a whole corpus at once by
+    joining the span arrays on (doc, sent, start, end). Entity types are
+    ignored, as in get_doc_ent_counts.
+
+    parameters:
+        pred_spans, array of int: predicted spans from stack_span_arrays
+        gold_spans, array of int: gold spans from stack_span_arrays
+        num_docs, int: number of documents
+
+    returns:
+        doc_counts, array of int: shape (num_docs, 3), columns are tp, fp and
+            fn
+    """
+    doc_counts = np.zeros((num_docs, 3), dtype=np.int64)
+    if len(pred_spans) + len(gold_spans) == 0:
+        return doc_counts
+
+    # A prediction is a tp if its span is in the gold standard, and a gold
+    # span is a fn if it wasn't predicted
+    gold_found, pred_found = match_span_arrays(pred_spans[:, :4],
+            gold_spans[:, :4])
+    doc_counts[:, 0] = np.bincount(pred_spans[gold_found, 0],
+            minlength=num_docs)
+    doc_counts[:, 1] = np.bincount(pred_spans[~gold_found, 0],
+            minlength=num_docs)
+    doc_counts[:, 2] = np.bincount(gold_spans[~pred_found, 0],
+            minlength=num_docs)
+
+    return doc_counts
+
+
+def add_columnar_typed_counts(counts, doc_rows, pred_spans, gold_spans):
+    """
+    Add the counts of the per-type entity metrics for a whole corpus at once,
+    by joining the span arrays on all columns including the entity type. As
+    in get_doc_metric_counts, predictions of types that aren't in the gold
+    standard aren't counted.
+
+    parameters:
+        counts, array of int: shape (num_rows, num_metrics, 3), updated in
+            place
+        doc_rows, array of int: row of counts for each document index
+        pred_spans, array of int: predicted spans from stack_span_arrays,
+            with entity types that are rows of the metric axis of counts
+        gold_spans, array of int: gold spans, same as pred_spans
+    """
+    gold_found, pred_found = match_span_arrays(pred_spans, gold_spans)
+    typed = pred_spans[:, 4] >= 0
+    np.add.at(counts, (doc_rows[pred_spans[typed, 0]], pred_spans[typed, 4],
+        np.where(gold_found[typed], 0, 1)), 1)
+    missed = gold_spans[~pred_found & (gold_spans[:, 4] >= 0)]
+    np.add.at(counts, (doc_rows[missed[:, 0]], missed[:, 4], 2), 1)
+
+
+def get_doc_counts(gold_standard_dicts, prediction_dicts, input_type,
+        backend='columnar'):
+    """
+    Get the true and false positives and false negatives for each document in
+    prediction_dicts. Because the counts are additive over documents, the
+    totals for any resample of the documents can be obtained from this array
+    without matching entities or relations again.
 
     parameters:
         gold_standard_dicts, list of dict: dygiepp formatted annotations
         prediction_dicts, list of dict: dygiepp formatted predictions
         input_type, str: 'ent' or 'rel', determines which of the prediction
             types will be evaluated
+        backend, str: 'columnar' or 'dict'. Only applies to entities;
+            'columnar' matches all spans at once with get_columnar_ent_counts,
+            'dict' goes document by document with get_doc_ent_counts. Default
+            is 'columnar'.
+
     returns:
-        predicted, int
-        gold, int
-        matched, int
+        doc_counts, array of int: shape (len(prediction_dicts), 3), columns
+            are tp, fp and fn, rows are in the order of prediction_dicts
     """
-    pos_neg = {'tp':0, 'fp':0, 'fn':0}
+    if input_type == 'ent' and backend == 'columnar':
+        pred_spans, gold_spans = get_span_arrays(gold_standard_dicts,
+                prediction_dicts)
+        return get_columnar_ent_counts(pred_spans, gold_spans,
+                len(prediction_dicts))
+
+    doc_counts = np.zeros((len(prediction_dicts), 3), dtype=np.int64)
 
     # Rearrange gold standard so that it's a dict with keys that are doc_id's
     gold_standard_dict = {d['doc_key']: d for d in gold_standard_dicts}
     # Go through the docs
-    for doc in prediction_dicts:
+    for i, doc in enumerate(prediction_dicts):
         # Get the corresponding gold standard
         gold_std = gold_standard_dict[doc['doc_key']]
         # Get tp/fp/fn counts for this document
+        pos_neg = {'tp':0, 'fp':0, 'fn':0}
         if input_type == 'ent':
             pos_neg = get_doc_ent_counts(doc, gold_std, pos_neg)
 
         elif input_type == 'rel':
             pos_neg = get_doc_rel_counts(doc, gold_std, pos_neg, doc["doc_key"])
 
-    predicted = pos_neg['tp'] + pos_neg['fp']
-    gold = pos_neg['tp'] + pos_neg['fn']
-    matched = pos_neg['tp']
+        doc_counts[i] = [pos_neg['tp'], pos_neg['fp'], pos_neg['fn']]
 
-    return (predicted, gold, matched)
+    return doc_counts
 
 
-def draw_boot_samples(pred_dicts, gold_std_dicts, num_boot, input_type):
+def get_f1_input(gold_standard_dicts, prediction_dicts, input_type):
     """
-    Draw bootstrap samples.
+    Get the number of true and false postives and false negatives for the
+    model to calculate the following inputs for compute_f1 for both entities
+    and relations:
+        predicted = true positives + false positives
+        gold = true positives + false negatives
+        matched = true positives
 
     parameters:
-        pred_dicts, list of dict: dicts of model predictions
-        gold_std_dicts, list of dict: dicts of gold standard annotations
-        num_boot, int: number of bootstrap samples to draw
-        input_type, str: 'ent' or 'rel'
-
+        gold_standard_dicts, list of dict: dygiepp formatted annotations
+        prediction_dicts, list of dict: dygiepp formatted predictions
+        input_type, str: 'ent' or 'rel', determines which of the prediction
+            types will be evaluated
     returns:
-        prec_samples, list of float: list of precision values for bootstraps
-        rec_samples, list of float: list of recall values for bootstraps
-        f1_samples, list of float: list of f1 values for bootstraps
+        predicted, int
+        gold, int
+        matched, int
     """
-    prec_samples = []
-    rec_samples = []
-    f1_samples = []
-
-    # Draw the boot samples
-    for _ in range(num_boot):
-        # Sample prediction dicts with replacement
-        pred_samp = np.random.choice(pred_dicts,
-                size=len(pred_dicts), replace=True)
-        # Get indices of the sampled instances in the pred_dicts list
-        idx_list = [pred_dicts.index(i) for i in pred_samp]
-        # Since the lists are sorted the same, can use indices to get equivalent
-        # docs in gold std
-        gold_samp = np.array([gold_std_dicts[i] for i in idx_list])
-        # Calculate performance for the sample
-        pred, gold, match = get_f1_input(gold_samp, pred_samp, input_type)
-        prec, rec, f1 = compute_f1(pred, gold, match)
-        # Append each of the performance values to their respective sample lists
-        prec_samples.append(prec)
-        rec_samples.append(rec)
-        f1_samples.append(f1)
+    tp, fp, fn = get_doc_counts(gold_standard_dicts, prediction_dicts,
+            input_type).sum(axis=0)
 
-    return (prec_samples, rec_samples, f1_samples)
+    predicted = int(tp + fp)
+    gold = int(tp + fn)
+    matched = int(tp)
+
+    return (predicted, gold, matched)
 
 
-def get_performance_row(pred_file, gold_std_file, bootstrap, num_boot, df_rows):
+def get_boot_performance(boot_counts):
     """
-    Gets performance metrics and returns as a list.
+    Vectorized equivalent of compute_f1 for an array of summed counts, one row
+    per bootstrap replicate. Division by zero gives 0, as in compute_f1.
 
     parameters:
-        pred_file, str: name of the file used for predictions
-        gold_std_file, str: name of the gold standard file
-        bootstrap, bool, whether or not to bootstrap a confidence interval
-        num_boot, int: if bootstrap is True, how many bootstrap samples to take
-        df_rows, dict: keys are column names, values are lists of performance
-            values and CIs to which new results will be appended
+        boot_counts, array: shape (num_boot, ..., 3), the last axis is tp, fp
+            and fn
 
     returns:
-        df_rows, dict: df_rows updated with new row values
+        prec_samples, array of float: precision for each replicate
+        rec_samples, array of float: recall for each replicate
+        f1_samples, array of float: F1 for each replicate
+        All have the shape of boot_counts without the last axis.
     """
-    # Read in the files
-    gold_std_dicts = []
-    with jsonlines.open(gold_std_file) as reader:
-        for obj in reader:
-            gold_std_dicts.append(obj)
-    pred_dicts = []
-    with jsonlines.open(pred_file) as reader:
-        for obj in reader:
-            pred_dicts.append(obj)
-
-    # Make sure all prediction files are also in the gold standard
-    gold_doc_keys = [g['doc_key'] for g in gold_std_dicts]
-    for doc in pred_dicts:
-        if doc['doc_key'] in gold_doc_keys:
-            continue
-        else:
-            verboseprint(
-                f'Document {doc["doc_key"]} is not in the gold standard. '
-                'Skipping this document for performance calculation.')
-            _ = pred_dicts.remove(doc)
+    boot_counts = np.asarray(boot_counts, dtype=np.float64)
+    matched = boot_counts[..., 0]
+    predicted = boot_counts[..., 0] + boot_counts[..., 1]
+    gold = boot_counts[..., 0] + boot_counts[..., 2]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prec_samples = np.where(predicted > 0, matched / predicted, 0.0)
+        rec_samples = np.where(gold > 0, matched / gold, 0.0)
+        prec_rec = prec_samples + rec_samples
+        f1_samples = np.where(prec_rec > 0,
+                2 * prec_samples * rec_samples / prec_rec, 0.0)
 
-    # Sort the pred and gold lists by doc key to make sure they're in the same order
-    gold_std_dicts = sorted(gold_std_dicts, key=lambda d: d['doc_key'])
-    pred_dicts = sorted(pred_dicts, key=lambda d: d['doc_key'])
+    return (prec_samples, rec_samples, f1_samples)
 
-    # Check if the predictions include relations
-    pred_rels = True
-    try:
-        [d['predicted_relations'] for d in pred_dicts]
-    except KeyError:
-        pred_rels = False
 
-    # Check if there are any relations in the gold standard
-    gold_rels = False
-    for doc in gold_std_dicts:
-        for sent in doc['relations']:
-            if len(sent) != 0:
-                gold_rels = True
-    if not gold_rels:
-        warnings.warn('\n\nThere are no gold standard relation annotations. '
-                'Performance values and CIs will be 0 for models that predict '
-                'relations, please disregard.')
+def draw_boot_weights(num_docs, num_boot, rng=None):
+    """
+    Draw the resample weight matrix for a set of bootstrap replicates. Entry
+    (b, i) is the number of times document i was drawn in replicate b. The
+    matrix and its intermediates take several times num_boot*num_docs
+    values, so callers draw at most BOOT_BLOCK_SIZE replicates at a time.
 
-    # Bootstrap sampling
-    if bootstrap:
-        ent_boot_samples = draw_boot_samples(pred_dicts,
-                                    gold_std_dicts, num_boot, 'ent')
-        if pred_rels:
-            rel_boot_samples = draw_boot_samples(pred_dicts,
-                                    gold_std_dicts, num_boot, 'rel')
-
-        # Calculate confidence interval
-        ent_CIs = calculate_CI(ent_boot_samples[0], ent_boot_samples[1],
-                ent_boot_samples[2])
-
-        if pred_rels:
-            rel_CIs = calculate_CI(rel_boot_samples[0],  rel_boot_samples[1],
-                    rel_boot_samples[2])
-        else:
-            rel_CIs = [np.nan for i in range(3)]
+    Without rng, the indices are drawn from the global numpy random state in
+    the same order as drawing num_boot separate samples of size num_docs, so
+    a fixed np.random.seed gives the same replicates as sampling one at a
+    time.
 
-        # Get means
-        ent_means = [np.mean(samp) for samp in ent_boot_samples]
-        if pred_rels:
-            rel_means = [np.mean(samp) for samp in rel_boot_samples]
-        else:
-            rel_means = [np.nan for i in range(3)]
-
-        # Feels excessive but safer than returning a list, from experience
-        df_rows['pred_file'].append(basename(pred_file))
-        df_rows['gold_std_file'].append(basename(gold_std_file))
-        df_rows['ent_precision'].append(ent_means[0])
-        df_rows['ent_recall'].append(ent_means[1])
-        df_rows['ent_F1'].append(ent_means[2])
-        df_rows['rel_precision'].append(rel_means[0])
-        df_rows['rel_recall'].append(rel_means[1])
-        df_rows['rel_F1'].append(rel_means[2])
-        df_rows['ent_precision_CI'].append(ent_CIs[0])
-        df_rows['ent_recall_CI'].append(ent_CIs[1])
-        df_rows['ent_F1_CI'].append(ent_CIs[2])
-        df_rows['rel_precision_CI'].append(rel_CIs[0])
-        df_rows['rel_recall_CI'].append(rel_CIs[1])
-        df_rows['rel_F1_CI'].append(rel_CIs[2])
-
-        return df_rows
+    parameters:
+        num_docs, int: number of documents to resample
+        num_boot, int: number of bootstrap samples to draw
+        rng, numpy Generator: if provided, draw from it instead of the global
+            random state
 
+    returns:
+        weights, array of float: shape (num_boot, num_docs)
+    """
+    if rng is None:
+        idx = np.random.choice(num_docs, size=(num_boot, num_docs),
+                replace=True)
     else:
-        # Calculate performance
-        pred_ent, gold_ent, match_ent = get_f1_input(gold_std_dicts, pred_dicts, 'ent')
-        ent_means = compute_f1(pred_ent, gold_ent, match_ent)
-        if pred_rels:
-            pred_rel, gold_rel, match_rel = get_f1_input(gold_std_dicts,
-                    pred_dicts,
-                    'rel')
-            rel_means = compute_f1(pred_rel, gold_rel, match_rel)
-        else:
-            rel_means = [np.nan for i in range(3)]
+        idx = rng.integers(num_docs, size=(num_boot, num_docs))
+    # Offset each row's indices so one bincount fills the whole matrix
+    offsets = idx + num_docs*np.arange(num_boot)[:, np.newaxis]
+    weights = np.bincount(offsets.ravel(), minlength=num_boot*num_docs)
 
-        df_rows['pred_file'].append(basename(pred_file))
-        df_rows['gold_std_file'].append(basename(gold_std_file))
-        df_rows['ent_precision'].append(ent_means[0])
-        df_rows['ent_recall'].append(ent_means[1])
-        df_rows['ent_F1'].append(ent_means[2])
-        df_rows['rel_precision'].append(rel_means[0])
-        df_rows['rel_recall'].append(rel_means[1])
-        df_rows['rel_F1'].append(rel_means[2])
+    return weights.reshape(num_boot, num_docs).astype(np.float64)
 
-        return df_rows
 
+def flatten_doc_counts(doc_counts):
+    """
+    Reshape per-document counts to one row per document, so resample weights
+    can be applied with a single matrix multiply. The size of the rows is
+    given explicitly, because reshape can't infer it when there are no
+    documents.
 
-def main(gold_standard, out_name, predictions, bootstrap, num_boot):
-
-    # Calculate performance
-    verboseprint('\nCalculating performance...')
-    if bootstrap:
-        cols = ['pred_file', 'gold_std_file', 'ent_precision', 'ent_recall',
-                'ent_F1', 'rel_precision', 'rel_recall', 'rel_F1',
-                'ent_precision_CI', 'ent_recall_CI', 'ent_F1_CI',
-                'rel_precision_CI', 'rel_recall_CI', 'rel_F1_CI']
-    else:
-        cols = ['pred_file', 'gold_std_file', 'ent_precision', 'ent_recall',
-                'ent_F1', 'rel_precision', 'rel_recall', 'rel_F1']
-    df_rows = {k:[] for k in cols}
-    for model in predictions:
-        verboseprint(f'\nEvaluating model predictions from file {model}...')
-        df_rows = get_performance_row(model, gold_standard,
-                                           bootstrap, num_boot, df_rows)
+    parameters:
+        doc_counts, array of int: shape (num_docs, ..., 3)
 
-    # Make df
-    verboseprint('\nMaking dataframe...')
-    df = pd.DataFrame(
-        df_rows,
-        columns=cols)
-    verboseprint(f'Snapshot of dataframe:\n{df.head()}')
+    returns:
+        flat_counts, array of int: shape (num_docs, size of one document's
+            counts)
+    """
+    return doc_counts.reshape(len(doc_counts),
+            int(np.prod(doc_counts.shape[1:])))
 
-    # Save
-    verboseprint(f'\nSaving file as {out_name}')
-    df.to_csv(out_name, index=False)
 
-    verboseprint('\nDone!\n')
+# Number of replicates drawn at once, and from each child of a bootstrap
+# SeedSequence. Fixed so that the replicates don't depend on how many workers
+# draw them
+BOOT_BLOCK_SIZE = 100
 
 
-if __name__ == "__main__":
+def get_block_sizes(num_boot):
+    """
+    Split a number of bootstrap replicates into blocks of BOOT_BLOCK_SIZE.
+
+    parameters:
+        num_boot, int: number of bootstrap samples to draw
+
+    returns: sizes, list of int: size of each block, only the last one can
+        be smaller than BOOT_BLOCK_SIZE
+    """
+    sizes = [BOOT_BLOCK_SIZE for _ in range(num_boot // BOOT_BLOCK_SIZE)]
+    if num_boot % BOOT_BLOCK_SIZE:
+        sizes.append(num_boot % BOOT_BLOCK_SIZE)
+
+    return sizes
+
+
+def draw_boot_block(args):
+    """
+    Draw one block of seeded bootstrap replicates. Takes a single tuple so it
+    can be mapped over a process pool.
+
+    parameters:
+        args, tuple: (doc_counts, num_boot, seed_seq), see
+            draw_seeded_boot_counts
+
+    returns:
+        boot_counts, array of float: shape (num_boot,) + doc_counts.shape[1:],
+            summed counts for each replicate
+    """
+    doc_counts, num_boot, seed_seq = args
+    num_docs = len(doc_counts)
+    weights = draw_boot_weights(num_docs, num_boot,
+            np.random.default_rng(seed_seq))
+    boot_counts = weights @ flatten_doc_counts(doc_counts)
+
+    return boot_counts.reshape((num_boot,) + doc_counts.shape[1:])
+
+
+def draw_seeded_boot_counts(doc_counts, num_boot, seed, pool=None):
+    """
+    Draw bootstrap replicates reproducibly from a seed. The replicates are
+    split into blocks of BOOT_BLOCK_SIZE, each drawn from its own child of
+    np.random.SeedSequence(seed), so the blocks can be drawn in any order or
+    process and the merged result is identical for any number of workers.
+
+    parameters:
+        doc_counts, array of int: see draw_boot_samples_from_counts
+        num_boot, int: number of bootstrap samples to draw
+        seed, int or SeedSequence: seed for the replicates. Spawning children
+            from a SeedSequence advances it, so passing the same object again
+            gives new replicates
+        pool, multiprocessing Pool: if provided, blocks are drawn in parallel
+
+    returns:
+        boot_counts, array of float: shape (num_boot,) + doc_counts.shape[1:],
+            summed counts for each replicate
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    sizes = get_block_sizes(num_boot)
+    jobs = [(doc_counts, size, child) for size, child in
+            zip(sizes, seed.spawn(len(sizes)))]
+    if pool is not None:
+        blocks = pool.map(draw_boot_block, jobs)
+    else:
+        blocks = [draw_boot_block(job) for job in jobs]
+
+    return np.concatenate(blocks) if len(blocks) else \
+            np.zeros((0,) + doc_counts.shape[1:])
+
+
+def draw_boot_samples_from_counts(doc_counts, num_boot, seed=None,
+        pool=None):
+    """
+    Draw bootstrap samples from per-document counts. All metrics in
+    doc_counts are resampled with the same replicates.
+
+    parameters:
+        doc_counts, array of int: shape (num_docs, 3) as returned by
+            get_doc_counts, or (num_docs, num_metrics, 3) as returned by
+            read_doc_counts. The last axis is tp, fp and fn.
+        num_boot, int: number of bootstrap samples to draw
+        seed, int or SeedSequence: if provided, draw the replicates with
+            draw_seeded_boot_counts instead of from the global random state
+        pool, multiprocessing Pool: passed to draw_seeded_boot_counts, only
+            used if seed is provided
+
+    returns:
+        prec_samples, array of float: precision values for bootstraps
+        rec_samples, array of float: recall values for bootstraps
+        f1_samples, array of float: f1 values for bootstraps
+        All have shape (num_boot,) or (num_boot, num_metrics).
+    """
+    if seed is not None:
+        return get_boot_performance(draw_seeded_boot_counts(doc_counts,
+            num_boot, seed, pool))
+    # Draw in blocks so memory doesn't grow with num_boot. The blocks take
+    # the same values from the global random state as one large draw
+    flat_counts = flatten_doc_counts(doc_counts)
+    boot_counts = np.zeros((num_boot, flat_counts.shape[1]))
+    start = 0
+    for size in get_block_sizes(num_boot):
+        weights = draw_boot_weights(len(doc_counts), size)
+        boot_counts[start:start + size] = weights @ flat_counts
+        start += size
+    boot_counts = boot_counts.reshape((num_boot,) + doc_counts.shape[1:])
+
+    return get_boot_performance(boot_counts)
+
+
+def get_CI_bounds(boot_samples):
+    """
+    Get the bounds from calculate_CI for every metric in a set of bootstrap
+    samples.
+
+    parameters:
+        boot_samples, tuple of array: output of draw_boot_samples_from_counts
+
+    returns:
+        bounds, array of float: shape (num_metrics, 3, 2), the lower and upper
+            bound of the precision, recall and F1 CIs for each metric
+    """
+    prec, rec, f1 = [samp.reshape(len(samp), -1) for samp in boot_samples]
+    bounds = [calculate_CI(prec[:, i], rec[:, i], f1[:, i])
+            for i in range(prec.shape[1])]
+
+    return np.array(bounds)
+
+
+def draw_adaptive_boot_samples(doc_counts, max_boot, batch_size=50,
+        tol=0.005, seed=None, pool=None):
+    """
+    Draw bootstrap samples in batches until the CIs stop changing. After each
+    batch, the CIs of all metrics are recalculated from all samples so far,
+    and sampling stops when no CI bound has moved by tol or more since the
+    previous batch, or when max_boot samples have been drawn.
+
+    Without a seed, batches are drawn from the global random state in order,
+    so with a fixed np.random.seed the samples are the first ones that
+    draw_boot_samples_from_counts would give with num_boot = max_boot. With a
+    seed, each batch is drawn from the next child of
+    np.random.SeedSequence(seed).
+
+    parameters:
+        doc_counts, array of int: see draw_boot_samples_from_counts
+        max_boot, int: maximum number of bootstrap samples to draw
+        batch_size, int: number of bootstrap samples per batch
+        tol, float: largest change in a CI bound that counts as converged
+        seed, int: if provided, draw reproducibly, see
+            draw_seeded_boot_counts
+        pool, multiprocessing Pool: used to draw each batch if seed is
+            provided
+
+    returns:
+        prec_samples, array of float: precision values for bootstraps
+        rec_samples, array of float: recall values for bootstraps
+        f1_samples, array of float: f1 values for bootstraps
+        num_boot, int: number of bootstrap samples drawn
+    """
+    if max_boot < 1 or batch_size < 1:
+        raise ValueError('The maximum number of bootstrap samples and the '
+                f'batch size must be at least 1, got {max_boot} and '
+                f'{batch_size}')
+    if seed is not None:
+        seed = np.random.SeedSequence(seed)
+    boot_samples = None
+    prev_bounds = None
+    num_boot = 0
+    while num_boot < max_boot:
+        size = min(batch_size, max_boot - num_boot)
+        batch_seed = seed.spawn(1)[0] if seed is not None else None
+        batch = draw_boot_samples_from_counts(doc_counts, size, batch_seed,
+                pool)
+        if boot_samples is None:
+            boot_samples = batch
+        else:
+            boot_samples = tuple(np.concatenate([samp, new_samp])
+                    for samp, new_samp in zip(boot_samples, batch))
+        num_boot += size
+
+        bounds = get_CI_bounds(boot_samples)
+        if prev_bounds is not None and \
+                np.max(np.abs(bounds - prev_bounds)) < tol:
+            break
+        prev_bounds = bounds
+
+    return boot_samples + (num_boot,)
+
+
+def draw_boot_samples(pred_dicts, gold_std_dicts, num_boot, input_type):
+    """
+    Draw bootstrap samples.
+
+    Documents are only matched once; each replicate's counts are then the
+    weighted sum of the per-document counts.
+
+    parameters:
+        pred_dicts, list of dict: dicts of model predictions
+        gold_std_dicts, list of dict: dicts of gold standard annotations
+        num_boot, int: number of bootstrap samples to draw
+        input_type, str: 'ent' or 'rel'
+
+    returns:
+        prec_samples, array of float: precision values for bootstraps
+        rec_samples, array of float: recall values for bootstraps
+        f1_samples, array of float: f1 values for bootstraps
+    """
+    doc_counts = get_doc_counts(gold_std_dicts, pred_dicts, input_type)
+
+    return draw_boot_samples_from_counts(doc_counts, num_boot)
+
+
+def load_gold_standard(gold_std_file):
+    """
+    Read and index the gold standard. Should be done once and the index
+    passed to every call of get_performance_row.
+
+    parameters:
+        gold_std_file, str: name of the gold standard file
+
+    returns:
+        gold_index, dict: keys are doc_keys, values are the gold standard
+            dicts, in order of sorted doc_key
+    """
+    gold_std_dicts = []
+    with jsonlines.open(gold_std_file) as reader:
+        for obj in reader:
+            gold_std_dicts.append(obj)
+    gold_std_dicts = sorted(gold_std_dicts, key=lambda d: d['doc_key'])
+    gold_index = {d['doc_key']: d for d in gold_std_dicts}
+
+    # Check if there are any relations in the gold standard
+    gold_rels = False
+    for doc in gold_std_dicts:
+        for sent in doc['relations']:
+            if len(sent) != 0:
+                gold_rels = True
+    if not gold_rels:
+        warnings.warn('\n\nThere are no gold standard relation annotations. '
+                'Performance values and CIs will be 0 for models that predict '
+                'relations, please disregard.')
+
+    return gold_index
+
+
+def get_metric_names(gold_index, relaxed=False):
+    """
+    Get the names of all metrics computed by get_doc_metric_counts for a gold
+    standard. These are:
+        'ent': entity boundaries, ignoring type
+        'rel': relation argument boundaries in either order, ignoring type
+        'rel_ordered': relation argument boundaries in order, ignoring type
+        'ent_relaxed': overlapping entity boundaries, ignoring type, only if
+            relaxed is True
+        'rel_relaxed': overlapping relation arguments in either order,
+            ignoring type, only if relaxed is True
+        'ent_<type>': entity boundaries and type, for each gold entity type
+        'rel_<type>': relation argument boundaries in either order and type,
+            for each gold relation type
+
+    parameters:
+        gold_index, dict: output of load_gold_standard
+        relaxed, bool: whether to include the overlap metrics
+
+    returns:
+        metric_names, list of str: metric names
+    """
+    ent_labels = set()
+    rel_labels = set()
+    for doc in gold_index.values():
+        for sent in doc['ner']:
+            ent_labels.update(ent[2] for ent in sent)
+        for sent in doc['relations']:
+            rel_labels.update(rel[4] for rel in sent)
+
+    metric_names = ['ent', 'rel', 'rel_ordered']
+    if relaxed:
+        metric_names += ['ent_relaxed', 'rel_relaxed']
+    metric_names += [f'ent_{label}' for label in sorted(ent_labels)]
+    metric_names += [f'rel_{label}' for label in sorted(rel_labels)]
+
+    return metric_names
+
+
+ERROR_COLUMNS = ['model', 'doc_key', 'sent', 'type', 'error', 'start', 'end',
+        'start2', 'end2', 'label', 'text', 'text2', 'score']
+
+
+def get_error_record(doc_key, sent_idx, error_type, error, item, tokens):
+    """
+    Format a false positive or false negative for the error store.
+
+    parameters:
+        doc_key, str: doc ID
+        sent_idx, int: index of the sentence in the document
+        error_type, str: "ent" or "rel"
+        error, str: "fp" or "fn"
+        item, list: the entity or relation, in dygiepp format
+        tokens, list of str: all tokens of the document, empty if the
+            document has no "sentences"
+
+    returns:
+        record, tuple: values for ERROR_COLUMNS, without the model
+    """
+    def get_text(start, end):
+        return ' '.join(tokens[start:end + 1]) if len(tokens) else None
+
+    if error_type == 'ent':
+        score = item[4] if len(item) > 4 else None
+        return (doc_key, sent_idx, error_type, error, item[0], item[1], None,
+                None, item[2], get_text(item[0], item[1]), None, score)
+    else:
+        score = item[6] if len(item) > 6 else None
+        return (doc_key, sent_idx, error_type, error, item[0], item[1],
+                item[2], item[3], item[4], get_text(item[0], item[1]),
+                get_text(item[2], item[3]), score)
+
+
+def get_doc_metric_counts(doc, gold_std, metric_ids, errors=None,
+        count_ents=True):
+    """
+    Get the true/false positives and false negatives for every metric for a
+    single document in one pass over its sentences. The 'ent', 'rel' and
+    'rel_ordered' counts are the same as those from get_doc_ent_counts and
+    get_doc_rel_counts.
+
+    parameters:
+        doc, dict: dygiepp-formatted dictionary, with keys "predicted_ner" and
+            optionally "predicted_relations"
+        gold_std, dict: dygiepp-formatted dicitonary with gold standard for
+            this doc, with keys "ner" and "relations"
+        metric_ids, dict: keys are the metric names from get_metric_names,
+            values are their row in the returned array
+        errors, list: if provided, the false positives and false negatives
+            of the 'ent' and 'rel' metrics are appended to it as records from
+            get_error_record
+        count_ents, bool: if False, the 'ent' and 'ent_<type>' rows are left
+            at zero, for when they're counted by get_columnar_ent_counts and
+            add_columnar_typed_counts. Default is True.
+
+    returns:
+        counts, array of int: shape (len(metric_ids), 3), columns are tp, fp
+            and fn
+    """
+    counts = np.zeros((len(metric_ids), 3), dtype=np.int64)
+    ent, rel, rel_ordered = metric_ids['ent'], metric_ids['rel'], \
+            metric_ids['rel_ordered']
+    ent_relaxed = metric_ids.get('ent_relaxed')
+    rel_relaxed = metric_ids.get('rel_relaxed')
+    if errors is not None:
+        sents = doc.get('sentences', gold_std.get('sentences', []))
+        tokens = [tok for sent in sents for tok in sent]
+
+    # Entities
+    for sent_idx, (pred_sent, gold_sent) in enumerate(zip(
+            doc['predicted_ner'], gold_std['ner'])):
+        if not count_ents and ent_relaxed is None:
+            break
+        pred_spans = {(e[0], e[1]) for e in pred_sent}
+        gold_spans = {(e[0], e[1]) for e in gold_sent}
+        if count_ents:
+            pred_typed = {(e[0], e[1], e[2]) for e in pred_sent}
+            gold_typed = {(e[0], e[1], e[2]) for e in gold_sent}
+            for pred in pred_sent:
+                found = (pred[0], pred[1]) in gold_spans
+                counts[ent, 0 if found else 1] += 1
+                if errors is not None and not found:
+                    errors.append(get_error_record(doc['doc_key'], sent_idx,
+                        'ent', 'fp', pred, tokens))
+                label = metric_ids.get(f'ent_{pred[2]}')
+                if label is not None:
+                    found = (pred[0], pred[1], pred[2]) in gold_typed
+                    counts[label, 0 if found else 1] += 1
+            for gold in gold_sent:
+                if (gold[0], gold[1]) not in pred_spans:
+                    counts[ent, 2] += 1
+                    if errors is not None:
+                        errors.append(get_error_record(doc['doc_key'],
+                            sent_idx, 'ent', 'fn', gold, tokens))
+                if (gold[0], gold[1], gold[2]) not in pred_typed:
+                    counts[metric_ids[f'ent_{gold[2]}'], 2] += 1
+        if ent_relaxed is not None:
+            pred_span_index = build_span_index(list(pred_spans))
+            gold_span_index = build_span_index(list(gold_spans))
+            for pred in pred_sent:
+                found = len(get_overlaps((pred[0], pred[1]),
+                    gold_span_index)) > 0
+                counts[ent_relaxed, 0 if found else 1] += 1
+            for gold in gold_sent:
+                if len(get_overlaps((gold[0], gold[1]),
+                        pred_span_index)) == 0:
+                    counts[ent_relaxed, 2] += 1
+
+    # Relations
+    if 'predicted_relations' not in doc:
+        return counts
+    for sent_idx, (pred_sent, gold_sent) in enumerate(zip(
+            doc['predicted_relations'], gold_std['relations'])):
+        pred_sent = eliminate_rel_dups(pred_sent, doc['doc_key'],
+                "predictions")
+        gold_sent = eliminate_rel_dups(gold_sent, doc['doc_key'],
+                "gold standard")
+        pred_index = build_rel_index(pred_sent)
+        gold_index = build_rel_index(gold_sent)
+        pred_typed = {(get_rel_key(r), r[4]) for r in pred_sent}
+        gold_typed = {(get_rel_key(r), r[4]) for r in gold_sent}
+        for pred in pred_sent:
+            found = rel_in_index(pred, gold_index)
+            counts[rel, 0 if found else 1] += 1
+            if errors is not None and not found:
+                errors.append(get_error_record(doc['doc_key'], sent_idx,
+                    'rel', 'fp', pred, tokens))
+            counts[rel_ordered,
+                    0 if rel_in_index(pred, gold_index, True) else 1] += 1
+            label = metric_ids.get(f'rel_{pred[4]}')
+            if label is not None:
+                found = (get_rel_key(pred), pred[4]) in gold_typed
+                counts[label, 0 if found else 1] += 1
+        for gold in gold_sent:
+            if not rel_in_index(gold, pred_index):
+                counts[rel, 2] += 1
+                if errors is not None:
+                    errors.append(get_error_record(doc['doc_key'], sent_idx,
+                        'rel', 'fn', gold, tokens))
+            if not rel_in_index(gold, pred_index, True):
+                counts[rel_ordered, 2] += 1
+            if (get_rel_key(gold), gold[4]) not in pred_typed:
+                counts[metric_ids[f'rel_{gold[4]}'], 2] += 1
+        if rel_relaxed is not None:
+            pred_heads = build_span_index([(r[0], r[1]) for r in pred_sent],
+                    pred_sent)
+            gold_heads = build_span_index([(r[0], r[1]) for r in gold_sent],
+                    gold_sent)
+            for pred in pred_sent:
+                found = rel_overlaps_index(pred, gold_heads)
+                counts[rel_relaxed, 0 if found else 1] += 1
+            for gold in gold_sent:
+                if not rel_overlaps_index(gold, pred_heads):
+                    counts[rel_relaxed, 2] += 1
+
+    return counts
+
+
+def stream_doc_counts(pred_docs, gold_index, metric_names, errors=None,
+        backend='columnar'):
+    """
+    Get per-document counts for all metrics from an iterable of prediction
+    documents. Each document is joined to its gold standard by doc_key and
+    counted before the next one is taken, so if pred_docs is a file reader,
+    peak memory is the gold standard plus one prediction document, and the
+    entity span arrays if backend is 'columnar'.
+
+    If a doc_key appears more than once in the predictions, its counts are
+    added together.
+
+    parameters:
+        pred_docs, iterable of dict: dygiepp formatted predictions
+        gold_index, dict: output of load_gold_standard
+        metric_names, list of str: output of get_metric_names
+        errors, list: if provided, error records are appended to it, see
+            get_doc_metric_counts
+        backend, str: 'columnar' or 'dict'. With 'columnar', the 'ent' and
+            'ent_<type>' counts are made for all documents at once by
+            get_columnar_ent_counts and add_columnar_typed_counts; with
+            'dict', document by document as for the other metrics. The
+            counts are the same. Errors are only recorded by 'dict', so it's
+            used whenever errors is provided. Default is 'columnar'.
+
+    returns:
+        doc_keys, list of str: doc_key of each row of doc_counts, sorted
+        doc_counts, array of int: shape (num_docs, len(metric_names), 3),
+            last axis is tp, fp and fn
+        pred_rels, bool: whether all documents included relation predictions
+    """
+    metric_ids = {name: i for i, name in enumerate(metric_names)}
+    # Rows of the count array follow the sorted order of gold_index
+    doc_rows = {doc_key: i for i, doc_key in enumerate(gold_index)}
+    counts = np.zeros((len(gold_index), len(metric_names), 3), dtype=np.int64)
+    seen = np.zeros(len(gold_index), dtype=bool)
+    pred_rels = True
+    columnar = backend == 'columnar' and errors is None
+    # Spans and count row of each document, in the order read. Entity types
+    # are stored as the row of their metric
+    span_buffers = new_span_buffers()
+    span_rows = array('q')
+    label_ids = {name[4:]: i for name, i in metric_ids.items()
+            if name.startswith('ent_')}
+
+    for doc in pred_docs:
+        row = doc_rows.get(doc['doc_key'])
+        if row is None:
+            verboseprint(
+                f'Document {doc["doc_key"]} is not in the gold standard. '
+                'Skipping this document for performance calculation.')
+            continue
+        seen[row] = True
+        if 'predicted_relations' not in doc:
+            pred_rels = False
+        gold_std = gold_index[doc['doc_key']]
+        counts[row] += get_doc_metric_counts(doc, gold_std, metric_ids,
+                errors, count_ents=not columnar)
+        if columnar:
+            add_doc_spans(span_buffers, doc, gold_std, label_ids)
+            span_rows.append(row)
+
+    # Documents are joined separately even if their doc_key is repeated, so
+    # that the counts are the same as from get_doc_metric_counts
+    if columnar:
+        span_rows = np.frombuffer(span_rows, dtype=np.int64)
+        pred_spans, gold_spans = stack_span_arrays(span_buffers)
+        np.add.at(counts[:, metric_ids['ent']], span_rows,
+                get_columnar_ent_counts(pred_spans, gold_spans,
+                    len(span_rows)))
+        add_columnar_typed_counts(counts, span_rows, pred_spans, gold_spans)
+
+    doc_keys = [doc_key for doc_key, row in doc_rows.items() if seen[row]]
+
+    return (doc_keys, counts[seen], pred_rels)
+
+
+def read_doc_counts(pred_file, gold_index, metric_names, stream=False,
+        errors=None, backend='columnar'):
+    """
+    Get per-document counts for all metrics for a prediction file.
+
+    parameters:
+        pred_file, str: name of the file used for predictions
+        gold_index, dict: output of load_gold_standard
+        metric_names, list of str: output of get_metric_names
+        stream, bool: if True, read the predictions one document at a time
+            instead of loading the whole file first
+        errors, list: if provided, error records are appended to it, see
+            get_doc_metric_counts
+        backend, str: 'columnar' or 'dict', see stream_doc_counts
+
+    returns:
+        doc_keys, list of str: see stream_doc_counts
+        doc_counts, array of int: see stream_doc_counts
+        pred_rels, bool: whether all documents included relation predictions
+    """
+    with jsonlines.open(pred_file) as reader:
+        if stream:
+            return stream_doc_counts(reader, gold_index, metric_names, errors,
+                    backend)
+        pred_dicts = [obj for obj in reader]
+
+    return stream_doc_counts(pred_dicts, gold_index, metric_names, errors,
+            backend)
+
+
+def score_performance(pred_file, gold_std_file, doc_counts, pred_rels,
+        metric_names, bootstrap, num_boot, adaptive=False, boot_batch=50,
+        boot_tol=0.005, seed=None, pool=None):
+    """
+    Gets performance metrics from the per-document counts of one prediction
+    file.
+
+    parameters:
+        pred_file, str: name of the file used for predictions
+        gold_std_file, str: name of the gold standard file
+        doc_counts, array of int: output of read_doc_counts
+        pred_rels, bool: whether the predictions include relations
+        metric_names, list of str: output of get_metric_names
+        bootstrap, bool, whether or not to bootstrap a confidence interval
+        num_boot, int: if bootstrap is True, how many bootstrap samples to
+            take, or the maximum number if adaptive is True
+        adaptive, bool: if True, stop bootstrapping once the CIs converge,
+            see draw_adaptive_boot_samples
+        boot_batch, int: bootstrap samples per batch if adaptive is True
+        boot_tol, float: CI convergence tolerance if adaptive is True
+        seed, int: if provided, bootstrap reproducibly from this seed, see
+            draw_seeded_boot_counts. Otherwise the global random state is used
+        pool, multiprocessing Pool: if provided with seed, bootstrap blocks
+            are drawn in parallel
+
+    returns:
+        row, dict: keys are column names, values are performance values and
+            CIs for this prediction file
+    """
+    row = {'pred_file': basename(pred_file),
+           'gold_std_file': basename(gold_std_file)}
+
+    # One set of replicates is shared by all metrics
+    if bootstrap and adaptive:
+        boot_samples = draw_adaptive_boot_samples(doc_counts, num_boot,
+                boot_batch, boot_tol, seed, pool)
+        row['num_boot'] = boot_samples[3]
+        boot_samples = boot_samples[:3]
+    elif bootstrap:
+        boot_samples = draw_boot_samples_from_counts(doc_counts, num_boot,
+                seed, pool)
+        row['num_boot'] = num_boot
+    else:
+        totals = doc_counts.sum(axis=0)
+
+    for i, metric in enumerate(metric_names):
+        if metric.startswith('rel') and not pred_rels:
+            means = [np.nan for _ in range(3)]
+            CIs = [np.nan for _ in range(3)]
+        elif bootstrap:
+            samples = [samp[:, i] for samp in boot_samples]
+            # Calculate confidence interval
+            CIs = calculate_CI(samples[0], samples[1], samples[2])
+            # Get means
+            means = [np.mean(samp) for samp in samples]
+        else:
+            # Calculate performance
+            tp, fp, fn = totals[i]
+            means = compute_f1(int(tp + fp), int(tp + fn), int(tp))
+
+        row[f'{metric}_precision'] = means[0]
+        row[f'{metric}_recall'] = means[1]
+        row[f'{metric}_F1'] = means[2]
+        if bootstrap:
+            row[f'{metric}_precision_CI'] = CIs[0]
+            row[f'{metric}_recall_CI'] = CIs[1]
+            row[f'{metric}_F1_CI'] = CIs[2]
+
+    return row
+
+
+def get_performance(pred_file, gold_std_file, bootstrap, num_boot, gold_index,
+        stream=False, metric_names=None):
+    """
+    Gets performance metrics for one prediction file.
+
+    parameters:
+        pred_file, str: name of the file used for predictions
+        gold_std_file, str: name of the gold standard file
+        bootstrap, bool, whether or not to bootstrap a confidence interval
+        num_boot, int: if bootstrap is True, how many bootstrap samples to take
+        gold_index, dict: output of load_gold_standard
+        stream, bool: if True, read the predictions one document at a time
+            instead of loading the whole file
+        metric_names, list of str: output of get_metric_names, computed from
+            gold_index if not provided
+
+    returns:
+        row, dict: keys are column names, values are performance values and
+            CIs for this prediction file
+    """
+    if metric_names is None:
+        metric_names = get_metric_names(gold_index)
+    _, doc_counts, pred_rels = read_doc_counts(pred_file, gold_index,
+            metric_names, stream)
+
+    return score_performance(pred_file, gold_std_file, doc_counts, pred_rels,
+            metric_names, bootstrap, num_boot)
+
+
+def paired_bootstrap(model_counts, metric_names, num_boot, seed=None):
+    """
+    Compare every pair of models with a paired bootstrap. One set of resample
+    weights is drawn over the documents predicted by all models and applied
+    to the per-document counts of each model, so each extra model costs one
+    matrix multiply per block of replicates.
+
+    The p-value is two-sided: twice the fraction of replicates in which the
+    difference in F1 is on the other side of zero, capped at 1.
+
+    parameters:
+        model_counts, dict: keys are model names, values are the
+            (doc_keys, doc_counts, pred_rels) output of read_doc_counts
+        metric_names, list of str: output of get_metric_names
+        num_boot, int: number of bootstrap samples to draw
+        seed, int: if provided, draw the resample weights from
+            np.random.SeedSequence(seed) instead of the global random state
+
+    returns:
+        paired_rows, list of dict: one per pair of models and metric, with
+            keys model_a, model_b, metric, F1_a, F1_b, delta_F1, delta_F1_CI
+            and p_value. delta_F1 is F1_a - F1_b. If the models have no
+            documents in common, all values but the names are NaN
+    """
+    models = list(model_counts.keys())
+
+    # Only use documents that every model has predictions for
+    shared_keys = model_counts[models[0]][0]
+    for model in models[1:]:
+        model_keys = set(model_counts[model][0])
+        shared_keys = [k for k in shared_keys if k in model_keys]
+    num_docs = len(shared_keys)
+    if num_docs == 0:
+        warnings.warn('\n\nThe prediction files have no documents in common, '
+                'so they can\'t be compared. Paired bootstrap results will be '
+                'NaN.')
+
+    if seed is not None:
+        rng = np.random.default_rng(np.random.SeedSequence(seed))
+    else:
+        rng = None
+    shared_counts = {}
+    boot_counts = {}
+    for model in models:
+        doc_keys, doc_counts, _ = model_counts[model]
+        rows = {doc_key: i for i, doc_key in enumerate(doc_keys)}
+        shared_counts[model] = doc_counts[[rows[k] for k in shared_keys]]
+        boot_counts[model] = np.zeros((num_boot,
+            flatten_doc_counts(shared_counts[model]).shape[1]))
+    # Every model gets the same weights, drawn in blocks so memory doesn't
+    # grow with num_boot
+    start = 0
+    for size in get_block_sizes(num_boot):
+        weights = draw_boot_weights(num_docs, size, rng)
+        for model in models:
+            boot_counts[model][start:start + size] = weights @ \
+                    flatten_doc_counts(shared_counts[model])
+        start += size
+    boot_f1 = {}
+    full_f1 = {}
+    for model in models:
+        counts = shared_counts[model]
+        boot_f1[model] = get_boot_performance(boot_counts[model].reshape(
+            (num_boot,) + counts.shape[1:]))[2]
+        full_f1[model] = get_boot_performance(counts.sum(axis=0))[2]
+
+    # Same percentile method and alpha as calculate_CI
+    alpha = 0.05
+    paired_rows = []
+    for a in range(len(models)):
+        for b in range(a + 1, len(models)):
+            model_a, model_b = models[a], models[b]
+            for i, metric in enumerate(metric_names):
+                if metric.startswith('rel') and not (
+                        model_counts[model_a][2] and model_counts[model_b][2]):
+                    continue
+                if num_docs == 0:
+                    paired_rows.append({'model_a': model_a,
+                        'model_b': model_b, 'metric': metric,
+                        'F1_a': np.nan, 'F1_b': np.nan, 'delta_F1': np.nan,
+                        'delta_F1_CI': (np.nan, np.nan), 'p_value': np.nan})
+                    continue
+                deltas = boot_f1[model_a][:, i] - boot_f1[model_b][:, i]
+                delta_CI = (float(np.percentile(deltas, 100*(alpha/2))),
+                        float(np.percentile(deltas, 100*(1-alpha/2))))
+                p_value = min(1.0, 2*min(np.mean(deltas <= 0),
+                    np.mean(deltas >= 0)))
+                paired_rows.append({'model_a': model_a,
+                    'model_b': model_b,
+                    'metric': metric,
+                    'F1_a': full_f1[model_a][i],
+                    'F1_b': full_f1[model_b][i],
+                    'delta_F1': full_f1[model_a][i] - full_f1[model_b][i],
+                    'delta_F1_CI': delta_CI,
+                    'p_value': p_value})
+
+    return paired_rows
+
+
+def get_rel_scores(pred_docs, gold_index, ordered=False, subset_keys=None):
+    """
+    Get the softmax score of every relation prediction, whether each one is a
+    true positive, and the best score among the predictions that match each
+    gold standard relation. Uses the same matching as the 'rel' and
+    'rel_ordered' metrics of get_doc_metric_counts.
+
+    Predictions without a softmax score are given a score of infinity, so
+    they're kept at every threshold.
+
+    parameters:
+        pred_docs, iterable of dict: dygiepp formatted predictions, relations
+            are [start1, end1, start2, end2, type, logit, softmax]
+        gold_index, dict: output of load_gold_standard
+        ordered, bool: if True, head and tail must match in order
+        subset_keys, iterable of str: if provided, only use these documents
+
+    returns:
+        pred_scores, array of float: softmax score of each prediction
+        pred_tp, array of bool: whether each prediction is a true positive
+        gold_best, array of float: for each gold standard relation in the
+            predicted documents, the best score of a prediction that matches
+            it, or -inf if none do
+    """
+    if subset_keys is not None:
+        subset_keys = set(subset_keys)
+    pred_scores = []
+    pred_tp = []
+    gold_best = []
+    unscored = False
+
+    for doc in pred_docs:
+        gold_std = gold_index.get(doc['doc_key'])
+        if gold_std is None or 'predicted_relations' not in doc:
+            continue
+        if subset_keys is not None and doc['doc_key'] not in subset_keys:
+            continue
+        for pred_sent, gold_sent in zip(doc['predicted_relations'],
+                gold_std['relations']):
+            pred_sent = eliminate_rel_dups(pred_sent, doc['doc_key'],
+                    "predictions")
+            gold_sent = eliminate_rel_dups(gold_sent, doc['doc_key'],
+                    "gold standard")
+            rel_index = build_rel_index(gold_sent)
+            best = {}
+            for pred in pred_sent:
+                if len(pred) > 6:
+                    score = pred[6]
+                else:
+                    score = np.inf
+                    unscored = True
+                pred_scores.append(score)
+                pred_tp.append(rel_in_index(pred, rel_index, ordered))
+                key = get_rel_key(pred, ordered)
+                best[key] = max(best.get(key, -np.inf), score)
+            for gold in gold_sent:
+                gold_best.append(best.get(get_rel_key(gold, ordered), -np.inf))
+
+    if unscored:
+        warnings.warn('\nSome relation predictions have no softmax score. '
+                'They will be kept at every threshold.')
+
+    return (np.array(pred_scores, dtype=float), np.array(pred_tp, dtype=bool),
+            np.array(gold_best, dtype=float))
+
+
+def sweep_thresholds(pred_scores, pred_tp, gold_best):
+    """
+    Get precision, recall and F1 at every distinct prediction score, keeping
+    the predictions with a score at or above the threshold. The predictions
+    are sorted once and the counts at every threshold come from cumulative
+    sums, instead of scoring a separately filtered set of predictions for each
+    threshold.
+
+    parameters:
+        pred_scores, pred_tp, gold_best: output of get_rel_scores
+
+    returns:
+        sweep, dict: keys are threshold, precision, recall and F1, values are
+            arrays in order of decreasing threshold
+    """
+    # Sort by decreasing score
+    order = np.argsort(-pred_scores, kind='stable')
+    scores = pred_scores[order]
+    cum_tp = np.cumsum(pred_tp[order])
+    cum_fp = np.cumsum(~pred_tp[order])
+
+    # Tied scores are all kept or dropped together, so only the last
+    # prediction with each score gives a threshold
+    last = np.append(scores[1:] != scores[:-1], True) if len(scores) else \
+            np.zeros(0, dtype=bool)
+    thresholds = scores[last]
+    tp = cum_tp[last]
+    fp = cum_fp[last]
+
+    # A gold relation is found once its best matching prediction is kept
+    gold_sorted = np.sort(gold_best)
+    found = len(gold_sorted) - np.searchsorted(gold_sorted, thresholds,
+            side='left')
+    fn = len(gold_sorted) - found
+
+    prec, rec, f1 = get_boot_performance(np.stack([tp, fp, fn], axis=-1))
+
+    return {'threshold': thresholds, 'precision': prec, 'recall': rec,
+            'F1': f1}
+
+
+def read_threshold_sweep(pred_file, gold_index, ordered=False,
+        subset_keys=None):
+    """
+    Sweep the relation softmax threshold for a prediction file.
+
+    parameters:
+        pred_file, str: name of the file used for predictions
+        gold_index, dict: output of load_gold_standard
+        ordered, bool: if True, head and tail must match in order
+        subset_keys, iterable of str: if provided, only use these documents
+
+    returns:
+        sweep, dict: output of sweep_thresholds
+    """
+    with jsonlines.open(pred_file) as reader:
+        return sweep_thresholds(*get_rel_scores(reader, gold_index, ordered,
+            subset_keys))
+
+
+def get_best_threshold(sweep, metric='rel'):
+    """
+    Get the threshold with the best F1 from a threshold sweep. Ties go to the
+    highest threshold.
+
+    parameters:
+        sweep, dict: output of sweep_thresholds
+        metric, str: name of the metric, used as the prefix of the keys
+
+    returns:
+        best, dict: keys are <metric>_best_threshold, <metric>_best_precision,
+            <metric>_best_recall and <metric>_best_F1. Values are NaN if there
+            are no predictions
+    """
+    names = ['threshold', 'precision', 'recall', 'F1']
+    if len(sweep['threshold']) == 0:
+        return {f'{metric}_best_{name}': np.nan for name in names}
+    i = np.argmax(sweep['F1'])
+
+    return {f'{metric}_best_{name}': float(sweep[name][i]) for name in names}
+
+
+def get_columns(metric_names, bootstrap, threshold_sweep=False):
+    """
+    Get the output columns for a set of metrics.
+
+    parameters:
+        metric_names, list of str: output of get_metric_names
+        bootstrap, bool: whether CI columns are included
+        threshold_sweep, bool: whether best relation threshold columns are
+            included
+
+    returns:
+        cols, list of str: column names
+    """
+    cols = ['pred_file', 'gold_std_file']
+    for metric in metric_names:
+        cols += [f'{metric}_precision', f'{metric}_recall', f'{metric}_F1']
+    if bootstrap:
+        for metric in metric_names:
+            cols += [f'{metric}_precision_CI', f'{metric}_recall_CI',
+                    f'{metric}_F1_CI']
+        cols.append('num_boot')
+    if threshold_sweep:
+        cols += ['rel_best_threshold', 'rel_best_precision',
+                'rel_best_recall', 'rel_best_F1']
+
+    return cols
+
+
+def get_performance_row(pred_file, gold_std_file, bootstrap, num_boot, df_rows,
+        gold_index=None, stream=False):
+    """
+    Gets performance metrics and returns as a list.
+
+    parameters:
+        pred_file, str: name of the file used for predictions
+        gold_std_file, str: name of the gold standard file
+        bootstrap, bool, whether or not to bootstrap a confidence interval
+        num_boot, int: if bootstrap is True, how many bootstrap samples to take
+        df_rows, dict: keys are column names, values are lists of performance
+            values and CIs to which new results will be appended
+        gold_index, dict: output of load_gold_standard. If not provided, the
+            gold standard is read from gold_std_file.
+        stream, bool: if True, stream the predictions instead of loading them
+
+    returns:
+        df_rows, dict: df_rows updated with new row values
+    """
+    if gold_index is None:
+        gold_index = load_gold_standard(gold_std_file)
+    row = get_performance(pred_file, gold_std_file, bootstrap, num_boot,
+            gold_index, stream)
+    for col in df_rows.keys():
+        df_rows[col].append(row.get(col, np.nan))
+
+    return df_rows
+
+
+def hash_file(path):
+    """
+    Get the SHA-256 hash of a file's contents, reading it in chunks.
+
+    parameters:
+        path, str: file to hash
+
+    returns:
+        hex digest, str
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+# Changes whenever the same seed would give different bootstrap samples, so
+# that rows cached with the old samples aren't used
+BOOT_RNG_VERSION = 'seedsequence-1'
+
+
+def get_cache_key(pred_hash, gold_hash, metric_names, bootstrap, num_boot,
+        seed, extra_config=None):
+    """
+    Get the key for a performance row in the evaluation cache. Anything that
+    changes the row is part of the key, but file names are not, so renamed or
+    copied prediction files are still found.
+
+    parameters:
+        pred_hash, str: hash_file of the prediction file
+        gold_hash, str: hash_file of the gold standard file
+        metric_names, list of str: output of get_metric_names
+        bootstrap, bool: whether CIs were bootstrapped
+        num_boot, int: number of bootstrap samples
+        seed, int or None: random seed
+        extra_config, list: any other settings that change the row, e.g.
+            the adaptive bootstrap settings or a document subset
+
+    returns:
+        key, str
+    """
+    config = json.dumps([pred_hash, gold_hash, metric_names, bootstrap,
+        num_boot, seed, extra_config, BOOT_RNG_VERSION])
+
+    return hashlib.sha256(config.encode('utf-8')).hexdigest()
+
+
+def load_cache(cache_file):
+    """
+    Read the evaluation cache. Tuples (the CIs) are stored as lists in JSON,
+    and are converted back.
+
+    parameters:
+        cache_file, str: path to the JSON cache file
+
+    returns:
+        cache, dict: keys are cache keys, values are performance rows. Empty
+            if the file doesn't exist yet
+    """
+    if not exists(cache_file):
+        return {}
+    with open(cache_file) as f:
+        cache = json.load(f)
+    for row in cache.values():
+        for col, val in row.items():
+            if isinstance(val, list):
+                row[col] = tuple(val)
+
+    return cache
+
+
+def save_cache(cache, cache_file):
+    """
+    Write the evaluation cache. Written to a temporary file first so an
+    interrupted run can't leave a truncated cache behind.
+
+    parameters:
+        cache, dict: keys are cache keys, values are performance rows
+        cache_file, str: path to the JSON cache file
+
+    returns: None
+    """
+    tmp_file = f'{cache_file}.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(cache, f)
+    replace(tmp_file, cache_file)
+
+
+def save_doc_counts(counts_file, doc_keys, doc_counts, pred_rels,
+        metric_names, pred_file, gold_std_file, pred_hash, gold_hash):
+    """
+    Save the per-document counts of one prediction file, so that any subset
+    of the documents can be scored later without matching them again.
+
+    parameters:
+        counts_file, str: path to save to, should end in .npz
+        doc_keys, list of str: doc_key of each row of doc_counts
+        doc_counts, array of int: output of read_doc_counts
+        pred_rels, bool: whether the predictions include relations
+        metric_names, list of str: output of get_metric_names
+        pred_file, str: name of the prediction file
+        gold_std_file, str: name of the gold standard file
+        pred_hash, str: hash_file of the prediction file
+        gold_hash, str: hash_file of the gold standard file
+
+    returns: None
+    """
+    np.savez_compressed(counts_file,
+            doc_keys=np.array(doc_keys, dtype=str),
+            doc_counts=doc_counts,
+            pred_rels=pred_rels,
+            metric_names=np.array(metric_names, dtype=str),
+            pred_file=basename(pred_file),
+            gold_std_file=basename(gold_std_file),
+            pred_hash=pred_hash,
+            gold_hash=gold_hash)
+
+
+def load_doc_counts(counts_file):
+    """
+    Read per-document counts saved with save_doc_counts.
+
+    parameters:
+        counts_file, str: path to the .npz file
+
+    returns:
+        stored, dict: same keys as the arguments to save_doc_counts, with
+            doc_keys and metric_names as lists and the rest as Python types
+    """
+    with np.load(counts_file) as f:
+        stored = {
+            'doc_keys': f['doc_keys'].tolist(),
+            'doc_counts': f['doc_counts'],
+            'pred_rels': bool(f['pred_rels']),
+            'metric_names': f['metric_names'].tolist(),
+            'pred_file': str(f['pred_file']),
+            'gold_std_file': str(f['gold_std_file']),
+            'pred_hash': str(f['pred_hash']),
+            'gold_hash': str(f['gold_hash'])}
+
+    return stored
+
+
+def subset_doc_counts(doc_keys, doc_counts, subset_keys):
+    """
+    Keep only the rows of doc_counts for documents in subset_keys. Documents
+    in subset_keys that aren't in doc_keys are ignored.
+
+    parameters:
+        doc_keys, list of str: doc_key of each row of doc_counts
+        doc_counts, array of int: per-document counts
+        subset_keys, iterable of str: doc_keys to keep
+
+    returns:
+        doc_keys, list of str: the kept doc_keys, in their original order
+        doc_counts, array of int: the kept rows
+    """
+    subset_keys = set(subset_keys)
+    keep = [i for i, doc_key in enumerate(doc_keys) if doc_key in subset_keys]
+
+    return ([doc_keys[i] for i in keep], doc_counts[keep])
+
+
+def evaluate_subset(counts_file, subset_keys, bootstrap, num_boot, seed=None):
+    """
+    Score a subset of the documents of one prediction file from its saved
+    per-document counts, without reading or matching any predictions.
+
+    parameters:
+        counts_file, str: path to counts saved with save_doc_counts
+        subset_keys, iterable of str: doc_keys to score
+        bootstrap, bool, whether or not to bootstrap a confidence interval
+        num_boot, int: if bootstrap is True, how many bootstrap samples to take
+        seed, int: random seed for bootstrapping
+
+    returns:
+        row, dict: same as the output of score_performance
+    """
+    stored = load_doc_counts(counts_file)
+    _, doc_counts = subset_doc_counts(stored['doc_keys'],
+            stored['doc_counts'], subset_keys)
+
+    return score_performance(stored['pred_file'], stored['gold_std_file'],
+            doc_counts, stored['pred_rels'], stored['metric_names'],
+            bootstrap, num_boot, seed=seed)
+
+
+def connect_error_db(error_db):
+    """
+    Open the error store, creating its tables and indexes if needed.
+
+    The errors table has one row per false positive or false negative, with
+    the columns in ERROR_COLUMNS. The models table records the prediction
+    and gold standard hashes each model's errors came from.
+
+    parameters:
+        error_db, str: path to the SQLite database
+
+    returns:
+        conn, sqlite3.Connection: open connection
+    """
+    conn = sqlite3.connect(error_db)
+    conn.execute('CREATE TABLE IF NOT EXISTS errors (model TEXT, doc_key '
+            'TEXT, sent INTEGER, type TEXT, error TEXT, start INTEGER, end '
+            'INTEGER, start2 INTEGER, end2 INTEGER, label TEXT, text TEXT, '
+            'text2 TEXT, score REAL)')
+    conn.execute('CREATE TABLE IF NOT EXISTS models (model TEXT PRIMARY KEY, '
+            'pred_hash TEXT, gold_hash TEXT)')
+    conn.execute('CREATE INDEX IF NOT EXISTS errors_model ON errors '
+            '(model, type, error)')
+    conn.execute('CREATE INDEX IF NOT EXISTS errors_text ON errors '
+            '(type, error, text)')
+    conn.execute('CREATE INDEX IF NOT EXISTS errors_label ON errors '
+            '(type, error, label)')
+
+    return conn
+
+
+def load_error_models(error_db):
+    """
+    Get the models that already have errors in the error store.
+
+    parameters:
+        error_db, str: path to the SQLite database
+
+    returns:
+        error_models, dict: keys are model names, values are the
+            (pred_hash, gold_hash) their errors came from
+    """
+    if not exists(error_db):
+        return {}
+    with closing(connect_error_db(error_db)) as conn:
+        rows = conn.execute('SELECT model, pred_hash, gold_hash FROM '
+                'models').fetchall()
+
+    return {model: (pred_hash, gold_hash) for model, pred_hash, gold_hash
+            in rows}
+
+
+def save_errors(error_db, model, errors, pred_hash, gold_hash):
+    """
+    Replace the errors of one model in the error store.
+
+    parameters:
+        error_db, str: path to the SQLite database
+        model, str: model name, the basename of its prediction file
+        errors, list of tuple: records from get_error_record
+        pred_hash, str: hash_file of the prediction file
+        gold_hash, str: hash_file of the gold standard file
+
+    returns: None
+    """
+    with closing(connect_error_db(error_db)) as conn:
+        with conn:
+            conn.execute('DELETE FROM errors WHERE model = ?', (model,))
+            conn.executemany('INSERT INTO errors VALUES '
+                    f'({", ".join("?" for _ in ERROR_COLUMNS)})',
+                    [(model,) + record for record in errors])
+            conn.execute('INSERT OR REPLACE INTO models VALUES (?, ?, ?)',
+                    (model, pred_hash, gold_hash))
+
+
+def get_mp_context():
+    """
+    Get the multiprocessing context for worker pools. Fork is used where
+    available, so workers inherit large objects instead of copying them.
+    """
+    if 'fork' in mp.get_all_start_methods():
+        return mp.get_context('fork')
+    else:
+        return mp.get_context()
+
+
+# Gold standard index shared with pool workers, set by _init_worker
+_gold_index = None
+
+
+def _init_worker(gold_index):
+    """
+    Pool initializer. With the fork start method the index is inherited from
+    the parent rather than copied through a pipe.
+    """
+    global _gold_index
+    _gold_index = gold_index
+
+
+def _read_doc_counts_worker(args):
+    """
+    Unpacks arguments for read_doc_counts in a pool worker. Returns the error
+    records after the counts, or None if they weren't collected.
+    """
+    pred_file, metric_names, stream, collect_errors, backend = args
+    errors = [] if collect_errors else None
+    return read_doc_counts(pred_file, _gold_index, metric_names, stream,
+            errors, backend) + (errors,)
+
+
+def main(gold_standard, out_name, predictions, bootstrap, num_boot, workers=1,
+        stream=False, paired=False, seed=None, cache_file=None,
+        adaptive=False, boot_batch=50, boot_tol=0.005, counts_dir=None,
+        subset_keys=None, threshold_sweep=False, relaxed=False,
+        error_db=None, backend='columnar'):
+
+    # Read in the gold standard once for all models
+    verboseprint('\nReading in gold standard...')
+    gold_index = load_gold_standard(gold_standard)
+    metric_names = get_metric_names(gold_index, relaxed)
+
+    # Look for results from previous runs. Unseeded bootstraps aren't
+    # reproducible, so they aren't cached
+    rows = [None for _ in predictions]
+    use_cache = (cache_file is not None) and (seed is not None or
+            not bootstrap)
+    if use_cache or counts_dir is not None or error_db is not None:
+        gold_hash = hash_file(gold_standard)
+        pred_hashes = {model: hash_file(model) for model in predictions}
+    if use_cache:
+        verboseprint(f'\nChecking evaluation cache {cache_file}...')
+        cache = load_cache(cache_file)
+        extra_config = []
+        if adaptive:
+            extra_config += ['adaptive', boot_batch, boot_tol]
+        if subset_keys is not None:
+            extra_config += ['subset', sorted(subset_keys)]
+        cache_keys = [get_cache_key(pred_hashes[model], gold_hash,
+            metric_names, bootstrap, num_boot, seed, extra_config or None)
+            for model in predictions]
+        for i, (model, key) in enumerate(zip(predictions, cache_keys)):
+            if key in cache:
+                verboseprint(f'Using cached performance for {model}')
+                rows[i] = dict(cache[key], pred_file=basename(model),
+                        gold_std_file=basename(gold_standard))
+    elif cache_file is not None:
+        verboseprint('\nNot using the evaluation cache, because bootstrap '
+                'CIs are only cached when a seed is given.')
+
+    # Errors are only collected for models whose predictions or gold
+    # standard have changed since they were last saved
+    if error_db is not None:
+        error_models = load_error_models(error_db)
+        need_errors = [model for model in predictions
+                if error_models.get(basename(model)) !=
+                (pred_hashes[model], gold_hash)]
+    else:
+        need_errors = []
+
+    # Get per-document counts. The paired bootstrap needs the counts for
+    # every model, cached or not
+    to_count = [model for model, row in zip(predictions, rows)
+            if row is None or paired or model in need_errors]
+    file_counts = {}
+
+    # Reuse counts saved by previous runs
+    if counts_dir is not None:
+        counts_files = {model: join(counts_dir, f'{basename(model)}.counts.npz')
+                for model in predictions}
+        for model in to_count:
+            if not exists(counts_files[model]) or model in need_errors:
+                continue
+            stored = load_doc_counts(counts_files[model])
+            if (stored['pred_hash'] == pred_hashes[model]) and \
+                    (stored['gold_hash'] == gold_hash) and \
+                    (stored['metric_names'] == metric_names):
+                verboseprint(f'Using saved counts for {model}')
+                file_counts[model] = (stored['doc_keys'],
+                        stored['doc_counts'], stored['pred_rels'])
+
+    # This is where all the matching happens, so it's what gets parallelized
+    to_match = [model for model in to_count if model not in file_counts]
+    verboseprint(f'\nCounting matches for {len(to_match)} prediction '
+            'files...')
+    if workers > 1 and len(to_match) > 0:
+        verboseprint(f'\nEvaluating {len(to_match)} prediction files with '
+                f'{workers} workers...')
+        ctx = get_mp_context()
+        job_args = [(model, metric_names, stream, model in need_errors,
+            backend) for model in to_match]
+        with ctx.Pool(workers, initializer=_init_worker,
+                initargs=(gold_index,)) as pool:
+            # map keeps the results in the order of predictions
+            matched_counts = pool.map(_read_doc_counts_worker, job_args)
+    else:
+        matched_counts = []
+        for model in to_match:
+            verboseprint(f'\nEvaluating model predictions from file {model}...')
+            errors = [] if model in need_errors else None
+            matched_counts.append(read_doc_counts(model, gold_index,
+                metric_names, stream, errors, backend) + (errors,))
+    for model, (doc_keys, doc_counts, pred_rels, errors) in zip(to_match,
+            matched_counts):
+        file_counts[model] = (doc_keys, doc_counts, pred_rels)
+        if errors is not None:
+            verboseprint(f'Saving {len(errors)} errors for {model} to '
+                    f'{error_db}')
+            save_errors(error_db, basename(model), errors,
+                    pred_hashes[model], gold_hash)
+        if counts_dir is not None:
+            save_doc_counts(counts_files[model], doc_keys, doc_counts,
+                    pred_rels, metric_names, model, gold_standard,
+                    pred_hashes[model], gold_hash)
+
+    # Only score the requested documents
+    if subset_keys is not None:
+        verboseprint(f'\nScoring a subset of {len(subset_keys)} documents...')
+        for model, (doc_keys, doc_counts, pred_rels) in file_counts.items():
+            file_counts[model] = subset_doc_counts(doc_keys, doc_counts,
+                    subset_keys) + (pred_rels,)
+
+    # Calculate performance
+    verboseprint('\nCalculating performance...')
+    cols = get_columns(metric_names, bootstrap, threshold_sweep)
+    # Seeded bootstrap blocks are independent, so they can be drawn by the
+    # pool without changing the results
+    if bootstrap and seed is not None and workers > 1 and \
+            any(row is None for row in rows):
+        verboseprint(f'Drawing bootstrap samples with {workers} workers')
+        boot_pool = get_mp_context().Pool(workers)
+    else:
+        boot_pool = None
+    try:
+        for i, model in enumerate(predictions):
+            if rows[i] is not None:
+                continue
+            _, doc_counts, pred_rels = file_counts[model]
+            # Each file is bootstrapped from the seed, so its row doesn't
+            # depend on which other files are evaluated in the same run
+            rows[i] = score_performance(model, gold_standard, doc_counts,
+                pred_rels, metric_names, bootstrap, num_boot, adaptive,
+                boot_batch, boot_tol, seed, boot_pool)
+            if use_cache:
+                cache[cache_keys[i]] = rows[i]
+    finally:
+        if boot_pool is not None:
+            boot_pool.close()
+            boot_pool.join()
+    if use_cache:
+        save_cache(cache, cache_file)
+
+    # Sweep relation thresholds. Rows from the cache don't have the best
+    # threshold, so this is done for every file
+    if threshold_sweep:
+        verboseprint('\nSweeping relation softmax thresholds...')
+        sweep_dfs = []
+        for i, model in enumerate(predictions):
+            sweep = read_threshold_sweep(model, gold_index,
+                    subset_keys=subset_keys)
+            rows[i] = dict(rows[i], **get_best_threshold(sweep))
+            sweep_dfs.append(pd.DataFrame({'pred_file': basename(model),
+                'threshold': sweep['threshold'],
+                'rel_precision': sweep['precision'],
+                'rel_recall': sweep['recall'],
+                'rel_F1': sweep['F1']}))
+        sweep_name = f'{splitext(out_name)[0]}_threshold_sweep.csv'
+        verboseprint(f'Saving threshold sweeps as {sweep_name}')
+        pd.concat(sweep_dfs).to_csv(sweep_name, index=False)
+
+    # Make df
+    verboseprint('\nMaking dataframe...')
+    df = pd.DataFrame(
+        rows,
+        columns=cols)
+    verboseprint(f'Snapshot of dataframe:\n{df.head()}')
+
+    # Save
+    verboseprint(f'\nSaving file as {out_name}')
+    df.to_csv(out_name, index=False)
+
+    # Compare models
+    if paired:
+        verboseprint('\nComparing models with paired bootstrap...')
+        model_counts = {basename(model): file_counts[model]
+                for model in predictions}
+        paired_rows = paired_bootstrap(model_counts, metric_names, num_boot,
+                seed)
+        paired_name = f'{splitext(out_name)[0]}_paired.csv'
+        verboseprint(f'Saving paired comparisons as {paired_name}')
+        pd.DataFrame(paired_rows, columns=['model_a', 'model_b', 'metric',
+            'F1_a', 'F1_b', 'delta_F1', 'delta_F1_CI', 'p_value']).to_csv(
+                    paired_name, index=False)
+
+    verboseprint('\nDone!\n')
+
+
+if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='Calculate performance')
 
@@ -468,12 +2237,104 @@ if __name__ == "__main__":
         help='Number of bootstrap samples to use for calculating CI, '
         'default is 500',
         default=500)
+    parser.add_argument('--adaptive_boot', action='store_true',
+                        help='Draw bootstrap samples in batches and stop '
+                        'once the CIs converge. -num_boot is then the '
+                        'maximum number of samples. The number used is '
+                        'reported in the num_boot column.')
+    parser.add_argument(
+        '-boot_batch',
+        type=int,
+        help='Number of bootstrap samples per batch with --adaptive_boot, '
+        'default is 50',
+        default=50)
+    parser.add_argument(
+        '-boot_tol',
+        type=float,
+        help='With --adaptive_boot, stop when no CI bound changes by this '
+        'much or more between batches, default is 0.005',
+        default=0.005)
     parser.add_argument(
         '-use_prefix',
         type=str,
         help='If a prefix is provided, only calculates performance for '
         'files beginning with the prefix in the directory.',
         default='')
+    parser.add_argument(
+        '-workers',
+        type=int,
+        help='Number of processes to use to evaluate prediction files in '
+        'parallel, default is 1',
+        default=1)
+    parser.add_argument(
+        '-seed',
+        type=int,
+        help='Random seed for bootstrapping. Each prediction file is '
+        'bootstrapped from this seed, so results are reproducible and the '
+        'same for any number of -workers, which are then also used to draw '
+        'the bootstrap samples. Default is no seed.',
+        default=None)
+    parser.add_argument(
+        '-cache_file',
+        type=str,
+        help='Path to a JSON file of performance rows from previous runs. '
+        'Prediction files whose contents, gold standard and settings '
+        'match a previous run are not evaluated again. Bootstrapped rows '
+        'are only cached if -seed is given. Created if it does not exist.',
+        default=None)
+    parser.add_argument(
+        '-counts_dir',
+        type=str,
+        help='Directory to save the per-document match counts of each '
+        'prediction file in. Saved counts are used instead of matching again '
+        'if the prediction file and gold standard have not changed.',
+        default=None)
+    parser.add_argument(
+        '-subset',
+        type=str,
+        help='Path to a text file with one doc_key per line. Only these '
+        'documents are scored. Combine with -counts_dir to score subsets '
+        'without matching the predictions again.',
+        default=None)
+    parser.add_argument(
+        '-error_db',
+        type=str,
+        help='Path to a SQLite database to save every entity and relation '
+        'false positive and false negative in, for use with query_errors.py. '
+        'Created if it does not exist.',
+        default=None)
+    parser.add_argument(
+        '-backend',
+        type=str,
+        choices=['columnar', 'dict'],
+        help='How to match entity boundaries. columnar matches the spans of '
+        'all documents at once with array operations, dict matches them one '
+        'document at a time. Both give the same counts. dict is always used '
+        'for files whose errors are saved to -error_db. Default is columnar.',
+        default='columnar')
+    parser.add_argument('--stream', action='store_true',
+                        help='Read prediction files one document at a time '
+                        'instead of loading them into memory. Use for very '
+                        'large prediction files.')
+    parser.add_argument('--paired', action='store_true',
+                        help='Compare all pairs of models with a paired '
+                        'bootstrap using -num_boot samples. Results are saved '
+                        'next to out_name with the suffix _paired.csv.')
+    parser.add_argument('--relaxed', action='store_true',
+                        help='Also report ent_relaxed and rel_relaxed, '
+                        'where entities and relation arguments match if '
+                        'they overlap, as in relationIAA.')
+    parser.add_argument('--threshold_sweep', action='store_true',
+                        help='Sweep the softmax score threshold for relation '
+                        'predictions. The precision-recall curve of each '
+                        'model is saved next to out_name with the suffix '
+                        '_threshold_sweep.csv, and the threshold with the '
+                        'best F1 is added to the output.')
+    parser.add_argument('--use_dygie_f1', action='store_true',
+                        help='Use compute_f1 from dygiepp instead of the '
+                        'equivalent one in this script. Requires dygiepp to '
+                        'be developed in the environment, and is slower to '
+                        'start.')
     parser.add_argument('--verbose',
                         '-v',
                         action='store_true',
@@ -481,15 +2342,40 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    if args.num_boot < 1:
+        parser.error('-num_boot must be at least 1')
+    if args.boot_batch < 1:
+        parser.error('-boot_batch must be at least 1')
+
     args.gold_standard = abspath(args.gold_standard)
     args.out_name = abspath(args.out_name)
     args.prediction_dir = abspath(args.prediction_dir)
+    if args.cache_file is not None:
+        args.cache_file = abspath(args.cache_file)
+    if args.error_db is not None:
+        args.error_db = abspath(args.error_db)
+    if args.counts_dir is not None:
+        args.counts_dir = abspath(args.counts_dir)
+        makedirs(args.counts_dir, exist_ok=True)
+    if args.subset is not None:
+        with open(args.subset) as f:
+            subset_keys = [line.strip() for line in f if line.strip() != '']
+    else:
+        subset_keys = None
 
     verboseprint = print if args.verbose else lambda *a, **k: None
 
-    pred_files = [
+    if args.use_dygie_f1:
+        use_dygie_f1()
+
+    # Sort so that rows are in the same order on every run
+    pred_files = sorted([
         join(args.prediction_dir, f) for f in listdir(args.prediction_dir)
         if f.startswith(args.use_prefix)
-    ]
+    ])
 
-    main(args.gold_standard, args.out_name, pred_files, args.bootstrap, args.num_boot)
+    main(args.gold_standard, args.out_name, pred_files, args.bootstrap,
+            args.num_boot, args.workers, args.stream, args.paired, args.seed,
+            args.cache_file, args.adaptive_boot, args.boot_batch,
+            args.boot_tol, args.counts_dir, subset_keys,
+            args.threshold_sweep, args.relaxed, args.error_db, args.backend)
@@ -29,14 +29,17 @@ class ModelNotFoundError(Exception):
     pass
 
 
-def evaluate_models(top_dir, gold_standard, out_prefix):
+def evaluate_models(top_dir, gold_standard, out_prefix, seed=1234):
     """
-    Runs the model evaluation script on model output.
+    Runs the model evaluation script on model output. Results are cached in
+    the performance directory, so prediction files that were already
+    evaluated in a previous run aren't evaluated again.
 
     parameters:
         top_dir, str: path to top level output dir
         gold_standard, str: path to gold standard
         out_prefix, str: only evaluates files with this prefix
+        seed, int: random seed for bootstrapping, needed for caching
 
     returns: None
     """
@@ -45,7 +48,8 @@ def evaluate_models(top_dir, gold_standard, out_prefix):
         "python",
         abspath("../evaluate_model_output.py"), gold_standard, save_name,
         f'{top_dir}/model_predictions/', '--bootstrap',
-        '-use_prefix', out_prefix
+        '-use_prefix', out_prefix, '-seed', str(seed),
+        '-cache_file', f'{top_dir}/performance/.eval_cache.json'
     ]
     subprocess.run(evaluate)
 
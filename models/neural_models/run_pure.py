@@ -51,14 +51,17 @@ class ModelNotFoundError(Exception):
     pass
 
 
-def evaluate_models(top_dir, gold_std_path, out_prefix):
+def evaluate_models(top_dir, gold_std_path, out_prefix, seed=1234):
     """
-    Runs the model evaluation script on model output.
+    Runs the model evaluation script on model output. Results are cached in
+    the performance directory, so prediction files that were already
+    evaluated in a previous run aren't evaluated again.
 
     parameters:
         top_dir, str: path to top level output dir
         gold_std_path, str: path to gold standard annotations
         out_prefix, str: only evaluates files with this prefix
+        seed, int: random seed for bootstrapping, needed for caching
 
     returns: None
     """
@@ -77,7 +80,8 @@ def evaluate_models(top_dir, gold_std_path, out_prefix):
         "python",
         abspath("../evaluate_model_output.py"), gold_std_path, save_name,
         f'{top_dir}/model_predictions/', '-use_prefix', out_prefix,
-        '--bootstrap'
+        '--bootstrap', '-seed', str(seed),
+        '-cache_file', f'{top_dir}/performance/.eval_cache.json'
     ]
     subprocess.run(evaluate)
 
@@ -0,0 +1,158 @@
+"""
+Query the false positives and false negatives saved by evaluate_model_output.py
+with -error_db.
+
+Examples:
+    Top 50 false negative entity strings for models with scierc in the name:
+        python query_errors.py errors.db -model scierc -type ent -error fn \
+            -group_by text -top 50
+    False positive relations by type:
+        python query_errors.py errors.db -type rel -error fp -group_by label
+
+Author: Serena G. Lotreck
+"""
+import argparse
+from contextlib import closing
+from os.path import abspath, exists
+from pathlib import Path
+import sqlite3
+
+import pandas as pd
+
+GROUP_COLUMNS = ['model', 'doc_key', 'type', 'error', 'label', 'text']
+
+
+def build_query(model=None, error_type=None, error=None, label=None,
+        group_by=None, top=50):
+    """
+    Build the SQL query for a set of filters. Filters that are None aren't
+    applied.
+
+    parameters:
+        model, str: only use models whose name contains this string
+        error_type, str: "ent" or "rel"
+        error, str: "fp" or "fn"
+        label, str: only use errors with this entity or relation type
+        group_by, list of str: columns to count errors by, from GROUP_COLUMNS.
+            If None, the errors themselves are returned, highest score first
+        top, int: maximum number of rows to return
+
+    returns:
+        query, str: SQL query
+        params, list: values for the placeholders in query
+    """
+    conditions = []
+    params = []
+    if model is not None:
+        conditions.append('model LIKE ?')
+        params.append(f'%{model}%')
+    for col, value in [('type', error_type), ('error', error),
+            ('label', label)]:
+        if value is not None:
+            conditions.append(f'{col} = ?')
+            params.append(value)
+    where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+
+    if group_by:
+        for col in group_by:
+            if col not in GROUP_COLUMNS:
+                raise ValueError(f'Can\'t group by {col}, options are '
+                        f'{GROUP_COLUMNS}')
+        cols = ', '.join(group_by)
+        query = (f'SELECT {cols}, COUNT(*) AS count FROM errors{where} '
+                f'GROUP BY {cols} ORDER BY count DESC, {cols} LIMIT ?')
+    else:
+        query = (f'SELECT * FROM errors{where} ORDER BY score DESC, model, '
+                'doc_key, sent, start LIMIT ?')
+    params.append(top)
+
+    return query, params
+
+
+def query_errors(error_db, model=None, error_type=None, error=None,
+        label=None, group_by=None, top=50):
+    """
+    Query the error store. The database is opened read-only, so a wrong
+    path raises an error instead of creating an empty database.
+
+    parameters:
+        error_db, str: path to the SQLite database from evaluate_model_output
+        Other parameters are the same as for build_query.
+
+    returns:
+        df, pandas df: query results
+    """
+    if not exists(error_db):
+        raise FileNotFoundError(f'Error database {error_db} does not exist, '
+                'make it with the -error_db argument of '
+                'evaluate_model_output.py')
+    query, params = build_query(model, error_type, error, label, group_by,
+            top)
+    db_uri = f'{Path(abspath(error_db)).as_uri()}?mode=ro'
+    with closing(sqlite3.connect(db_uri, uri=True)) as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+
+    return df
+
+
+def main(error_db, model, error_type, error, label, group_by, top, out_csv):
+
+    df = query_errors(error_db, model, error_type, error, label, group_by,
+            top)
+
+    if out_csv is not None:
+        df.to_csv(out_csv, index=False)
+    else:
+        print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Query saved errors')
+
+    parser.add_argument('error_db',
+                        type=str,
+                        help='Path to the database from the -error_db '
+                        'argument of evaluate_model_output.py')
+    parser.add_argument('-model',
+                        type=str,
+                        help='Only use models whose name contains this string',
+                        default=None)
+    parser.add_argument('-type',
+                        type=str,
+                        choices=['ent', 'rel'],
+                        help='Only use entity or relation errors',
+                        default=None)
+    parser.add_argument('-error',
+                        type=str,
+                        choices=['fp', 'fn'],
+                        help='Only use false positives or false negatives',
+                        default=None)
+    parser.add_argument('-label',
+                        type=str,
+                        help='Only use errors with this entity or relation '
+                        'type',
+                        default=None)
+    parser.add_argument('-group_by',
+                        nargs='+',
+                        choices=GROUP_COLUMNS,
+                        help='Count errors by these columns instead of '
+                        'listing them',
+                        default=None)
+    parser.add_argument('-top',
+                        type=int,
+                        help='Maximum number of rows to show, default is 50',
+                        default=50)
+    parser.add_argument('-out_csv',
+                        type=str,
+                        help='Save results to this file instead of printing',
+                        default=None)
+
+    args = parser.parse_args()
+
+    args.error_db = abspath(args.error_db)
+    if args.out_csv is not None:
+        args.out_csv = abspath(args.out_csv)
+
+    main(args.error_db, args.model, args.type, args.error, args.label,
+            args.group_by, args.top, args.out_csv)
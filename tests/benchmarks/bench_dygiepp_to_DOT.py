@@ -0,0 +1,83 @@
+"""
+Benchmarks for dygiepp_to_DOT.py on synthetic predictions: writing DOT files
+with the native and pygraphviz backends, and counting triples in a prediction
+file with different numbers of workers. The number of edges written or docs
+counted per second is saved in the extra_info of each benchmark.
+
+Not collected with the unit tests. To run from the tests directory:
+    python -m pytest benchmarks/bench_dygiepp_to_DOT.py
+
+Set BENCH_NUM_DOCS to a comma-separated list of document counts to change the
+scale, e.g. BENCH_NUM_DOCS=1000,100000.
+
+Author: Serena G. Lotreck
+"""
+import sys
+import os
+
+import jsonlines
+import pytest
+
+sys.path.append('../graph_formatting/')
+
+import dygiepp_to_DOT as dd
+from synthetic_dygiepp import generate_docs
+
+NUM_DOCS = [int(n) for n in os.environ.get('BENCH_NUM_DOCS',
+    '1000').split(',')]
+
+
+@pytest.fixture(scope='module', params=NUM_DOCS, ids=lambda n: f'{n}docs')
+def triple_counts(request):
+    """
+    Count the triples and loose entities in synthetic predictions. The token
+    strings are all distinct, so almost every triple is its own edge.
+    """
+    preds = (pred_doc for _, pred_doc in generate_docs(request.param))
+    return dd.build_triple_counts(preds)
+
+
+@pytest.mark.parametrize('backend', ['native', 'pygraphviz'])
+def test_write_dot_weights(benchmark, triple_counts, tmp_path, backend):
+    if backend == 'pygraphviz' and dd.pgv is None:
+        pytest.skip('pygraphviz is not installed')
+    triple_weights, loose_ents = triple_counts
+    benchmark(dd.write_dot_weights, triple_weights, loose_ents, 'bench',
+            str(tmp_path), backend)
+    # There are no timings to use with --benchmark-disable
+    if benchmark.enabled:
+        benchmark.extra_info['edges_per_sec'] = (len(triple_weights)/
+                benchmark.stats.stats.mean)
+
+    assert os.path.exists(tmp_path / 'bench.gv')
+
+
+@pytest.fixture(scope='module', params=NUM_DOCS, ids=lambda n: f'{n}docs')
+def pred_file(request, tmp_path_factory):
+    """
+    Write synthetic predictions to a file.
+    """
+    pred_file = tmp_path_factory.mktemp('preds') / 'preds.jsonl'
+    with jsonlines.open(pred_file, 'w') as writer:
+        writer.write_all(pred_doc for _, pred_doc in
+                generate_docs(request.param))
+    return str(pred_file), request.param
+
+
+@pytest.mark.parametrize('workers', [1, 2, 4])
+def test_count_triples(benchmark, pred_file, workers):
+    pred_file, num_docs = pred_file
+
+    def count_triples():
+        doc_stats = {'total': 0, 'failed': 0, 'skipped': 0}
+        if workers == 1:
+            return dd.build_triple_counts(dd.read_preds(pred_file, doc_stats))
+        return dd.build_triple_counts_parallel([pred_file], workers,
+                doc_stats)
+
+    triple_weights, _ = benchmark(count_triples)
+    if benchmark.enabled:
+        benchmark.extra_info['docs_per_sec'] = (num_docs/
+                benchmark.stats.stats.mean)
+
+    assert len(triple_weights) > 0
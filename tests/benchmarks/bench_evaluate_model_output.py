@@ -0,0 +1,131 @@
+"""
+Benchmarks for the hot paths of evaluate_model_output.py, using pytest-benchmark
+and synthetic data from synthetic_dygiepp.py. Wall time is measured by
+pytest-benchmark, and the peak memory of one extra run is measured with
+tracemalloc and saved in the extra_info of each benchmark.
+
+Not collected with the unit tests. To run from the tests directory:
+    python -m pytest benchmarks/bench_evaluate_model_output.py
+
+Set BENCH_NUM_DOCS to a comma-separated list of document counts to change the
+scale, e.g. BENCH_NUM_DOCS=1000,100000. Use --benchmark-save and
+--benchmark-compare to catch regressions between commits.
+
+Author: Serena G. Lotreck
+"""
+import sys
+import os
+from os.path import join
+import tracemalloc
+import warnings
+
+import jsonlines
+import pytest
+
+sys.path.append('../models/')
+
+import evaluate_model_output as emo
+from synthetic_dygiepp import write_pair
+
+NUM_DOCS = [int(n) for n in os.environ.get('BENCH_NUM_DOCS',
+    '1000').split(',')]
+NUM_BOOT = int(os.environ.get('BENCH_NUM_BOOT', '500'))
+
+
+@pytest.fixture(scope='module', params=NUM_DOCS, ids=lambda n: f'{n}docs')
+def synthetic_files(request, tmp_path_factory):
+    """
+    Write a synthetic gold standard and prediction file for each scale.
+    """
+    out_dir = tmp_path_factory.mktemp(f'synthetic_{request.param}')
+    return write_pair(str(out_dir), request.param)
+
+
+@pytest.fixture(scope='module')
+def synthetic_dicts(synthetic_files):
+    """
+    Read the synthetic files into lists of dicts.
+    """
+    dicts = []
+    for fname in synthetic_files:
+        with jsonlines.open(fname) as reader:
+            dicts.append([obj for obj in reader])
+    return dicts
+
+
+@pytest.fixture(autouse=True)
+def ignore_dup_warnings():
+    """
+    The synthetic predictions have exact duplicates on purpose.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        yield
+
+
+def run_benchmark(benchmark, func, *args, **kwargs):
+    """
+    Time func with pytest-benchmark, then run it once more under tracemalloc
+    to record its peak memory.
+    """
+    result = benchmark(func, *args, **kwargs)
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    benchmark.extra_info['peak_mb'] = peak / 2**20
+
+    return result
+
+
+@pytest.fixture(scope='module')
+def gold_metrics(synthetic_files):
+    """
+    Index the synthetic gold standard and get its metric names, as main does.
+    """
+    gold_index = emo.load_gold_standard(synthetic_files[0])
+    return gold_index, emo.get_metric_names(gold_index)
+
+
+@pytest.mark.parametrize('backend', ['columnar', 'dict'])
+def test_stream_doc_counts(benchmark, synthetic_dicts, gold_metrics, backend):
+    _, pred_dicts = synthetic_dicts
+    gold_index, metric_names = gold_metrics
+    doc_keys, doc_counts, _ = run_benchmark(benchmark, emo.stream_doc_counts,
+            pred_dicts, gold_index, metric_names, backend=backend)
+
+    assert doc_counts.shape == (len(doc_keys), len(metric_names), 3)
+
+
+@pytest.mark.parametrize('stream', [False, True],
+        ids=['load', 'stream'])
+def test_read_doc_counts(benchmark, synthetic_files, gold_metrics, stream):
+    gold_index, metric_names = gold_metrics
+    doc_keys, _, _ = run_benchmark(benchmark, emo.read_doc_counts,
+            synthetic_files[1], gold_index, metric_names, stream)
+
+    assert len(doc_keys) > 0
+
+
+@pytest.mark.parametrize('seed', [None, 0], ids=['unseeded', 'seeded'])
+def test_score_performance(benchmark, synthetic_files, gold_metrics, seed):
+    gold_file, pred_file = synthetic_files
+    gold_index, metric_names = gold_metrics
+    _, doc_counts, pred_rels = emo.read_doc_counts(pred_file, gold_index,
+            metric_names)
+    row = run_benchmark(benchmark, emo.score_performance, pred_file,
+            gold_file, doc_counts, pred_rels, metric_names, True, NUM_BOOT,
+            seed=seed)
+
+    assert row['num_boot'] == NUM_BOOT
+
+
+@pytest.mark.parametrize('bootstrap', [False, True],
+        ids=['no_boot', 'boot'])
+def test_main(benchmark, synthetic_files, tmp_path, bootstrap):
+    gold_file, pred_file = synthetic_files
+    out_name = join(str(tmp_path), 'out.csv')
+    run_benchmark(benchmark, emo.main, gold_file, out_name, [pred_file],
+            bootstrap, NUM_BOOT, seed=0)
+
+    assert os.path.exists(out_name)
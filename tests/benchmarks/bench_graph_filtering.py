@@ -0,0 +1,72 @@
+"""
+Benchmarks for the filters in graph_filtering.py and the component index on
+random graphs made directly as GraphStore instances.
+
+Not collected with the unit tests. To run from the tests directory:
+    python -m pytest benchmarks/bench_graph_filtering.py
+
+Set BENCH_NUM_EDGES to a comma-separated list of edge counts to change the
+scale, e.g. BENCH_NUM_EDGES=100000,10000000. Graphs have half as many nodes
+as edges.
+
+Author: Serena G. Lotreck
+"""
+import sys
+import os
+
+import numpy as np
+import pytest
+
+sys.path.append('../graph_formatting/')
+
+import graph_filtering as gf
+from graph_store import GraphStore, build_component_index
+
+NUM_EDGES = [int(n) for n in os.environ.get('BENCH_NUM_EDGES',
+    '1000000').split(',')]
+KEYWORDS = ['node0', 'node1', 'node2']
+
+
+@pytest.fixture(scope='module', params=NUM_EDGES, ids=lambda n: f'{n}edges')
+def random_graph(request):
+    """
+    Make a random graph with four relation types and weights from 1 to 5.
+    """
+    rng = np.random.default_rng(0)
+    num_edges = request.param
+    num_nodes = num_edges//2
+    return GraphStore([f'node{i}' for i in range(num_nodes)],
+            rng.integers(num_nodes, size=num_edges),
+            rng.integers(num_nodes, size=num_edges),
+            rng.integers(4, size=num_edges), ['A', 'B', 'C', 'D'],
+            rng.integers(1, 6, size=num_edges), 'random')
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'max_hops': 3},
+    {'min_weight': 3, 'relations': ['A', 'B']}],
+    ids=['all', 'max_hops', 'edge_filters'])
+def test_keyword_cluster_filter(benchmark, random_graph, kwargs):
+    filtered = benchmark(gf.keyword_cluster_filter, random_graph, KEYWORDS,
+            **kwargs)
+
+    assert set(KEYWORDS) <= set(filtered.nodes)
+
+
+def test_keyword_direct_filter(benchmark, random_graph):
+    filtered = benchmark(gf.keyword_direct_filter, random_graph, KEYWORDS)
+
+    assert set(KEYWORDS) <= set(filtered.nodes)
+
+
+def test_build_component_index(benchmark, random_graph):
+    index = benchmark(build_component_index, random_graph)
+
+    assert len(index['node_component']) == random_graph.num_nodes
+
+
+def test_keyword_cluster_filter_component_index(benchmark, random_graph):
+    index = build_component_index(random_graph)
+    filtered = benchmark(gf.keyword_cluster_filter, random_graph, KEYWORDS,
+            component_index=index)
+
+    assert set(KEYWORDS) <= set(filtered.nodes)
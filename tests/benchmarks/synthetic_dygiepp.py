@@ -0,0 +1,207 @@
+"""
+Generate synthetic DyGIE++ gold standard and prediction files for
+benchmarking evaluate_model_output.py at any scale.
+
+Predictions are made from the gold standard by dropping some annotations
+(false negatives), moving some entity boundaries and adding spurious
+relations (false positives), and duplicating some relations exactly, as some
+models do. All entities and relations in the predictions have logit and
+softmax scores.
+
+Author: Serena G. Lotreck
+"""
+import argparse
+from os.path import abspath, join
+import copy
+
+import jsonlines
+import numpy as np
+
+
+def make_gold_doc(doc_key, rng, sents_per_doc, tokens_per_sent,
+        ents_per_sent, rels_per_sent, ent_types, rel_types):
+    """
+    Make one gold standard document.
+
+    parameters:
+        doc_key, str: doc ID
+        rng, numpy Generator: random number generator
+        sents_per_doc, int: number of sentences
+        tokens_per_sent, int: number of tokens per sentence
+        ents_per_sent, float: mean number of entities per sentence
+        rels_per_sent, float: mean number of relations per sentence
+        ent_types, list of str: entity types to choose from
+        rel_types, list of str: relation types to choose from
+
+    returns:
+        doc, dict: dygiepp formatted gold standard document
+    """
+    doc = {'doc_key': doc_key, 'sentences': [], 'ner': [], 'relations': []}
+    for sent_idx in range(sents_per_doc):
+        offset = sent_idx*tokens_per_sent
+        doc['sentences'].append([f'tok{offset + i}'
+            for i in range(tokens_per_sent)])
+
+        # Entities are non-overlapping spans of up to 3 tokens
+        num_ents = min(rng.poisson(ents_per_sent), tokens_per_sent // 3)
+        starts = np.sort(rng.choice(tokens_per_sent // 3, size=num_ents,
+            replace=False))*3
+        ents = [[int(offset + start),
+            int(offset + start + rng.integers(3)),
+            str(rng.choice(ent_types))] for start in starts]
+        doc['ner'].append(ents)
+
+        rels = []
+        if len(ents) > 1:
+            num_rels = rng.poisson(rels_per_sent)
+            for _ in range(num_rels):
+                head, tail = rng.choice(len(ents), size=2, replace=False)
+                rels.append(ents[head][:2] + ents[tail][:2] +
+                        [str(rng.choice(rel_types))])
+        doc['relations'].append(rels)
+
+    return doc
+
+
+def make_pred_doc(gold_doc, rng, drop_rate, shift_rate, spurious_rate,
+        dup_rate):
+    """
+    Make a prediction document from a gold standard document.
+
+    parameters:
+        gold_doc, dict: output of make_gold_doc
+        rng, numpy Generator: random number generator
+        drop_rate, float: fraction of gold entities and relations to drop
+        shift_rate, float: fraction of entities whose end is moved by one
+        spurious_rate, float: spurious relations per gold relation
+        dup_rate, float: fraction of relations that are duplicated exactly
+
+    returns:
+        doc, dict: dygiepp formatted prediction document
+    """
+    doc = {'doc_key': gold_doc['doc_key'],
+            'sentences': copy.deepcopy(gold_doc['sentences']),
+            'predicted_ner': [], 'predicted_relations': []}
+    for ents, rels in zip(gold_doc['ner'], gold_doc['relations']):
+        pred_ents = []
+        for ent in ents:
+            if rng.random() < drop_rate:
+                continue
+            end = ent[1] + 1 if rng.random() < shift_rate else ent[1]
+            logit = float(rng.normal(2, 1))
+            pred_ents.append([ent[0], end, ent[2], logit,
+                float(1/(1 + np.exp(-logit)))])
+        doc['predicted_ner'].append(pred_ents)
+
+        pred_rels = []
+        for rel in rels:
+            if rng.random() < drop_rate:
+                continue
+            logit = float(rng.normal(1, 1))
+            pred_rels.append(rel[:5] + [logit, float(1/(1 + np.exp(-logit)))])
+        # Only sentences with gold relations have more than one entity
+        for _ in range(rng.poisson(spurious_rate*len(rels))):
+            head, tail = rng.choice(len(ents), size=2, replace=False)
+            label = rels[rng.integers(len(rels))][4]
+            logit = float(rng.normal(-1, 1))
+            pred_rels.append(ents[head][:2] + ents[tail][:2] + [label, logit,
+                float(1/(1 + np.exp(-logit)))])
+        pred_rels += [list(rel) for rel in pred_rels
+                if rng.random() < dup_rate]
+        doc['predicted_relations'].append(pred_rels)
+
+    return doc
+
+
+def generate_docs(num_docs, seed=0, sents_per_doc=8, tokens_per_sent=30,
+        ents_per_sent=4, rels_per_sent=2, drop_rate=0.2, shift_rate=0.1,
+        spurious_rate=0.5, dup_rate=0.02, num_ent_types=5, num_rel_types=4):
+    """
+    Generate pairs of gold standard and prediction documents.
+
+    parameters:
+        num_docs, int: number of documents
+        seed, int: random seed
+        Other parameters are passed to make_gold_doc and make_pred_doc.
+
+    yields:
+        gold_doc, dict: gold standard document
+        pred_doc, dict: prediction document
+    """
+    rng = np.random.default_rng(seed)
+    ent_types = [f'ENT{i}' for i in range(num_ent_types)]
+    rel_types = [f'REL{i}' for i in range(num_rel_types)]
+    for i in range(num_docs):
+        gold_doc = make_gold_doc(f'doc{i}', rng, sents_per_doc,
+                tokens_per_sent, ents_per_sent, rels_per_sent, ent_types,
+                rel_types)
+        yield gold_doc, make_pred_doc(gold_doc, rng, drop_rate, shift_rate,
+                spurious_rate, dup_rate)
+
+
+def write_pair(out_dir, num_docs, prefix='synthetic', **kwargs):
+    """
+    Write a gold standard and prediction file, one document at a time.
+
+    parameters:
+        out_dir, str: directory to write to
+        num_docs, int: number of documents
+        prefix, str: prefix for the file names
+        kwargs: passed to generate_docs
+
+    returns:
+        gold_file, str: path to the gold standard file
+        pred_file, str: path to the prediction file
+    """
+    gold_file = join(out_dir, f'{prefix}_gold.jsonl')
+    pred_file = join(out_dir, f'{prefix}_preds.jsonl')
+    with jsonlines.open(gold_file, 'w') as gold_writer, \
+            jsonlines.open(pred_file, 'w') as pred_writer:
+        for gold_doc, pred_doc in generate_docs(num_docs, **kwargs):
+            gold_writer.write(gold_doc)
+            pred_writer.write(pred_doc)
+
+    return gold_file, pred_file
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Generate synthetic data')
+
+    parser.add_argument('out_dir',
+                        type=str,
+                        help='Directory to save the files')
+    parser.add_argument('-num_docs',
+                        type=int,
+                        help='Number of documents, default is 1000',
+                        default=1000)
+    parser.add_argument('-prefix',
+                        type=str,
+                        help='Prefix for the file names, default is '
+                        'synthetic',
+                        default='synthetic')
+    parser.add_argument('-seed',
+                        type=int,
+                        help='Random seed, default is 0',
+                        default=0)
+    parser.add_argument('-ents_per_sent',
+                        type=float,
+                        help='Mean entities per sentence, default is 4',
+                        default=4)
+    parser.add_argument('-rels_per_sent',
+                        type=float,
+                        help='Mean relations per sentence, default is 2',
+                        default=2)
+    parser.add_argument('-dup_rate',
+                        type=float,
+                        help='Fraction of predicted relations that are '
+                        'duplicated exactly, default is 0.02',
+                        default=0.02)
+
+    args = parser.parse_args()
+
+    args.out_dir = abspath(args.out_dir)
+
+    write_pair(args.out_dir, args.num_docs, args.prefix, seed=args.seed,
+            ents_per_sent=args.ents_per_sent,
+            rels_per_sent=args.rels_per_sent, dup_rate=args.dup_rate)
@@ -0,0 +1,112 @@
+"""
+Unit tests for canonicalize.py
+
+Author: Serena G. Lotreck
+"""
+import unittest
+import shutil, tempfile
+import os
+import json
+
+import sys
+
+sys.path.append('../graph_formatting')
+import canonicalize as cn
+
+
+class TestNormalizeEnt(unittest.TestCase):
+    """
+    Test normalize_ent
+    """
+    def test_normalize_ent_case_whitespace(self):
+        """
+        Test that case and whitespace are normalized
+        """
+        self.assertEqual(cn.normalize_ent("Abscisic  Acid "), "abscisic acid")
+
+    def test_normalize_ent_punctuation(self):
+        """
+        Test that punctuation is replaced and unicode forms are unified
+        """
+        self.assertEqual(cn.normalize_ent("abscisic-acid ( ABA )"),
+                         "abscisic acid aba")
+        self.assertEqual(cn.normalize_ent("ＡＢＡ"), "aba")
+        self.assertEqual(cn.normalize_ent("Straße"), "strasse")
+
+    def test_normalize_ent_only_punctuation(self):
+        """
+        Test that a name that's only punctuation isn't emptied
+        """
+        self.assertEqual(cn.normalize_ent(" ( ) "), "( )")
+
+
+class TestEntityCanonicalizer(unittest.TestCase):
+    """
+    Test load_synonyms and the EntityCanonicalizer class
+    """
+    def setUp(self):
+        """
+        Set up a synonym table where one alias is in two groups
+        """
+        self.test_dir = os.path.abspath(tempfile.mkdtemp())
+        self.synonym_file = f'{self.test_dir}/synonyms.json'
+        with open(self.synonym_file, 'w') as myfile:
+            json.dump([["abscisic acid", "ABA", "Dormin"],
+                       ["jasmonic acid", "JA"], [],
+                       ["Abscisic Aldehyde", "ABA"]], myfile)
+
+    def tearDown(self):
+        """
+        Delete directory and files used for testing
+        """
+        shutil.rmtree(self.test_dir)
+
+    def test_load_synonyms(self):
+        """
+        Test that groups sharing an alias are merged under the canonical name
+        of the first group
+        """
+        self.assertEqual(cn.load_synonyms(self.synonym_file),
+                         {"abscisic acid": "abscisic acid",
+                          "aba": "abscisic acid", "dormin": "abscisic acid",
+                          "jasmonic acid": "jasmonic acid",
+                          "ja": "jasmonic acid",
+                          "abscisic aldehyde": "abscisic acid"})
+
+    def test_load_synonyms_chained(self):
+        """
+        Test that chains of groups resolve to one canonical name, whatever
+        order they're merged in
+        """
+        synonym_file = f'{self.test_dir}/chained.json'
+        with open(synonym_file, 'w') as myfile:
+            json.dump([["ABA1", "ZEP"], ["ZEP", "zeaxanthin epoxidase"],
+                       ["NPQ2", "AtZEP"], ["AtZEP", "zeaxanthin epoxidase"]],
+                      myfile)
+        synonyms = cn.load_synonyms(synonym_file)
+        canon = cn.EntityCanonicalizer(synonyms)
+
+        self.assertEqual(set(synonyms.values()), {"aba1"})
+        self.assertEqual({canon(name) for name in ["NPQ2", "zep",
+                          "Zeaxanthin Epoxidase", "AtZEP"]}, {"aba1"})
+        self.assertEqual(len(canon), 1)
+
+    def test_intern(self):
+        """
+        Test that surface forms of the same entity get the same ID
+        """
+        canon = cn.EntityCanonicalizer(cn.load_synonyms(self.synonym_file))
+        ents = ["ABA", "Abscisic Acid", "jasmonic-acid", "abscisic acid",
+                "JA", "auxin"]
+
+        self.assertEqual([canon.intern(ent) for ent in ents],
+                         [0, 0, 1, 0, 1, 2])
+        self.assertEqual(canon.names, ["abscisic acid", "jasmonic acid",
+                                       "auxin"])
+        self.assertEqual(canon("DORMIN"), "abscisic acid")
+        self.assertEqual(len(canon), 3)
+        self.assertEqual(len(canon.ids), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
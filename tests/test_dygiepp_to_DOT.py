@@ -9,8 +9,12 @@ import os
 
 import sys
 
+import json
+import jsonlines
+
 sys.path.append('../graph_formatting')
 import dygiepp_to_DOT as dd
+from canonicalize import EntityCanonicalizer
 
 
 class TestGetTokenizedDoc(unittest.TestCase):
@@ -235,6 +239,356 @@ class TestGetLooseEnts(unittest.TestCase):
         self.assertEqual(test_result, self.right_answer)
 
 
+class TestBuildTripleCounts(unittest.TestCase):
+    """
+    Test build_triple_counts()
+    """
+    def setUp(self):
+        """
+        Set up docs where an entity is loose in one doc and in a triple in
+        another
+        """
+        self.doc1 = {
+            "doc_key": "PMID1_abstract",
+            "dataset": "scierc",
+            "sentences": [['hello', "world", "!"],
+                          ["I", "like", "you", "world", "."]],
+            "predicted_ner": [[[0, 0, "TYPE", 0.1, 0.5],
+                               [1, 1, "TYPE", 0.1, 0.5]],
+                              [[4, 4, "TYPE", 0.345, 1.345],
+                               [5, 5, "TYPE2", 0.43, 1.34]]],
+            "predicted_relations": [[[0, 0, 1, 1, "TO_THE", 0.1, 0.5]], []]
+        }
+        self.doc2 = {
+            "doc_key": "PMID2_abstract",
+            "dataset": "scierc",
+            "sentences": [['hello', "world", "!"], ["you", "like", "me"]],
+            "predicted_ner": [[[0, 0, "TYPE", 0.1, 0.5],
+                               [1, 1, "TYPE", 0.1, 0.5]],
+                              [[3, 3, "TYPE", 0.1, 0.5]]],
+            "predicted_relations": [[[0, 0, 1, 1, "TO_THE", 0.1, 0.5]],
+                                    [[3, 3, 1, 1, "LIKE", 0.1, 0.5]]]
+        }
+
+    def test_build_triple_counts_weights(self):
+        """
+        Test that triples are counted over all docs
+        """
+        triple_weights, _ = dd.build_triple_counts([self.doc1, self.doc2])
+
+        self.assertEqual(dict(triple_weights), {
+            ("hello", "TO_THE", "world"): 2,
+            ("you", "LIKE", "world"): 1})
+
+    def test_build_triple_counts_same_as_separate(self):
+        """
+        Test that the results match get_triples and get_loose_ents
+        """
+        preds = [self.doc1, self.doc2]
+        triple_weights, loose_ents = dd.build_triple_counts(iter(preds))
+        triples = dd.get_triples(preds)
+        separate_ents = dd.get_loose_ents(preds, triples)
+
+        self.assertEqual(list(triple_weights.elements()), triples)
+        self.assertEqual(loose_ents, list(dict.fromkeys(separate_ents)))
+        self.assertEqual(loose_ents, ["like"])
+
+    def test_build_triple_counts_canonicalize(self):
+        """
+        Test that spellings and synonyms of an entity are counted together
+        """
+        doc3 = {
+            "doc_key": "PMID3_abstract",
+            "sentences": [["Hello", "WORLD", "-", "!"], ["Like", "Me"]],
+            "predicted_ner": [[[0, 0, "TYPE", 0.1, 0.5],
+                               [1, 2, "TYPE", 0.1, 0.5]],
+                              [[4, 4, "TYPE", 0.1, 0.5],
+                               [5, 5, "TYPE", 0.1, 0.5]]],
+            "predicted_relations": [[[0, 0, 1, 2, "TO_THE", 0.1, 0.5]], []]
+        }
+        canon = EntityCanonicalizer({"me": "you"})
+        triple_weights, loose_ents = dd.build_triple_counts(
+            [self.doc1, self.doc2, doc3], canon=canon)
+
+        self.assertEqual(dict(triple_weights), {
+            ("hello", "TO_THE", "world"): 3,
+            ("you", "LIKE", "world"): 1})
+        self.assertEqual(loose_ents, ["like"])
+        self.assertEqual(canon.names, ["hello", "world", "like", "you"])
+
+
+class TestCollapseTriples(unittest.TestCase):
+    """
+    Test collapse_triples()
+    """
+    def test_collapse_triples(self):
+        """
+        Test that the last relation for a pair is kept in the first place
+        """
+        triple_weights = {("a", "R1", "b"): 3, ("c", "R1", "b"): 1,
+                          ("a", "R2", "b"): 2, ("b", "R1", "a"): 1}
+
+        collapsed = dd.collapse_triples(triple_weights)
+
+        self.assertEqual(list(collapsed.items()),
+                         [(("a", "R2", "b"), 2), (("c", "R1", "b"), 1),
+                          (("b", "R1", "a"), 1)])
+
+
+class TestCanonId(unittest.TestCase):
+    """
+    Test canon_id()
+    """
+    def test_canon_id_plain(self):
+        """
+        Test that identifiers and numbers aren't quoted
+        """
+        for name in ['hello', 'my_graph', '3', '-3.5', '.5', 'caf\u00e9']:
+            self.assertEqual(dd.canon_id(name), name)
+
+    def test_canon_id_quoted(self):
+        """
+        Test that other strings and keywords are quoted
+        """
+        self.assertEqual(dd.canon_id('you world'), '"you world"')
+        self.assertEqual(dd.canon_id('3a'), '"3a"')
+        self.assertEqual(dd.canon_id('1.2.3'), '"1.2.3"')
+        self.assertEqual(dd.canon_id('-'), '"-"')
+        self.assertEqual(dd.canon_id('Node'), '"Node"')
+        self.assertEqual(dd.canon_id(''), '""')
+
+    def test_canon_id_escapes_quotes(self):
+        """
+        Test that quotes are escaped unless they already are
+        """
+        self.assertEqual(dd.canon_id('say "hi"'), '"say \\"hi\\""')
+        self.assertEqual(dd.canon_id('a\\"b'), '"a\\"b"')
+
+    def test_canon_id_long(self):
+        """
+        Test that long strings are split between words
+        """
+        name = ' '.join(['word']*40)
+        canon = dd.canon_id(name)
+
+        self.assertTrue(canon.startswith('"word'))
+        self.assertIn('\\\n', canon)
+        self.assertEqual(canon[1:-1].replace('\\\n', ''), name)
+
+
+class TestIncremental(unittest.TestCase):
+    """
+    Test adding batches of predictions to an existing graph
+    """
+    def setUp(self):
+        """
+        Set up two batches, where an entity that's loose in the first batch
+        is part of a triple in the second
+        """
+        self.test_dir = os.path.abspath(tempfile.mkdtemp())
+        self.doc1 = {
+            "doc_key": "PMID1_abstract",
+            "sentences": [['hello', "world", "!"], ["I", "like", "you"]],
+            "predicted_ner": [[[0, 0, "TYPE", 0.1, 0.5],
+                               [1, 1, "TYPE", 0.1, 0.5]],
+                              [[3, 3, "TYPE", 0.1, 0.5],
+                               [5, 5, "TYPE", 0.1, 0.5]]],
+            "predicted_relations": [[[0, 0, 1, 1, "TO_THE", 0.1, 0.5]], []]
+        }
+        self.doc2 = {
+            "doc_key": "PMID2_abstract",
+            "sentences": [['you', "like", "world"]],
+            "predicted_ner": [[[0, 0, "TYPE", 0.1, 0.5],
+                               [2, 2, "TYPE", 0.1, 0.5]]],
+            "predicted_relations": [[[0, 0, 2, 2, "LIKE", 0.1, 0.5]]]
+        }
+        self.doc3 = {
+            "doc_key": "PMID3_abstract",
+            "sentences": [['hello', "world", "again"]],
+            "predicted_ner": [[[0, 0, "TYPE", 0.1, 0.5],
+                               [1, 1, "TYPE", 0.1, 0.5],
+                               [2, 2, "TYPE", 0.1, 0.5]]],
+            "predicted_relations": [[[0, 0, 1, 1, "TO_THE", 0.1, 0.5]]]
+        }
+        self.batches = []
+        for i, docs in enumerate([[self.doc1], [self.doc2, self.doc3]]):
+            self.batches.append(f'{self.test_dir}/batch{i}.jsonl')
+            with jsonlines.open(self.batches[-1], 'w') as writer:
+                writer.write_all(docs)
+
+    def tearDown(self):
+        """
+        Delete directory and files used for testing
+        """
+        shutil.rmtree(self.test_dir)
+
+    def test_build_triple_counts_add(self):
+        """
+        Test that adding to counts gives the same result as one pass
+        """
+        first = dd.build_triple_counts([self.doc1])
+        added = dd.build_triple_counts([self.doc2, self.doc3], *first)
+
+        self.assertEqual(added, dd.build_triple_counts([self.doc1, self.doc2,
+                                                        self.doc3]))
+        self.assertEqual(added[1], ["I", "again"])
+
+    def test_main_incremental(self):
+        """
+        Test that adding a batch gives the same graph as making it from all
+        of the predictions, and that docs aren't counted twice
+        """
+        dd.main(self.batches, 'full', self.test_dir)
+        dd.main(self.batches[:1], 'inc', self.test_dir, incremental=True)
+        dd.main(self.batches, 'inc', self.test_dir, incremental=True)
+        results = []
+        for graph_name in ['full', 'inc']:
+            with open(f'{self.test_dir}/{graph_name}.gv') as myfile:
+                results.append(myfile.read().replace(graph_name, ''))
+        triple_weights, loose_ents, doc_keys = dd.load_counts(
+            f'{self.test_dir}/inc_counts')
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(triple_weights, {("hello", "TO_THE", "world"): 2,
+                                          ("you", "LIKE", "world"): 1})
+        self.assertEqual(loose_ents, ["I", "again"])
+        self.assertEqual(list(doc_keys), ["PMID1_abstract", "PMID2_abstract",
+                                          "PMID3_abstract"])
+
+
+class TestShards(unittest.TestCase):
+    """
+    Test counting predictions in shards with a pool of workers
+    """
+    def setUp(self):
+        """
+        Set up a file of docs with overlapping entities, and a failed
+        prediction
+        """
+        self.test_dir = os.path.abspath(tempfile.mkdtemp())
+        words = ["hello", "world", "I", "you", "again"]
+        self.docs = []
+        for i in range(20):
+            sent = [words[i % 5], "and", words[(i*3) % 5], words[(i*2) % 5]]
+            rels = [[[0, 0, 2, 2, ["LIKE", "TO_THE"][i % 2], 0.1, 0.5]]]
+            self.docs.append({
+                "doc_key": f"PMID{i}_abstract",
+                "sentences": [sent],
+                "predicted_ner": [[[0, 0, "TYPE", 0.1, 0.5],
+                                   [2, 2, "TYPE", 0.1, 0.5],
+                                   [3, 3, "TYPE", 0.1, 0.5]]],
+                "predicted_relations": rels if i % 3 else [[]]
+            })
+        self.docs[7] = {"doc_key": "PMID7_abstract",
+                        "_FAILED_PREDICTION": True}
+        self.files = []
+        for i in range(2):
+            self.files.append(f'{self.test_dir}/batch{i}.jsonl')
+            with jsonlines.open(self.files[-1], 'w') as writer:
+                writer.write_all(self.docs[i*10:(i + 1)*10])
+
+    def tearDown(self):
+        """
+        Delete directory and files used for testing
+        """
+        shutil.rmtree(self.test_dir)
+
+    def test_get_shards(self):
+        """
+        Test that shards cover the files and start at the start of a line
+        """
+        shards = dd.get_shards(self.files, 4)
+
+        for pred_file in self.files:
+            with open(pred_file, 'rb') as myfile:
+                lines = myfile.read()
+            file_shards = [shard for shard in shards if shard[0] == pred_file]
+            self.assertEqual(b''.join(lines[start:end] for _, start, end in
+                                      file_shards), lines)
+            for _, start, end in file_shards:
+                self.assertTrue(start == 0 or lines[start - 1:start] == b'\n')
+        self.assertEqual(len(dd.get_shards(self.files[:1], 100)), 10)
+
+    def test_read_preds_range(self):
+        """
+        Test that reading each shard gives all of the docs once
+        """
+        doc_stats = {'total': 0, 'failed': 0, 'skipped': 0}
+        docs = [doc for pred_file, start, end in dd.get_shards(self.files, 3)
+                for doc in dd.read_preds(pred_file, doc_stats, start, end)]
+
+        self.assertEqual(docs, self.docs[:7] + self.docs[8:])
+        self.assertEqual(doc_stats, {'total': 20, 'failed': 1, 'skipped': 0})
+
+    def test_merge_shard_counts(self):
+        """
+        Test that merging counts of consecutive shards is the same as one pass
+        """
+        docs = self.docs[:7] + self.docs[8:]
+        shard_counts = [dd.build_triple_counts(docs[i:i + 4])
+                        for i in range(0, len(docs), 4)]
+        merged = dd.merge_shard_counts(shard_counts)
+        expected = dd.build_triple_counts(docs)
+
+        self.assertEqual(list(merged[0].items()), list(expected[0].items()))
+        self.assertEqual(merged[1], expected[1])
+
+    def test_main_workers(self):
+        """
+        Test that the graph and counts are the same with several workers
+        """
+        dd.main(self.files, 'serial', self.test_dir)
+        dd.main(self.files, 'parallel', self.test_dir, workers=3)
+        dd.main(self.files[:1], 'inc', self.test_dir, incremental=True,
+                workers=2)
+        dd.main(self.files, 'inc', self.test_dir, incremental=True,
+                workers=2)
+        results = []
+        for graph_name in ['serial', 'parallel', 'inc']:
+            with open(f'{self.test_dir}/{graph_name}.gv') as myfile:
+                results.append(myfile.read().replace(graph_name, ''))
+        _, _, doc_keys = dd.load_counts(f'{self.test_dir}/inc_counts')
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(list(doc_keys), [doc["doc_key"] for doc in
+                                          self.docs[:7] + self.docs[8:]])
+
+    def test_main_workers_canonicalize(self):
+        """
+        Test that canonical names are the same with several workers
+        """
+        synonym_file = f'{self.test_dir}/synonyms.json'
+        with open(synonym_file, 'w') as myfile:
+            json.dump([["Hello", "again"]], myfile)
+        dd.main(self.files, 'serial', self.test_dir, synonyms=synonym_file)
+        dd.main(self.files, 'parallel', self.test_dir, workers=3,
+                synonyms=synonym_file)
+        results = []
+        for graph_name in ['serial', 'parallel']:
+            with open(f'{self.test_dir}/{graph_name}.gv') as myfile:
+                results.append(myfile.read().replace(graph_name, ''))
+
+        self.assertEqual(results[0], results[1])
+        self.assertIn('hello', results[0])
+        self.assertNotIn('again', results[0])
+
+    def test_parallel_repeated_doc_key(self):
+        """
+        Test that a doc_key in more than one shard is only counted once
+        """
+        doc_keys = {}
+        doc_stats = {'total': 0, 'failed': 0, 'skipped': 0}
+        counts = dd.build_triple_counts_parallel(self.files[:1] * 2, 2,
+                                                 doc_stats, doc_keys=doc_keys)
+
+        self.assertEqual(counts, dd.build_triple_counts(self.docs[:7] +
+                                                        self.docs[8:10]))
+        self.assertEqual(doc_stats, {'total': 20, 'failed': 2,
+                                     'skipped': 9})
+        self.assertEqual(len(doc_keys), 9)
+
+
 class TestWriteDotFile(unittest.TestCase):
     """
     Tests the output file
@@ -254,12 +608,12 @@ class TestWriteDotFile(unittest.TestCase):
             f'strict digraph {self.graph_name} '
             '{\n\thello -> world\t[label=TO_THE,\n'
             '\t\tweight=3];\n\tI -> "you world"\t[label=LIKE,\n'
-            '\t\tweight=1];\n}')
+            '\t\tweight=1];\n}\n')
         self.proper_DOT_ents = (
             f'strict digraph {self.graph_name} '
             '{\n\thello -> world\t[label=TO_THE,\n'
             '\t\tweight=3];\n\tI -> "you world"\t[label=LIKE,\n'
-            '\t\tweight=1];\n\tyou;\n}')
+            '\t\tweight=1];\n\tyou;\n}\n')
 
     def tearDown(self):
         """
@@ -290,6 +644,37 @@ class TestWriteDotFile(unittest.TestCase):
         print(test_result, self.proper_DOT_ents)
         self.assertEqual(test_result, self.proper_DOT_ents)
 
+    def test_write_dot_file_last_label_kept(self):
+        """
+        Test that only the last relation between two entities is kept
+        """
+        triples = self.triples + [("hello", "GREETS", "world")]
+        dd.write_dot_file(triples, [], self.graph_name, self.test_dir)
+
+        with open(f'{self.test_dir}/{self.graph_name}.gv') as myfile:
+            test_result = myfile.read()
+        self.assertEqual(test_result, self.proper_DOT_no_ents.replace(
+            'TO_THE,\n\t\tweight=3', 'GREETS,\n\t\tweight=1'))
+
+    @unittest.skipIf(dd.pgv is None, 'pygraphviz is not installed')
+    def test_write_dot_file_backends_match(self):
+        """
+        Test that the native backend writes the same bytes as pygraphviz
+        """
+        triples = self.triples + [("hello", "", "say \"hi\""),
+                                  ("graph", "IS_A", "-1.5"),
+                                  ("I", "LIKE", "hello"),
+                                  (' '.join(['word']*40), "LIKE", "I")]
+        loose_ents = self.loose_ents + ["3 words here"]
+        results = []
+        for backend in ['native', 'pygraphviz']:
+            dd.write_dot_file(triples, loose_ents, self.graph_name,
+                              self.test_dir, backend)
+            with open(f'{self.test_dir}/{self.graph_name}.gv', 'rb') as myfile:
+                results.append(myfile.read())
+
+        self.assertEqual(results[0], results[1])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -5,16 +5,20 @@ Author: Serena G. Lotreck
 """
 import unittest
 import sys
+from os.path import join
+from os import makedirs
+from tempfile import mkdtemp
+from contextlib import closing
+import shutil
+import sqlite3
 
 sys.path.append('../models/')
 
 import numpy as np
+import pandas as pd
+import jsonlines
 import evaluate_model_output as emo
 
-## Didn't write a test for drawing the samples,
-## since it just randomly selects and then uses other funcs
-## that already have tests
-
 class TestCalculateCI(unittest.TestCase):
     def setUp(self):
         self.prec_samples = [0.1,0.3,0.3,0.5,0.6,0.9]
@@ -40,6 +44,34 @@ class TestCalculateCI(unittest.TestCase):
         self.assertEqual(rec_CI, self.rec_CI)
         self.assertEqual(f1_CI, self.f1_CI)
 
+class TestComputeF1(unittest.TestCase):
+    def setUp(self):
+
+        # predicted, gold, matched
+        self.inputs = [(5, 4, 3), (0, 4, 0), (3, 0, 0), (0, 0, 0), (2, 2, 0)]
+
+    def test_compute_f1_values(self):
+        prec, rec, f1 = emo.compute_f1(5, 4, 3)
+
+        self.assertEqual(prec, 3/5)
+        self.assertEqual(rec, 3/4)
+        self.assertEqual(f1, 2*(3/5)*(3/4)/((3/5) + (3/4)))
+
+    def test_compute_f1_zero_division(self):
+        for predicted, gold, matched in self.inputs[1:]:
+            result = emo.compute_f1(predicted, gold, matched)
+
+            self.assertEqual(result, (0, 0, 0))
+
+    def test_get_boot_performance_same_as_compute_f1(self):
+        boot_counts = np.array([[m, p - m, g - m] for p, g, m in self.inputs])
+        result = emo.get_boot_performance(boot_counts)
+
+        for i, (predicted, gold, matched) in enumerate(self.inputs):
+            expected = emo.compute_f1(predicted, gold, matched)
+            self.assertEqual(tuple(samp[i] for samp in result), expected)
+
+
 class TestGetDocEntCounts(unittest.TestCase):
     def setUp(self):
 
@@ -130,6 +162,134 @@ class TestGetDocEntCounts(unittest.TestCase):
 
         self.assertEqual(counts, self.doc2_imperf_dict)
 
+    def test_get_doc_ent_counts_gold_duplicates(self):
+        gold_dup = {"doc_key": "doc1",
+                "ner": [[[0, 1, "ENTITY"], [0, 1, "OTHER"]]]}
+        pred = {"doc_key": "doc1", "predicted_ner": [[[0, 1, "ENTITY"]]]}
+        counts = emo.get_doc_ent_counts(pred, gold_dup,
+                {'tp':0, 'fp':0, 'fn':0})
+
+        self.assertEqual(counts, {'tp':1, 'fp':0, 'fn':0})
+
+
+class TestColumnarEntCounts(unittest.TestCase):
+    def setUp(self):
+
+        self.gold_std = [{
+            "doc_key": "doc1",
+            "ner": [[[0, 1, "ENTITY"], [6, 6, "ENTITY"], [6, 6, "OTHER"]],
+                    [[12, 13, "ENTITY"], [14, 15, "ENTITY"]]]
+        }, {
+            "doc_key": "doc2",
+            "ner": [[]]
+        }, {
+            "doc_key": "doc3",
+            "ner": [[[0, 0, "ENTITY"]], [[3, 4, "ENTITY"]]]
+        }]
+
+        self.preds = [{
+            "doc_key": "doc3",
+            # Same span as the gold standard, but in another sentence
+            "predicted_ner": [[[3, 4, "ORG"]], [[3, 4, "ORG"]]]
+        }, {
+            "doc_key": "doc1",
+            "predicted_ner": [[[0, 1, "ORG"], [6, 6, "ORG"]],
+                              [[9, 9, "ORG"], [13, 13, "PERS"],
+                               [14, 15, "PROTEIN"]]]
+        }, {
+            "doc_key": "doc2",
+            "predicted_ner": [[[0, 1, "ORG"]]]
+        }]
+
+    def test_get_span_arrays(self):
+        pred_spans, gold_spans = emo.get_span_arrays(self.gold_std,
+                self.preds)
+
+        self.assertEqual(len(pred_spans), 8)
+        self.assertEqual(len(gold_spans), 7)
+        self.assertEqual(tuple(pred_spans[0])[:4], (0, 0, 3, 4))
+
+    def test_columnar_matches_dict_backend(self):
+        columnar = emo.get_doc_counts(self.gold_std, self.preds, 'ent')
+        reference = emo.get_doc_counts(self.gold_std, self.preds, 'ent',
+                backend='dict')
+
+        np.testing.assert_array_equal(columnar, reference)
+
+    def test_columnar_matches_dict_backend_random(self):
+        rng = np.random.default_rng(0)
+        gold_std, preds = [], []
+        for i in range(50):
+            num_sents = int(rng.integers(1, 4))
+            ner = [[[int(s), int(s + rng.integers(0, 2)), "ENTITY"]
+                for s in rng.integers(0, 10, size=rng.integers(0, 6))]
+                for _ in range(num_sents)]
+            pred_ner = [[[int(s), int(s + rng.integers(0, 2)), "ORG"]
+                for s in rng.integers(0, 10, size=rng.integers(0, 6))]
+                for _ in range(num_sents)]
+            gold_std.append({"doc_key": f"doc{i}", "ner": ner})
+            preds.append({"doc_key": f"doc{i}", "predicted_ner": pred_ner})
+
+        columnar = emo.get_doc_counts(gold_std, preds, 'ent')
+        reference = emo.get_doc_counts(gold_std, preds, 'ent',
+                backend='dict')
+
+        np.testing.assert_array_equal(columnar, reference)
+
+    def test_columnar_no_spans(self):
+        counts = emo.get_doc_counts([{"doc_key": "doc2", "ner": [[]]}],
+                [{"doc_key": "doc2", "predicted_ner": [[]]}], 'ent')
+
+        np.testing.assert_array_equal(counts, np.zeros((1, 3)))
+
+    def test_columnar_wide_spans(self):
+        # Offsets too large to pack into one int are numbered instead
+        counts = emo.get_doc_counts([{"doc_key": "doc1",
+            "ner": [[[2**40, 2**40, "ENTITY"], [5, 6, "ENTITY"]]]}],
+            [{"doc_key": "doc1", "predicted_ner": [[[2**40, 2**40, "ORG"],
+                [5, 5, "ORG"]]]}], 'ent')
+
+        np.testing.assert_array_equal(counts, [[1, 1, 1]])
+
+    def test_stream_doc_counts_backends_match(self):
+        gold_index = {doc["doc_key"]: dict(doc, relations=[[] for _ in
+            doc["ner"]]) for doc in self.gold_std}
+        metric_names = emo.get_metric_names(gold_index, relaxed=True)
+        # doc1 is predicted twice, and doc3's predictions have an extra
+        # sentence
+        preds = self.preds + [self.preds[1], {"doc_key": "doc3",
+            "predicted_ner": [[[0, 0, "ENTITY"], [0, 0, "ENTITY"]],
+                [[3, 4, "OTHER"]], [[0, 0, "ENTITY"]]]}]
+
+        columnar = emo.stream_doc_counts(preds, gold_index, metric_names)
+        reference = emo.stream_doc_counts(preds, gold_index, metric_names,
+                backend='dict')
+
+        self.assertEqual(columnar[0], reference[0])
+        np.testing.assert_array_equal(columnar[1], reference[1])
+
+    def test_stream_doc_counts_backends_match_random(self):
+        rng = np.random.default_rng(1)
+        labels = ["ENTITY", "OTHER", "ORG"]
+        gold_index, preds = {}, []
+        for i in range(50):
+            num_sents = int(rng.integers(1, 4))
+            ner, pred_ner = [[[[int(s), int(s + rng.integers(0, 2)),
+                labels[rng.integers(0, 3)]] for s in rng.integers(0, 10,
+                    size=rng.integers(0, 6))] for _ in range(num_sents)]
+                for _ in range(2)]
+            gold_index[f"doc{i:02}"] = {"doc_key": f"doc{i:02}", "ner": ner,
+                    "relations": [[] for _ in range(num_sents)]}
+            preds.append({"doc_key": f"doc{i:02}", "predicted_ner": pred_ner,
+                "predicted_relations": [[] for _ in range(num_sents)]})
+        metric_names = emo.get_metric_names(gold_index)
+
+        columnar = emo.stream_doc_counts(preds, gold_index, metric_names)
+        reference = emo.stream_doc_counts(preds, gold_index, metric_names,
+                backend='dict')
+
+        np.testing.assert_array_equal(columnar[1], reference[1])
+
 class TestEliminateRelDups(unittest.TestCase):
     def setUp(self):
 
@@ -239,6 +399,76 @@ class TestCheckRelMatches(unittest.TestCase):
 
         self.assertEqual(result, self.out_result)
 
+    def test_check_rel_matches_no_substring_match(self):
+        # "1 2" is a substring of "11 2 ..." but is not the same span
+        result = emo.check_rel_matches([1, 2, 5, 6, "hello-world"],
+                [[11, 2, 5, 6, "hello-world"]])
+
+        self.assertFalse(result)
+
+    def test_check_rel_matches_spans_from_different_rels(self):
+        # Both spans are in the gold standard, but not in the same relation
+        result = emo.check_rel_matches([1, 3, 3, 4, "hello-world"],
+                self.corr_out_gold)
+
+        self.assertFalse(result)
+
+
+class TestRelIndex(unittest.TestCase):
+    def setUp(self):
+
+        self.sent = [[1, 3, 5, 6, "hello-world"],
+                [3, 4, 5, 6, "good-morning-world"]]
+        self.rel_index = emo.build_rel_index(self.sent)
+
+    def test_rel_in_index_unordered_reversed(self):
+        result = emo.rel_in_index([5, 6, 1, 3, "other"], self.rel_index)
+
+        self.assertTrue(result)
+
+    def test_rel_in_index_ordered_reversed(self):
+        result = emo.rel_in_index([5, 6, 1, 3, "other"], self.rel_index,
+                ordered=True)
+
+        self.assertFalse(result)
+
+    def test_rel_in_index_ordered_same_order(self):
+        result = emo.rel_in_index([3, 4, 5, 6, "other"], self.rel_index,
+                ordered=True)
+
+        self.assertTrue(result)
+
+
+class TestSpanIndex(unittest.TestCase):
+    def setUp(self):
+
+        self.spans = [(10, 12), (0, 8), (3, 3), (14, 14)]
+        self.span_index = emo.build_span_index(self.spans)
+
+    def test_get_overlaps_same_as_all_pairs(self):
+        for query in [(0, 0), (4, 9), (9, 9), (12, 14), (15, 20), (2, 3)]:
+            expected = [span for span in self.spans
+                    if span[0] <= query[1] and query[0] <= span[1]]
+            result = emo.get_overlaps(query, self.span_index)
+
+            self.assertEqual(sorted(result), sorted(expected))
+
+    def test_get_overlaps_empty_index(self):
+        result = emo.get_overlaps((0, 1), emo.build_span_index([]))
+
+        self.assertEqual(result, [])
+
+    def test_rel_overlaps_index(self):
+        sent = [[1, 3, 5, 6, "hello-world"]]
+        head_index = emo.build_span_index([(r[0], r[1]) for r in sent], sent)
+
+        self.assertTrue(emo.rel_overlaps_index([3, 4, 6, 8, "other"],
+            head_index))
+        self.assertTrue(emo.rel_overlaps_index([6, 8, 0, 1, "other"],
+            head_index))
+        self.assertFalse(emo.rel_overlaps_index([3, 4, 7, 8, "other"],
+            head_index))
+
 
 class TestGetDocRelCounts(unittest.TestCase):
     def setUp(self):
@@ -322,6 +552,16 @@ class TestGetDocRelCounts(unittest.TestCase):
 
         self.assertEqual(counts, self.doc_none_dict)
 
+    def test_get_doc_rel_counts_ordered(self):
+        doc_pred_reversed = {
+            "doc_key": "doc1",
+            "predicted_relations": [[], [[14, 15, 12, 13, "Random-type"]]]
+            }
+        counts = emo.get_doc_rel_counts(doc_pred_reversed, self.gold,
+                {'tp':0, 'fp':0, 'fn':0}, "doc1", ordered=True)
+
+        self.assertEqual(counts, {'tp':0, 'fp':1, 'fn':1})
+
 
 class TestGetF1Input(unittest.TestCase):
     def setUp(self):
@@ -486,5 +726,711 @@ class TestGetF1Input(unittest.TestCase):
         self.assertEqual(matched, self.imperf_matched_num_rel)
 
 
+class TestDrawBootSamples(unittest.TestCase):
+    def setUp(self):
+
+        self.gold_std = [{
+            "doc_key": "doc1",
+            "ner": [[[0, 1, "ENTITY"], [6, 6, "ENTITY"]],
+                    [[12, 13, "ENTITY"], [14, 15, "ENTITY"]]],
+            "relations": [[], [[12, 13, 14, 15, "Research"]]]
+        }, {
+            "doc_key": "doc2",
+            "ner": [[[0, 0, "ENTITY"]]],
+            "relations": [[]]
+        }, {
+            "doc_key": "doc3",
+            "ner": [[[2, 3, "ENTITY"], [5, 5, "ENTITY"]]],
+            "relations": [[[2, 3, 5, 5, "Research"]]]
+        }]
+
+        self.preds = [{
+            "doc_key": "doc1",
+            "predicted_ner": [[[0, 1, "Hello"], [6, 6, "Person"]],
+                              [[12, 13, "Person"], [14, 14, "Protein"]]],
+            "predicted_relations": [[[0, 1, 6, 6, "Random-type:"]],
+                [[12, 13, 14, 15, "Random-type"]]]
+        }, {
+            "doc_key": "doc2",
+            "predicted_ner": [[[1, 1, "Hello"]]],
+            "predicted_relations": [[]]
+        }, {
+            "doc_key": "doc3",
+            "predicted_ner": [[[2, 3, "Hello"], [5, 5, "Person"]]],
+            "predicted_relations": [[[5, 5, 2, 3, "Random-type"]]]
+        }]
+
+        self.doc_ent_counts = np.array([[3, 1, 1], [0, 1, 1], [2, 0, 0]])
+        self.num_boot = 50
+
+    def legacy_boot_samples(self, input_type):
+        """
+        Draws the replicates one at a time by re-matching the resampled
+        documents, as was done before the counts were vectorized.
+        """
+        prec_samples, rec_samples, f1_samples = [], [], []
+        for _ in range(self.num_boot):
+            pred_samp = np.random.choice(self.preds, size=len(self.preds),
+                    replace=True)
+            idx_list = [self.preds.index(i) for i in pred_samp]
+            gold_samp = [self.gold_std[i] for i in idx_list]
+            pred, gold, match = emo.get_f1_input(gold_samp, pred_samp,
+                    input_type)
+            prec, rec, f1 = emo.compute_f1(pred, gold, match)
+            prec_samples.append(prec)
+            rec_samples.append(rec)
+            f1_samples.append(f1)
+
+        return (prec_samples, rec_samples, f1_samples)
+
+    def test_get_doc_counts_ent(self):
+        counts = emo.get_doc_counts(self.gold_std, self.preds, 'ent')
+
+        np.testing.assert_array_equal(counts, self.doc_ent_counts)
+
+    def test_draw_boot_weights_rows_sum_to_num_docs(self):
+        weights = emo.draw_boot_weights(3, self.num_boot)
+
+        self.assertEqual(weights.shape, (self.num_boot, 3))
+        np.testing.assert_array_equal(weights.sum(axis=1),
+                np.full(self.num_boot, 3))
+
+    def test_draw_boot_samples_from_counts_blocks(self):
+        # Drawing in blocks gives the same samples as one large draw
+        doc_counts = emo.get_doc_counts(self.gold_std, self.preds, 'ent')
+        num_boot = 2*emo.BOOT_BLOCK_SIZE + 10
+        np.random.seed(3)
+        expected = emo.get_boot_performance(emo.draw_boot_weights(3,
+            num_boot) @ doc_counts)
+        np.random.seed(3)
+        result = emo.draw_boot_samples_from_counts(doc_counts, num_boot)
+
+        for res, exp in zip(result, expected):
+            np.testing.assert_array_equal(res, exp)
+
+    def test_draw_adaptive_boot_samples_converged(self):
+        doc_counts = emo.get_doc_counts(self.gold_std, self.preds, 'ent')
+        # Every sample is the same when all docs have the same counts
+        doc_counts = np.repeat(doc_counts[:1], 3, axis=0)
+        result = emo.draw_adaptive_boot_samples(doc_counts, 500,
+                batch_size=20)
+
+        self.assertEqual(result[3], 40)
+        self.assertEqual(len(result[0]), 40)
+
+    def test_draw_adaptive_boot_samples_max(self):
+        doc_counts = emo.get_doc_counts(self.gold_std, self.preds, 'ent')
+        np.random.seed(7)
+        fixed = emo.draw_boot_samples_from_counts(doc_counts, 30)
+        np.random.seed(7)
+        adaptive = emo.draw_adaptive_boot_samples(doc_counts, 30,
+                batch_size=20, tol=0)
+
+        self.assertEqual(adaptive[3], 30)
+        for fixed_samp, adaptive_samp in zip(fixed, adaptive[:3]):
+            np.testing.assert_array_equal(fixed_samp, adaptive_samp)
+
+    def test_draw_adaptive_boot_samples_no_samples(self):
+        doc_counts = emo.get_doc_counts(self.gold_std, self.preds, 'ent')
+
+        with self.assertRaises(ValueError):
+            emo.draw_adaptive_boot_samples(doc_counts, 0)
+        with self.assertRaises(ValueError):
+            emo.draw_adaptive_boot_samples(doc_counts, 100, batch_size=0)
+
+    def test_draw_seeded_boot_counts_reproducible(self):
+        doc_counts = emo.get_doc_counts(self.gold_std, self.preds, 'ent')
+        first = emo.draw_seeded_boot_counts(doc_counts, 250, 12)
+        np.random.seed(0)
+        second = emo.draw_seeded_boot_counts(doc_counts, 250, 12)
+
+        self.assertEqual(first.shape, (250, 3))
+        np.testing.assert_array_equal(first, second)
+
+    def test_draw_seeded_boot_counts_pool_same_as_serial(self):
+        doc_counts = emo.get_doc_counts(self.gold_std, self.preds, 'ent')
+        serial = emo.draw_seeded_boot_counts(doc_counts, 250, 12)
+        with emo.get_mp_context().Pool(3) as pool:
+            parallel = emo.draw_seeded_boot_counts(doc_counts, 250, 12, pool)
+
+        np.testing.assert_array_equal(serial, parallel)
+
+    def test_draw_seeded_boot_counts_prefix(self):
+        # Blocks don't depend on how many are drawn, so fewer samples are the
+        # start of more samples
+        doc_counts = emo.get_doc_counts(self.gold_std, self.preds, 'ent')
+        short = emo.draw_seeded_boot_counts(doc_counts, 200, 12)
+        long = emo.draw_seeded_boot_counts(doc_counts, 250, 12)
+
+        np.testing.assert_array_equal(short, long[:200])
+
+    def test_draw_boot_samples_matches_legacy_ent(self):
+        np.random.seed(1234)
+        legacy = self.legacy_boot_samples('ent')
+        np.random.seed(1234)
+        result = emo.draw_boot_samples(self.preds, self.gold_std,
+                self.num_boot, 'ent')
+
+        for res, leg in zip(result, legacy):
+            self.assertEqual(list(res), leg)
+
+    def test_draw_boot_samples_matches_legacy_rel(self):
+        np.random.seed(4321)
+        legacy = self.legacy_boot_samples('rel')
+        np.random.seed(4321)
+        result = emo.draw_boot_samples(self.preds, self.gold_std,
+                self.num_boot, 'rel')
+
+        for res, leg in zip(result, legacy):
+            self.assertEqual(list(res), leg)
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+
+        self.tmpdir = mkdtemp()
+
+        gold_std = [{
+            "doc_key": "doc2",
+            "ner": [[]],
+            "relations": [[]]
+        }, {
+            "doc_key": "doc1",
+            "ner": [[[0, 1, "ENTITY"], [6, 6, "ENTITY"]],
+                    [[12, 13, "ENTITY"], [14, 15, "ENTITY"]]],
+            "relations": [[], [[12, 13, 14, 15, "Research"]]]
+        }]
+        pred_perf = [{
+            "doc_key": "doc1",
+            "predicted_ner": [[[0, 1, "Hello"], [6, 6, "Person"]],
+                              [[12, 13, "Person"], [14, 15, "Protein"]]],
+            "predicted_relations": [[], [[12, 13, 14, 15, "Random-type"]]]
+            }, {
+            "doc_key": "doc2",
+            "predicted_ner": [[]],
+            "predicted_relations": [[]]
+        }]
+        pred_imperf = [{
+            "doc_key": "doc1",
+            "predicted_ner": [[[0, 1, "Hello"], [6, 6, "Person"]],
+                              [[12, 13, "Person"], [14, 14, "Protein"]]],
+            "predicted_relations": [[[0, 1, 6, 6, "Random-type:"]],
+                [[12, 13, 14, 15, "Random-type"]]]
+            }, {
+            "doc_key": "doc3",
+            # Not in the gold standard, should be skipped
+            "predicted_ner": [[[1, 1, "Hello"]]],
+            "predicted_relations": [[]]
+        }]
+
+        self.gold_file = join(self.tmpdir, 'gold.jsonl')
+        self.pred_files = [join(self.tmpdir, 'perf_preds.jsonl'),
+                join(self.tmpdir, 'imperf_preds.jsonl')]
+        for fname, dicts in zip([self.gold_file] + self.pred_files,
+                [gold_std, pred_perf, pred_imperf]):
+            with jsonlines.open(fname, 'w') as writer:
+                writer.write_all(dicts)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmpdir)
+
+    def test_main_serial(self):
+        out_name = join(self.tmpdir, 'serial.csv')
+        emo.main(self.gold_file, out_name, self.pred_files, False, 10)
+        df = pd.read_csv(out_name)
+
+        self.assertEqual(list(df.pred_file), ['perf_preds.jsonl',
+            'imperf_preds.jsonl'])
+        self.assertEqual(list(df.ent_F1), [1.0, 0.75])
+        self.assertEqual(list(df.rel_precision), [1.0, 0.5])
+
+    def test_stream_doc_counts_same_as_read(self):
+        gold_index = emo.load_gold_standard(self.gold_file)
+        metric_names = emo.get_metric_names(gold_index)
+        for pred_file in self.pred_files:
+            read_keys, read_counts, read_rels = emo.read_doc_counts(
+                    pred_file, gold_index, metric_names)
+            stream_keys, stream_counts, stream_rels = emo.read_doc_counts(
+                    pred_file, gold_index, metric_names, stream=True)
+
+            self.assertEqual(read_keys, stream_keys)
+            self.assertEqual(read_rels, stream_rels)
+            np.testing.assert_array_equal(read_counts, stream_counts)
+
+    def test_read_doc_counts_no_rels(self):
+        pred_file = join(self.tmpdir, 'no_rel_preds.jsonl')
+        with jsonlines.open(pred_file, 'w') as writer:
+            writer.write({"doc_key": "doc2", "predicted_ner": [[]]})
+        gold_index = emo.load_gold_standard(self.gold_file)
+        doc_keys, counts, pred_rels = emo.read_doc_counts(pred_file,
+                gold_index, emo.get_metric_names(gold_index), stream=True)
+
+        self.assertEqual(doc_keys, ['doc2'])
+        self.assertEqual(counts.shape, (1, 5, 3))
+        self.assertFalse(pred_rels)
+
+    def test_main_bootstrap_no_matching_docs(self):
+        # Predictions for docs that aren't in the gold standard are skipped,
+        # so there's nothing to resample
+        pred_file = join(self.tmpdir, 'unknown_preds.jsonl')
+        with jsonlines.open(pred_file, 'w') as writer:
+            writer.write({"doc_key": "doc4", "predicted_ner": [[]],
+                "predicted_relations": [[]]})
+        for kwargs in [{}, {'seed': 2}, {'stream': True}]:
+            out_name = join(self.tmpdir, 'empty.csv')
+            emo.main(self.gold_file, out_name, [pred_file], True, 10,
+                    **kwargs)
+            df = pd.read_csv(out_name)
+
+            self.assertEqual(list(df.ent_F1), [0.0])
+            self.assertEqual(list(df.ent_F1_CI), ['(0.0, 0.0)'])
+
+    def test_main_per_label_columns(self):
+        out_name = join(self.tmpdir, 'serial.csv')
+        emo.main(self.gold_file, out_name, self.pred_files, False, 10)
+        df = pd.read_csv(out_name)
+
+        self.assertEqual(list(df.ent_ENTITY_F1), [0.0, 0.0])
+        self.assertEqual(list(df.rel_Research_recall), [0.0, 0.0])
+        self.assertEqual(list(df.rel_ordered_F1), [1.0, 2/3])
+
+    def test_main_stream_same_as_serial(self):
+        serial_name = join(self.tmpdir, 'serial.csv')
+        stream_name = join(self.tmpdir, 'stream.csv')
+        np.random.seed(10)
+        emo.main(self.gold_file, serial_name, self.pred_files, True, 20)
+        np.random.seed(10)
+        emo.main(self.gold_file, stream_name, self.pred_files, True, 20,
+                stream=True)
+
+        pd.testing.assert_frame_equal(pd.read_csv(serial_name),
+                pd.read_csv(stream_name))
+
+    def test_main_backends_match(self):
+        columnar_name = join(self.tmpdir, 'columnar.csv')
+        dict_name = join(self.tmpdir, 'dict.csv')
+        emo.main(self.gold_file, columnar_name, self.pred_files, False, 0)
+        emo.main(self.gold_file, dict_name, self.pred_files, False, 0,
+                backend='dict')
+
+        pd.testing.assert_frame_equal(pd.read_csv(columnar_name),
+                pd.read_csv(dict_name))
+
+    def test_main_paired(self):
+        out_name = join(self.tmpdir, 'paired.csv')
+        emo.main(self.gold_file, out_name, self.pred_files, True, 20,
+                paired=True)
+        df = pd.read_csv(join(self.tmpdir, 'paired_paired.csv'))
+        ent = df[df.metric == 'ent'].iloc[0]
+
+        self.assertEqual(ent.model_a, 'perf_preds.jsonl')
+        self.assertEqual(ent.model_b, 'imperf_preds.jsonl')
+        self.assertEqual(ent.delta_F1, 0.25)
+
+    def test_main_paired_no_shared_docs(self):
+        pred_file = join(self.tmpdir, 'doc2_preds.jsonl')
+        with jsonlines.open(pred_file, 'w') as writer:
+            writer.write({"doc_key": "doc2", "predicted_ner": [[]],
+                "predicted_relations": [[]]})
+        out_name = join(self.tmpdir, 'paired.csv')
+        with self.assertWarns(UserWarning):
+            emo.main(self.gold_file, out_name, [self.pred_files[1],
+                pred_file], True, 20, paired=True)
+        df = pd.read_csv(out_name)
+        paired = pd.read_csv(join(self.tmpdir, 'paired_paired.csv'))
+
+        self.assertEqual(len(df), 2)
+        self.assertTrue(paired.delta_F1.isna().all())
+
+    def test_main_seed_reproducible(self):
+        first_name = join(self.tmpdir, 'first.csv')
+        second_name = join(self.tmpdir, 'second.csv')
+        emo.main(self.gold_file, first_name, self.pred_files, True, 20,
+                seed=5)
+        # Evaluating a file on its own gives the same row
+        emo.main(self.gold_file, second_name, self.pred_files[1:], True, 20,
+                seed=5)
+
+        pd.testing.assert_frame_equal(pd.read_csv(first_name).iloc[1:]\
+                .reset_index(drop=True), pd.read_csv(second_name))
+
+    def test_main_cache(self):
+        cache_file = join(self.tmpdir, 'cache.json')
+        first_name = join(self.tmpdir, 'first.csv')
+        second_name = join(self.tmpdir, 'second.csv')
+        emo.main(self.gold_file, first_name, self.pred_files, True, 20,
+                seed=5, cache_file=cache_file)
+        cache = emo.load_cache(cache_file)
+
+        self.assertEqual(len(cache), 2)
+
+        # Change a cached row to check that it's the one that gets used
+        key = list(cache.keys())[0]
+        cache[key]['ent_F1'] = -1
+        emo.save_cache(cache, cache_file)
+        emo.main(self.gold_file, second_name, self.pred_files, True, 20,
+                seed=5, cache_file=cache_file)
+        first = pd.read_csv(first_name)
+        second = pd.read_csv(second_name)
+
+        self.assertEqual(list(second.ent_F1), [-1, first.ent_F1[1]])
+        pd.testing.assert_frame_equal(first.drop(columns='ent_F1'),
+                second.drop(columns='ent_F1'))
+
+    def test_main_cache_unseeded_bootstrap(self):
+        cache_file = join(self.tmpdir, 'cache.json')
+        emo.main(self.gold_file, join(self.tmpdir, 'out.csv'),
+                self.pred_files, True, 20, cache_file=cache_file)
+
+        self.assertEqual(emo.load_cache(cache_file), {})
+
+    def test_main_adaptive_num_boot(self):
+        out_name = join(self.tmpdir, 'adaptive.csv')
+        emo.main(self.gold_file, out_name, self.pred_files, True, 100,
+                seed=3, adaptive=True, boot_batch=10, boot_tol=1.01)
+        df = pd.read_csv(out_name)
+
+        self.assertEqual(list(df.num_boot), [20, 20])
+
+    def test_main_workers_same_as_serial(self):
+        serial_name = join(self.tmpdir, 'serial.csv')
+        pool_name = join(self.tmpdir, 'pool.csv')
+        emo.main(self.gold_file, serial_name, self.pred_files, False, 10)
+        emo.main(self.gold_file, pool_name, self.pred_files, False, 10,
+                workers=2)
+
+        pd.testing.assert_frame_equal(pd.read_csv(serial_name),
+                pd.read_csv(pool_name))
+
+    def test_main_workers_seeded_bootstrap(self):
+        serial_name = join(self.tmpdir, 'serial.csv')
+        pool_name = join(self.tmpdir, 'pool.csv')
+        emo.main(self.gold_file, serial_name, self.pred_files, True, 250,
+                seed=8)
+        emo.main(self.gold_file, pool_name, self.pred_files, True, 250,
+                workers=3, seed=8)
+
+        pd.testing.assert_frame_equal(pd.read_csv(serial_name),
+                pd.read_csv(pool_name))
+
+    def test_main_subset(self):
+        subset_name = join(self.tmpdir, 'subset.csv')
+        emo.main(self.gold_file, subset_name, self.pred_files, False, 10,
+                subset_keys=['doc2'])
+        df = pd.read_csv(subset_name)
+
+        # Only doc2 is left, which has no entities in the gold standard
+        self.assertEqual(list(df.ent_precision), [0.0, 0.0])
+        self.assertEqual(list(df.ent_recall), [0.0, 0.0])
+
+    def test_main_counts_dir(self):
+        counts_dir = join(self.tmpdir, 'counts')
+        makedirs(counts_dir)
+        first_name = join(self.tmpdir, 'first.csv')
+        second_name = join(self.tmpdir, 'second.csv')
+        emo.main(self.gold_file, first_name, self.pred_files, False, 10,
+                counts_dir=counts_dir)
+        counts_file = join(counts_dir, 'perf_preds.jsonl.counts.npz')
+        stored = emo.load_doc_counts(counts_file)
+
+        self.assertEqual(stored['doc_keys'], ['doc1', 'doc2'])
+
+        # Change the saved counts to check that they're the ones that get used
+        emo.save_doc_counts(counts_file, stored['doc_keys'],
+                np.zeros_like(stored['doc_counts']), stored['pred_rels'],
+                stored['metric_names'], self.pred_files[0], self.gold_file,
+                stored['pred_hash'], stored['gold_hash'])
+        emo.main(self.gold_file, second_name, self.pred_files, False, 10,
+                counts_dir=counts_dir)
+        first = pd.read_csv(first_name)
+        second = pd.read_csv(second_name)
+
+        self.assertEqual(list(second.ent_F1), [0.0, first.ent_F1[1]])
+
+    def test_main_error_db(self):
+        error_db = join(self.tmpdir, 'errors.db')
+        emo.main(self.gold_file, join(self.tmpdir, 'out.csv'),
+                self.pred_files, False, 10, error_db=error_db)
+        with closing(sqlite3.connect(error_db)) as conn:
+            errors = conn.execute('SELECT model, doc_key, type, error, '
+                    'start, end FROM errors ORDER BY type, error').fetchall()
+
+        self.assertEqual(errors, [
+            ('imperf_preds.jsonl', 'doc1', 'ent', 'fn', 14, 15),
+            ('imperf_preds.jsonl', 'doc1', 'ent', 'fp', 14, 14),
+            ('imperf_preds.jsonl', 'doc1', 'rel', 'fp', 0, 1)])
+        self.assertEqual(set(emo.load_error_models(error_db)),
+                {'perf_preds.jsonl', 'imperf_preds.jsonl'})
+
+    def test_main_error_db_no_duplicates(self):
+        error_db = join(self.tmpdir, 'errors.db')
+        for workers in [1, 2]:
+            emo.main(self.gold_file, join(self.tmpdir, 'out.csv'),
+                    self.pred_files, False, 10, workers=workers,
+                    error_db=error_db)
+        with closing(sqlite3.connect(error_db)) as conn:
+            num_errors = conn.execute('SELECT COUNT(*) FROM errors'
+                    ).fetchone()[0]
+
+        self.assertEqual(num_errors, 3)
+
+    def test_main_relaxed(self):
+        strict_name = join(self.tmpdir, 'strict.csv')
+        relaxed_name = join(self.tmpdir, 'relaxed.csv')
+        emo.main(self.gold_file, strict_name, self.pred_files, False, 10)
+        emo.main(self.gold_file, relaxed_name, self.pred_files, False, 10,
+                relaxed=True)
+        strict = pd.read_csv(strict_name)
+        relaxed = pd.read_csv(relaxed_name)
+
+        # [14, 14] overlaps [14, 15], so it only counts when relaxed
+        self.assertEqual(list(relaxed.ent_relaxed_F1), [1.0, 1.0])
+        pd.testing.assert_frame_equal(strict, relaxed[strict.columns])
+
+    def test_main_threshold_sweep(self):
+        out_name = join(self.tmpdir, 'sweep.csv')
+        emo.main(self.gold_file, out_name, self.pred_files, False, 10,
+                threshold_sweep=True)
+        df = pd.read_csv(out_name)
+        sweep = pd.read_csv(join(self.tmpdir, 'sweep_threshold_sweep.csv'))
+
+        # Predictions without scores are all kept, so the best F1 is the same
+        # as the F1 without a threshold
+        self.assertEqual(list(df.rel_best_F1), list(df.rel_F1))
+        self.assertEqual(list(sweep.pred_file), ['perf_preds.jsonl',
+            'imperf_preds.jsonl'])
+
+    def test_evaluate_subset(self):
+        counts_dir = join(self.tmpdir, 'counts')
+        makedirs(counts_dir)
+        emo.main(self.gold_file, join(self.tmpdir, 'out.csv'),
+                self.pred_files, False, 10, counts_dir=counts_dir)
+        row = emo.evaluate_subset(join(counts_dir,
+            'imperf_preds.jsonl.counts.npz'), ['doc1'], False, 10)
+
+        self.assertEqual(row['pred_file'], 'imperf_preds.jsonl')
+        self.assertEqual(row['ent_F1'], 0.75)
+
+
+class TestGetDocMetricCounts(unittest.TestCase):
+    def setUp(self):
+
+        self.gold_std = {
+            "doc_key": "doc1",
+            "ner": [[[0, 1, "Protein"], [6, 6, "Gene"]],
+                    [[12, 13, "Gene"], [14, 15, "Protein"]]],
+            "relations": [[[0, 1, 6, 6, "interacts"]],
+                [[12, 13, 14, 15, "produces"]]]
+        }
+        self.pred = {
+            "doc_key": "doc1",
+            "predicted_ner": [[[0, 1, "Protein"], [6, 6, "Protein"]],
+                              [[9, 9, "Gene"], [14, 15, "Protein"]]],
+            "predicted_relations": [[[6, 6, 0, 1, "interacts"]],
+                [[12, 13, 14, 15, "interacts"],
+                 [12, 13, 14, 15, "interacts"]]]
+        }
+        self.gold_index = {"doc1": self.gold_std}
+        self.metric_names = emo.get_metric_names(self.gold_index)
+        self.metric_ids = {m: i for i, m in enumerate(self.metric_names)}
+
+    def test_get_metric_names(self):
+
+        self.assertEqual(self.metric_names, ['ent', 'rel', 'rel_ordered',
+            'ent_Gene', 'ent_Protein', 'rel_interacts', 'rel_produces'])
+
+    def test_get_doc_metric_counts_same_as_reference(self):
+        counts = emo.get_doc_metric_counts(self.pred, self.gold_std,
+                self.metric_ids)
+        ent = emo.get_doc_ent_counts(self.pred, self.gold_std,
+                {'tp':0, 'fp':0, 'fn':0})
+        rel = emo.get_doc_rel_counts(self.pred, self.gold_std,
+                {'tp':0, 'fp':0, 'fn':0}, "doc1")
+        rel_ordered = emo.get_doc_rel_counts(self.pred, self.gold_std,
+                {'tp':0, 'fp':0, 'fn':0}, "doc1", ordered=True)
+
+        for name, ref in [('ent', ent), ('rel', rel),
+                ('rel_ordered', rel_ordered)]:
+            self.assertEqual(list(counts[self.metric_ids[name]]),
+                    [ref['tp'], ref['fp'], ref['fn']])
+
+    def test_get_doc_metric_counts_errors(self):
+        doc = {"doc_key": "doc1",
+                "sentences": [["A", "b", "c"], ["d", "e"]],
+                "predicted_ner": [[[0, 1, "A", 1.2, 0.8]], [[4, 4, "A"]]],
+                "predicted_relations": [[], [[3, 3, 4, 4, "R", 0.5, 0.6]]]}
+        gold_std = {"doc_key": "doc1",
+                "ner": [[[0, 0, "A"]], [[4, 4, "A"]]],
+                "relations": [[], []]}
+        metric_ids = {'ent': 0, 'rel': 1, 'rel_ordered': 2, 'ent_A': 3}
+        errors = []
+        emo.get_doc_metric_counts(doc, gold_std, metric_ids, errors)
+
+        self.assertEqual(errors, [
+            ('doc1', 0, 'ent', 'fp', 0, 1, None, None, 'A', 'A b', None, 0.8),
+            ('doc1', 0, 'ent', 'fn', 0, 0, None, None, 'A', 'A', None, None),
+            ('doc1', 1, 'rel', 'fp', 3, 3, 4, 4, 'R', 'd', 'e', 0.6)])
+
+    def test_get_doc_metric_counts_relaxed(self):
+        doc = {"doc_key": "doc1",
+                "predicted_ner": [[[0, 0, "A"], [5, 7, "A"], [9, 9, "A"]]],
+                "predicted_relations": [[[5, 7, 0, 0, "R"],
+                    [9, 9, 0, 0, "R"]]]}
+        gold_std = {"doc_key": "doc1",
+                "ner": [[[0, 1, "A"], [6, 6, "A"], [11, 12, "A"]]],
+                "relations": [[[0, 1, 6, 6, "R"]]]}
+        metric_ids = {'ent': 0, 'rel': 1, 'rel_ordered': 2, 'ent_relaxed': 3,
+                'rel_relaxed': 4, 'ent_A': 5, 'rel_R': 6}
+        counts = emo.get_doc_metric_counts(doc, gold_std, metric_ids)
+
+        np.testing.assert_array_equal(counts[0], [0, 3, 3])
+        np.testing.assert_array_equal(counts[3], [2, 1, 1])
+        np.testing.assert_array_equal(counts[4], [1, 1, 0])
+
+    def test_get_doc_metric_counts_per_label(self):
+        counts = emo.get_doc_metric_counts(self.pred, self.gold_std,
+                self.metric_ids)
+
+        self.assertEqual(list(counts[self.metric_ids['ent_Gene']]),
+                [0, 1, 2])
+        self.assertEqual(list(counts[self.metric_ids['ent_Protein']]),
+                [2, 1, 0])
+        self.assertEqual(list(counts[self.metric_ids['rel_interacts']]),
+                [1, 1, 0])
+        self.assertEqual(list(counts[self.metric_ids['rel_produces']]),
+                [0, 0, 1])
+
+
+class TestPairedBootstrap(unittest.TestCase):
+    def setUp(self):
+
+        self.metric_names = ['ent']
+        self.doc_keys = ['doc1', 'doc2', 'doc3', 'doc4']
+        self.good = np.array([[[3, 0, 0]], [[2, 0, 1]], [[4, 1, 0]],
+            [[1, 0, 0]]])
+        self.bad = np.array([[[1, 2, 2]], [[0, 2, 3]], [[1, 3, 3]],
+            [[0, 1, 1]]])
+
+    def test_paired_bootstrap_same_model(self):
+        model_counts = {'a': (self.doc_keys, self.good, False),
+                'b': (self.doc_keys, self.good, False)}
+        rows = emo.paired_bootstrap(model_counts, self.metric_names, 50)
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['delta_F1'], 0)
+        self.assertEqual(rows[0]['delta_F1_CI'], (0, 0))
+        self.assertEqual(rows[0]['p_value'], 1.0)
+
+    def test_paired_bootstrap_better_model(self):
+        model_counts = {'a': (self.doc_keys, self.good, False),
+                'b': (self.doc_keys, self.bad, False)}
+        rows = emo.paired_bootstrap(model_counts, self.metric_names, 50)
+
+        self.assertGreater(rows[0]['delta_F1'], 0)
+        self.assertGreater(rows[0]['delta_F1_CI'][0], 0)
+        self.assertEqual(rows[0]['p_value'], 0.0)
+
+    def test_paired_bootstrap_shared_docs_only(self):
+        # Model b has no predictions for doc4, so it's left out for both
+        model_counts = {'a': (self.doc_keys, self.good, False),
+                'b': (self.doc_keys[:3], self.good[:3], False)}
+        rows = emo.paired_bootstrap(model_counts, self.metric_names, 50)
+
+        self.assertEqual(rows[0]['F1_a'], rows[0]['F1_b'])
+
+    def test_paired_bootstrap_no_shared_docs(self):
+        model_counts = {'a': (self.doc_keys[:2], self.good[:2], False),
+                'b': (self.doc_keys[2:], self.bad[2:], False)}
+        with self.assertWarns(UserWarning):
+            rows = emo.paired_bootstrap(model_counts, self.metric_names, 50)
+
+        self.assertEqual(len(rows), 1)
+        self.assertTrue(np.isnan(rows[0]['delta_F1']))
+        self.assertTrue(np.isnan(rows[0]['p_value']))
+
+
+class TestThresholdSweep(unittest.TestCase):
+    def setUp(self):
+
+        self.gold_index = {
+            "doc1": {
+                "doc_key": "doc1",
+                "ner": [[], []],
+                "relations": [[[0, 1, 3, 4, "USED-FOR"]],
+                    [[10, 11, 13, 13, "PART-OF"], [10, 11, 15, 16, "PART-OF"]]]
+            },
+            "doc2": {
+                "doc_key": "doc2",
+                "ner": [[]],
+                "relations": [[[0, 0, 2, 2, "USED-FOR"]]]
+            }
+        }
+        self.preds = [{
+            "doc_key": "doc1",
+            "predicted_relations": [
+                [[0, 1, 3, 4, "USED-FOR", 2.1, 0.9],
+                 [0, 1, 5, 6, "USED-FOR", 0.4, 0.6]],
+                [[13, 13, 10, 11, "PART-OF", 1.0, 0.7],
+                 [15, 16, 17, 17, "PART-OF", 0.1, 0.5]]]
+        }, {
+            "doc_key": "doc2",
+            "predicted_relations": [[[2, 2, 0, 0, "USED-FOR", 0.3, 0.6]]]
+        }]
+
+    def test_get_rel_scores(self):
+        pred_scores, pred_tp, gold_best = emo.get_rel_scores(self.preds,
+                self.gold_index)
+
+        np.testing.assert_array_equal(pred_scores, [0.9, 0.6, 0.7, 0.5, 0.6])
+        np.testing.assert_array_equal(pred_tp, [True, False, True, False,
+            True])
+        np.testing.assert_array_equal(gold_best, [0.9, 0.7, -np.inf, 0.6])
+
+    def test_sweep_thresholds(self):
+        sweep = emo.sweep_thresholds(*emo.get_rel_scores(self.preds,
+            self.gold_index))
+
+        np.testing.assert_array_equal(sweep['threshold'], [0.9, 0.7, 0.6,
+            0.5])
+        np.testing.assert_allclose(sweep['precision'], [1, 1, 3/4, 3/5])
+        np.testing.assert_allclose(sweep['recall'], [1/4, 2/4, 3/4, 3/4])
+
+    def test_sweep_same_as_filtering(self):
+        sweep = emo.sweep_thresholds(*emo.get_rel_scores(self.preds,
+            self.gold_index, ordered=True))
+        metric_ids = {'ent': 0, 'rel': 1, 'rel_ordered': 2,
+                'rel_USED-FOR': 3, 'rel_PART-OF': 4}
+        for i, threshold in enumerate(sweep['threshold']):
+            counts = np.zeros(3, dtype=int)
+            for doc in self.preds:
+                filtered = dict(doc, predicted_ner=[[] for _ in
+                    doc['predicted_relations']], predicted_relations=[
+                        [r for r in sent if r[6] >= threshold]
+                        for sent in doc['predicted_relations']])
+                counts += emo.get_doc_metric_counts(filtered,
+                        self.gold_index[doc['doc_key']], metric_ids)[2]
+            prec, rec, f1 = emo.compute_f1(counts[0] + counts[1],
+                    counts[0] + counts[2], counts[0])
+
+            self.assertAlmostEqual(sweep['precision'][i], prec)
+            self.assertAlmostEqual(sweep['recall'][i], rec)
+            self.assertAlmostEqual(sweep['F1'][i], f1)
+
+    def test_get_best_threshold(self):
+        sweep = emo.sweep_thresholds(*emo.get_rel_scores(self.preds,
+            self.gold_index))
+        best = emo.get_best_threshold(sweep)
+
+        self.assertEqual(best['rel_best_threshold'], 0.6)
+        self.assertEqual(best['rel_best_recall'], 0.75)
+
+    def test_get_best_threshold_no_preds(self):
+        sweep = emo.sweep_thresholds(*emo.get_rel_scores([], self.gold_index))
+        best = emo.get_best_threshold(sweep)
+
+        self.assertTrue(np.isnan(best['rel_best_F1']))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,216 @@
+"""
+Unit tests for graph_filtering.py
+
+Author: Serena G. Lotreck
+"""
+import unittest
+import shutil, tempfile
+import os
+
+import sys
+from unittest import mock
+
+sys.path.append('../graph_formatting')
+import dygiepp_to_DOT as dd
+import graph_filtering as gf
+import graph_components as gc
+import graph_store as gs
+from graph_store import GraphStore
+
+
+class TestFilters(unittest.TestCase):
+    """
+    Test the filters on a graph with two clusters and a loose entity
+    """
+    def setUp(self):
+        """
+        Set up the graph
+        """
+        self.test_dir = os.path.abspath(tempfile.mkdtemp())
+        self.triple_weights = {("JA", "INDUCES", "defense"): 2,
+                               ("defense", "AGAINST", "herbivores"): 1,
+                               ("GA", "PROMOTES", "growth"): 3,
+                               ("light", "ACTIVATES", "phytochrome"): 1}
+        self.loose_ents = ["auxin"]
+        self.graph = GraphStore.from_triples(self.triple_weights,
+                                             self.loose_ents, "plants")
+
+    def tearDown(self):
+        """
+        Delete directory and files used for testing
+        """
+        shutil.rmtree(self.test_dir)
+
+    def test_keyword_direct_filter(self):
+        """
+        Test that only keywords and their neighbors are kept
+        """
+        filtered = gf.keyword_direct_filter(self.graph, ["JA", "GA"])
+
+        self.assertEqual(filtered.to_triple_weights(),
+                         ({("JA", "INDUCES", "defense"): 2,
+                           ("GA", "PROMOTES", "growth"): 3}, []))
+
+    def test_keyword_cluster_filter(self):
+        """
+        Test that everything connected to a keyword is kept
+        """
+        filtered = gf.keyword_cluster_filter(self.graph, ["JA", "GA"])
+
+        self.assertEqual(filtered.to_triple_weights(),
+                         ({("JA", "INDUCES", "defense"): 2,
+                           ("defense", "AGAINST", "herbivores"): 1,
+                           ("GA", "PROMOTES", "growth"): 3}, []))
+
+    def test_keyword_cluster_filter_reverse_edges(self):
+        """
+        Test that edges are followed against their direction
+        """
+        filtered = gf.keyword_cluster_filter(self.graph, ["herbivores"])
+
+        self.assertEqual(filtered.nodes.tolist(),
+                         ["JA", "defense", "herbivores"])
+
+    def test_keyword_cluster_filter_max_hops(self):
+        """
+        Test that entities too far from a keyword are removed
+        """
+        filtered = gf.keyword_cluster_filter(self.graph, ["JA", "GA"],
+                                             max_hops=1)
+
+        self.assertEqual(filtered.nodes.tolist(),
+                         ["JA", "defense", "GA", "growth"])
+
+    def test_keyword_cluster_filter_edge_filters(self):
+        """
+        Test that edges below the weight threshold or with other relations
+        aren't followed
+        """
+        by_weight = gf.keyword_cluster_filter(self.graph, ["JA", "GA"],
+                                              min_weight=2)
+        by_relation = gf.keyword_cluster_filter(self.graph, ["JA", "GA"],
+                                                relations=["INDUCES",
+                                                           "AGAINST"])
+
+        self.assertEqual(by_weight.nodes.tolist(),
+                         ["JA", "defense", "GA", "growth"])
+        self.assertEqual(by_relation.to_triple_weights(),
+                         ({("JA", "INDUCES", "defense"): 2,
+                           ("defense", "AGAINST", "herbivores"): 1},
+                          ["GA"]))
+
+    def test_random_num_filter(self):
+        """
+        Test that every kept edge is from the original graph
+        """
+        filtered = gf.random_num_filter(self.graph, 3)
+        triple_weights, _ = filtered.to_triple_weights()
+
+        self.assertTrue(set(triple_weights.items()) <=
+                        set(self.triple_weights.items()))
+
+    @unittest.skipIf(dd.pgv is None, 'pygraphviz is not installed')
+    def test_keyword_cluster_filter_component_index(self):
+        """
+        Test that the component index gives the same graph as the search, and
+        that it isn't used once the DOT file changes
+        """
+        dd.write_dot_weights(self.triple_weights, self.loose_ents, "plants",
+                             self.test_dir)
+        dot_file = f'{self.test_dir}/plants.gv'
+        gc.main(dot_file, False)
+        graph = gf.read_dot(dot_file, False)
+        index = gf.read_component_index(dot_file, False, graph)
+        filtered = gf.keyword_cluster_filter(graph, ["JA", "GA"],
+                                             component_index=index)
+        searched = gf.keyword_cluster_filter(graph, ["JA", "GA"])
+
+        self.assertEqual(filtered.to_triple_weights(),
+                         searched.to_triple_weights())
+        self.assertIsNone(gf.read_component_index(dot_file, True, graph))
+        with open(dot_file, 'a') as myfile:
+            myfile.write('\n')
+        self.assertIsNone(gf.read_component_index(dot_file, False, graph))
+
+    def test_read_dot_snapshot(self):
+        """
+        Test that a snapshot directory is read without parsing DOT
+        """
+        gs.save_snapshot(self.graph, f'{self.test_dir}/plants_snapshot')
+        # pygraphviz isn't needed for snapshots
+        with mock.patch.object(gf, 'pgv', None):
+            graph = gf.read_dot(f'{self.test_dir}/plants_snapshot', True)
+            with self.assertRaises(ImportError):
+                gf.read_dot(f'{self.test_dir}/plants.gv', True)
+        filtered = gf.keyword_cluster_filter(graph, ["JA", "GA"])
+
+        self.assertEqual(graph.name, "plants")
+        self.assertEqual(graph.to_triple_weights(),
+                         (self.triple_weights, []))
+        self.assertEqual(filtered.to_triple_weights(),
+                         gf.keyword_cluster_filter(
+                             self.graph, ["JA", "GA"]).to_triple_weights())
+
+    def test_main_canonicalize(self):
+        """
+        Test that keywords are matched to canonical node names
+        """
+        graph = GraphStore.from_triples({("ja", "INDUCES", "defense"): 2,
+                                         ("ga", "PROMOTES", "growth"): 3},
+                                        [], "plants")
+        gs.save_snapshot(graph, f'{self.test_dir}/plants_snapshot')
+        gf.main(f'{self.test_dir}/plants_snapshot', "keyword_direct",
+                ["JA"], 0, False, self.test_dir, canonicalize=True)
+        with open(f'{self.test_dir}/keyword_direct_plants.gv') as myfile:
+            dot = myfile.read()
+
+        self.assertIn('ja -> defense', dot)
+        self.assertNotIn('growth', dot)
+
+    @unittest.skipIf(dd.pgv is None, 'pygraphviz is not installed')
+    def test_main_file_name(self):
+        """
+        Test that output names come from the DOT file name, not the name of
+        the graph inside it
+        """
+        dd.write_dot_weights(self.triple_weights, self.loose_ents, "plants",
+                             self.test_dir)
+        os.rename(f'{self.test_dir}/plants.gv', f'{self.test_dir}/renamed.gv')
+        gf.main(f'{self.test_dir}/renamed.gv', "keyword_direct", ["JA"], 0,
+                False, self.test_dir)
+
+        self.assertTrue(os.path.exists(
+            f'{self.test_dir}/all_ents_renamed.gv'))
+        self.assertTrue(os.path.exists(
+            f'{self.test_dir}/keyword_direct_renamed.gv'))
+        self.assertFalse(os.path.exists(
+            f'{self.test_dir}/keyword_direct_plants.gv'))
+
+    def test_main_snapshot_name(self):
+        """
+        Test that an unnamed snapshot takes its output name from the
+        directory
+        """
+        graph = GraphStore.from_triples(self.triple_weights, [], None)
+        gs.save_snapshot(graph, f'{self.test_dir}/plants_snapshot/')
+        gf.main(f'{self.test_dir}/plants_snapshot/', "keyword_direct",
+                ["JA"], 0, False, self.test_dir)
+
+        self.assertTrue(os.path.exists(
+            f'{self.test_dir}/keyword_direct_plants_snapshot.gv'))
+
+    @unittest.skipIf(dd.pgv is None, 'pygraphviz is not installed')
+    def test_read_dot_remove_ents(self):
+        """
+        Test that loose entities are removed when reading
+        """
+        dd.write_dot_weights(self.triple_weights, self.loose_ents, "plants",
+                             self.test_dir)
+        graph = gf.read_dot(f'{self.test_dir}/plants.gv', True)
+
+        self.assertEqual(graph.to_triple_weights(),
+                         (self.triple_weights, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
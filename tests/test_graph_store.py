@@ -0,0 +1,273 @@
+"""
+Unit tests for graph_store.py
+
+Author: Serena G. Lotreck
+"""
+import unittest
+import shutil, tempfile
+import os
+
+import sys
+
+sys.path.append('../graph_formatting')
+import dygiepp_to_DOT as dd
+import graph_store as gs
+from graph_store import GraphStore
+
+import numpy as np
+
+
+class TestGraphStore(unittest.TestCase):
+    """
+    Test the GraphStore class
+    """
+    def setUp(self):
+        """
+        Set up a small graph with a loose entity
+        """
+        self.test_dir = os.path.abspath(tempfile.mkdtemp())
+        self.triple_weights = {("hello", "TO_THE", "world"): 3,
+                               ("I", "LIKE", "you world"): 1,
+                               ("I", "", "hello"): 2}
+        self.loose_ents = ["you"]
+        self.graph = GraphStore.from_triples(self.triple_weights,
+                                             self.loose_ents, "my_graph")
+
+    def tearDown(self):
+        """
+        Delete directory and files used for testing
+        """
+        shutil.rmtree(self.test_dir)
+
+    def test_from_triples(self):
+        """
+        Test that nodes are interned in the order they're first seen
+        """
+        self.assertEqual(self.graph.nodes.tolist(),
+                         ["hello", "world", "I", "you world", "you"])
+        self.assertEqual(self.graph.labels, ["TO_THE", "LIKE", ""])
+        np.testing.assert_array_equal(self.graph.src, [0, 2, 2])
+        np.testing.assert_array_equal(self.graph.dst, [1, 3, 0])
+        np.testing.assert_array_equal(self.graph.weights, [3, 1, 2])
+
+    def test_adjacency(self):
+        """
+        Test the CSR neighbor lookups
+        """
+        np.testing.assert_array_equal(self.graph.successors(2), [3, 0])
+        np.testing.assert_array_equal(self.graph.predecessors(0), [2])
+        np.testing.assert_array_equal(self.graph.neighbors(0), [1, 2])
+        np.testing.assert_array_equal(self.graph.degree(), [2, 1, 2, 1, 0])
+
+    def test_bfs(self):
+        """
+        Test hop counts from several sources, in both edge directions
+        """
+        np.testing.assert_array_equal(self.graph.bfs([1, 4]),
+                                      [1, 0, 2, 3, 0])
+        np.testing.assert_array_equal(self.graph.bfs([1], max_hops=1),
+                                      [1, 0, -1, -1, -1])
+        np.testing.assert_array_equal(
+            self.graph.bfs([1], edge_mask=self.graph.edge_filter(2)),
+            [1, 0, 2, -1, -1])
+
+    def test_subgraph(self):
+        """
+        Test that edges are dropped with their nodes and IDs are renumbered
+        """
+        sub = self.graph.subgraph(np.array([True, True, False, True, True]))
+
+        self.assertEqual(sub.nodes.tolist(),
+                         ["hello", "world", "you world", "you"])
+        self.assertEqual(sub.to_triple_weights(),
+                         ({("hello", "TO_THE", "world"): 3},
+                          ["you world", "you"]))
+
+    def test_subgraph_from_ids(self):
+        """
+        Test that giving IDs is the same as giving masks
+        """
+        sub = self.graph.subgraph_from_ids(np.array([3, 2, 0]),
+                                           np.array([2, 1]))
+        expected = self.graph.subgraph(np.array([True, False, True, True,
+                                                 False]))
+
+        self.assertEqual(sub.nodes.tolist(), expected.nodes.tolist())
+        self.assertEqual(sub.to_triple_weights(),
+                         expected.to_triple_weights())
+
+    def test_round_trip(self):
+        """
+        Test that the triples come back out unchanged
+        """
+        self.assertEqual(self.graph.to_triple_weights(),
+                         (self.triple_weights, self.loose_ents))
+
+    @unittest.skipIf(dd.pgv is None, 'pygraphviz is not installed')
+    def test_from_agraph(self):
+        """
+        Test that a graph read with pygraphviz gives the same store
+        """
+        dd.write_dot_weights(self.triple_weights, self.loose_ents,
+                             "my_graph", self.test_dir)
+        agraph = dd.pgv.AGraph(f'{self.test_dir}/my_graph.gv')
+        graph = GraphStore.from_agraph(agraph)
+
+        self.assertEqual(graph.name, "my_graph")
+        self.assertEqual(graph.nodes.tolist(), self.graph.nodes.tolist())
+        self.assertEqual(graph.to_triple_weights(),
+                         (self.triple_weights, self.loose_ents))
+
+
+class TestStringTable(unittest.TestCase):
+    """
+    Test the StringTable class
+    """
+    def setUp(self):
+        """
+        Set up a table with non-ASCII and empty strings
+        """
+        self.strings = ["hello", "", "caf\u00e9", "abscisic acid", "ABA"]
+        self.table = gs.StringTable.from_strings(self.strings)
+
+    def test_get(self):
+        """
+        Test getting strings by index
+        """
+        self.assertEqual(len(self.table), 5)
+        self.assertEqual(self.table[2], "caf\u00e9")
+        self.assertEqual(self.table.tolist(), self.strings)
+
+    def test_take(self):
+        """
+        Test making a table from a subset of the strings
+        """
+        self.assertEqual(self.table.take(np.array([0, 2, 4])).tolist(),
+                         ["hello", "caf\u00e9", "ABA"])
+        self.assertEqual(self.table.take(np.array([], dtype=int)).tolist(),
+                         [])
+
+    def test_find(self):
+        """
+        Test looking up strings with and without a sorted order
+        """
+        sorted_table = gs.StringTable(self.table.blob, self.table.offsets,
+                                      self.table.sort_order())
+        for table in [self.table, sorted_table]:
+            for i, string in enumerate(self.strings):
+                self.assertEqual(table.find(string), i)
+            self.assertEqual(table.find("ab"), -1)
+            self.assertEqual(table.find("zzz"), -1)
+
+
+class TestSnapshot(unittest.TestCase):
+    """
+    Test save_snapshot and load_snapshot
+    """
+    def setUp(self):
+        """
+        Set up a graph and a temp dir
+        """
+        self.test_dir = os.path.abspath(tempfile.mkdtemp())
+        self.triple_weights = {("hello", "TO_THE", "world"): 3,
+                               ("I", "LIKE", "you world"): 1,
+                               ("I", "", "hello"): 2}
+        self.graph = GraphStore.from_triples(self.triple_weights, ["you"],
+                                             "my_graph")
+        self.snapshot_dir = f'{self.test_dir}/my_graph_snapshot'
+
+    def tearDown(self):
+        """
+        Delete directory and files used for testing
+        """
+        shutil.rmtree(self.test_dir)
+
+    def test_round_trip(self):
+        """
+        Test that the loaded graph is memory-mapped and the same as the saved
+        one
+        """
+        gs.save_snapshot(self.graph, self.snapshot_dir)
+        graph = gs.load_snapshot(self.snapshot_dir)
+
+        self.assertIsInstance(graph.nodes.blob, np.memmap)
+        self.assertFalse(graph.src.flags.writeable)
+        self.assertEqual(graph.name, "my_graph")
+        self.assertEqual(graph.to_triple_weights(),
+                         self.graph.to_triple_weights())
+        np.testing.assert_array_equal(graph.get_ids(["you", "I"]), [4, 2])
+        np.testing.assert_array_equal(graph.neighbors(0), [1, 2])
+        with self.assertRaises(KeyError):
+            graph.get_ids(["nobody"])
+
+    def test_hash_changes(self):
+        """
+        Test that the hash of a snapshot changes with its contents
+        """
+        gs.save_snapshot(self.graph, self.snapshot_dir)
+        first_hash = gs.hash_source(self.snapshot_dir)
+        gs.save_snapshot(self.graph.subgraph(np.array([True]*4 + [False])),
+                         self.snapshot_dir)
+
+        self.assertNotEqual(gs.hash_source(self.snapshot_dir), first_hash)
+
+
+class TestComponents(unittest.TestCase):
+    """
+    Test the component index functions
+    """
+    def setUp(self):
+        """
+        Set up a graph with three components, one of them a loose entity
+        """
+        self.test_dir = os.path.abspath(tempfile.mkdtemp())
+        self.graph = GraphStore.from_triples(
+            {("a", "R", "b"): 1, ("c", "R", "d"): 1, ("d", "S", "b"): 2,
+             ("e", "R", "f"): 1, ("g", "R", "e"): 1}, ["h"])
+
+    def tearDown(self):
+        """
+        Delete directory and files used for testing
+        """
+        shutil.rmtree(self.test_dir)
+
+    def test_find_components(self):
+        """
+        Test that components are numbered by their lowest node ID
+        """
+        node_component = gs.find_components(self.graph.num_nodes,
+                                            self.graph.src, self.graph.dst)
+
+        np.testing.assert_array_equal(node_component,
+                                      [0, 0, 0, 0, 1, 1, 1, 2])
+
+    def test_find_components_long_chain(self):
+        """
+        Test a chain where unions join roots in both directions
+        """
+        node_component = gs.find_components(6, np.array([5, 4, 0, 2, 3]),
+                                            np.array([4, 3, 1, 1, 2]))
+
+        np.testing.assert_array_equal(node_component, [0]*6)
+
+    def test_component_index(self):
+        """
+        Test that the saved index gives the components of the keywords
+        """
+        index_file = gs.get_index_file(f'{self.test_dir}/graph.gv')
+        gs.save_component_index(index_file,
+                                gs.build_component_index(self.graph),
+                                'hash', False)
+        index = gs.load_component_index(index_file)
+        sub = gs.component_subgraph(self.graph,
+                                    self.graph.get_ids(["h", "g"]), index)
+
+        self.assertEqual(index_file, f'{self.test_dir}/graph_components.npz')
+        self.assertEqual((index['dot_hash'], index['remove_ents'],
+                          index['num_nodes']), ('hash', False, 8))
+        self.assertEqual(sub.to_triple_weights(),
+                         ({("e", "R", "f"): 1, ("g", "R", "e"): 1}, ["h"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
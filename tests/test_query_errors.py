@@ -0,0 +1,90 @@
+"""
+Spot checks for query_errors.py
+
+Author: Serena G. Lotreck
+"""
+import unittest
+import sys
+from os.path import exists, join
+from tempfile import mkdtemp
+import shutil
+
+sys.path.append('../models/')
+
+import evaluate_model_output as emo
+import query_errors as qe
+
+
+class TestQueryErrors(unittest.TestCase):
+    def setUp(self):
+
+        self.tmpdir = mkdtemp()
+        self.error_db = join(self.tmpdir, 'errors.db')
+        scierc_errors = [
+            ('doc1', 0, 'ent', 'fn', 0, 0, None, None, 'A', 'protein', None,
+                None),
+            ('doc2', 0, 'ent', 'fn', 3, 3, None, None, 'A', 'protein', None,
+                None),
+            ('doc2', 1, 'ent', 'fn', 5, 6, None, None, 'B', 'A. thaliana',
+                None, None),
+            ('doc2', 1, 'ent', 'fp', 7, 7, None, None, 'B', 'gene', None,
+                0.9),
+            ('doc2', 1, 'rel', 'fp', 5, 6, 7, 7, 'USED-FOR', 'A. thaliana',
+                'gene', 0.7),
+            ('doc2', 1, 'rel', 'fp', 7, 7, 5, 6, 'PART-OF', 'gene',
+                'A. thaliana', 0.4)]
+        genia_errors = [
+            ('doc1', 0, 'ent', 'fn', 0, 0, None, None, 'A', 'gene', None,
+                None),
+            ('doc1', 0, 'rel', 'fp', 0, 0, 2, 2, 'USED-FOR', 'gene', 'DNA',
+                0.8)]
+        emo.save_errors(self.error_db, 'scierc_preds.jsonl', scierc_errors,
+                'a', 'b')
+        emo.save_errors(self.error_db, 'genia_preds.jsonl', genia_errors,
+                'c', 'b')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmpdir)
+
+    def test_top_fn_ent_strings(self):
+        df = qe.query_errors(self.error_db, model='scierc', error_type='ent',
+                error='fn', group_by=['text'], top=50)
+
+        self.assertEqual(list(df.text), ['protein', 'A. thaliana'])
+        self.assertEqual(list(df['count']), [2, 1])
+
+    def test_fp_rels_by_type(self):
+        df = qe.query_errors(self.error_db, error_type='rel', error='fp',
+                group_by=['label'])
+
+        self.assertEqual(list(df.label), ['USED-FOR', 'PART-OF'])
+        self.assertEqual(list(df['count']), [2, 1])
+
+    def test_list_errors_by_score(self):
+        df = qe.query_errors(self.error_db, error='fp', top=2)
+
+        self.assertEqual(list(df.score), [0.9, 0.8])
+
+    def test_bad_group_by(self):
+        with self.assertRaises(ValueError):
+            qe.build_query(group_by=['score'])
+
+    def test_missing_db(self):
+        missing_db = join(self.tmpdir, 'missing.db')
+        with self.assertRaises(FileNotFoundError):
+            qe.query_errors(missing_db)
+
+        self.assertFalse(exists(missing_db))
+
+    def test_save_errors_replaces_model(self):
+        emo.save_errors(self.error_db, 'genia_preds.jsonl', [], 'd', 'b')
+        df = qe.query_errors(self.error_db, group_by=['model'])
+
+        self.assertEqual(list(df.model), ['scierc_preds.jsonl'])
+        self.assertEqual(emo.load_error_models(self.error_db)[
+            'genia_preds.jsonl'], ('d', 'b'))
+
+
+if __name__ == "__main__":
+    unittest.main()